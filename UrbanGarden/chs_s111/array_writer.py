@@ -0,0 +1,235 @@
+#******************************************************************************
+#
+#******************************************************************************
+from datetime import datetime
+import numpy
+import pytz
+from chs_s111 import ascii_time_series
+from chs_s111 import current_vectors
+from chs_s111 import grid_writer
+from chs_s111 import pipeline
+from chs_s111 import station_writer
+
+#The supported units of the speeds and components.
+UNITS = ['m/s', 'knots']
+
+#The default memory (in bytes) available for converting the grid values.
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+#******************************************************************************
+def get_times(times):
+    """Convert the record times given to the API.
+
+    :param times: Array (or list) of numpy.datetime64 or datetime values. (UTC, or with a time zone)
+    :returns: The array of numpy.datetime64 values (UTC, to the second).
+    """
+
+    times = numpy.atleast_1d(numpy.asarray(times))
+
+    #Datetimes with a time zone are converted to UTC first, numpy does not handle them.
+    if not numpy.issubdtype(times.dtype, numpy.datetime64):
+        values = []
+        for value in times.ravel():
+            if isinstance(value, datetime) and value.tzinfo != None:
+                value = value.astimezone(pytz.utc).replace(tzinfo=None)
+            values.append(value)
+
+        times = numpy.array(values, dtype='datetime64[s]').reshape(times.shape)
+
+    times = times.astype('datetime64[s]')
+    if times.ndim != 1 or times.shape[0] == 0:
+        raise Exception('The times must be a (non empty) list of record times.')
+
+    return times
+
+
+#******************************************************************************
+def get_interval(times):
+    """Determine the record interval of a series of times, which must be regularly spaced.
+
+    :param times: The array of numpy.datetime64 values.
+    :returns: The time interval between records.
+    """
+
+    if times.shape[0] < 2:
+        raise Exception('At least two times are needed to determine the record interval.')
+
+    steps = numpy.diff(times).astype(numpy.int64)
+    if steps[0] <= 0 or numpy.any(steps != steps[0]):
+        raise Exception('The times must be increasing by the same interval.')
+
+    return steps[0].astype('timedelta64[s]').item()
+
+
+#******************************************************************************
+def check_values(directions, speeds, u, v, units):
+    """Check that either the directions and speeds, or the components, are given to the API.
+
+    :param directions: Array of directions (degrees true), None if the components are given.
+    :param speeds: Array of speeds, None if the components are given.
+    :param u: Array of eastward components, None if the directions and speeds are given.
+    :param v: Array of northward components, None if the directions and speeds are given.
+    :param units: The units of the speeds or components ('m/s' or 'knots').
+    """
+
+    if units not in UNITS:
+        raise Exception('Unknown speed units ' + str(units))
+
+    if (directions is None) != (speeds is None) or (u is None) != (v is None) or (directions is None) == (u is None):
+        raise Exception('Either the directions and speeds, or the eastward and northward components, must be given.')
+
+
+#******************************************************************************
+def get_direction_speed(directions, speeds, u, v, units):
+    """Convert the values given to the API into S-111 directions and speeds.
+
+    :param directions: Array of directions (degrees true), None if the components are given.
+    :param speeds: Array of speeds, None if the components are given.
+    :param u: Array of eastward components, None if the directions and speeds are given.
+    :param v: Array of northward components, None if the directions and speeds are given.
+    :param units: The units of the speeds or components ('m/s' or 'knots').
+    :returns: A tuple containing the arrays of directions (degrees true) and speeds (knots).
+    """
+
+    check_values(directions, speeds, u, v, units)
+
+    if u is not None:
+        if units == 'm/s':
+            return current_vectors.compute_direction_speed(u, v)
+
+        return current_vectors.components_to_direction_speed(u, v)
+
+    directions = numpy.asarray(directions, dtype=numpy.float64)
+    speeds = numpy.asarray(speeds, dtype=numpy.float64)
+
+    if units == 'm/s':
+        speeds = speeds * current_vectors.ms2Knots
+
+    if directions.shape != speeds.shape:
+        raise Exception('The directions and speeds must have the same shape.')
+
+    return directions, speeds
+
+
+#******************************************************************************
+def add_stations(hdf_file, longitudes, latitudes, times, directions=None, speeds=None, u=None, v=None, units='m/s',
+                 station_names=None, station_ids=None, validate=True):
+    """Add stations, and their series of values, to the S-111 file directly from arrays.
+
+    Either the directions and speeds, or the eastward/northward components, are given,
+    with one row per station and one column per time. (A single station may be given
+    as scalars and 1D arrays) The stations are written through the same path as those
+    read from ASCII files.
+
+    :param hdf_file: The S-111 HDF file.
+    :param longitudes: Array of the station longitudes.
+    :param latitudes: Array of the station latitudes.
+    :param times: Array of the record times, shared by every station. (numpy.datetime64 or datetime, regularly spaced)
+    :param directions: Array of directions (degrees true), None if the components are given.
+    :param speeds: Array of speeds, None if the components are given.
+    :param u: Array of eastward components, None if the directions and speeds are given.
+    :param v: Array of northward components, None if the directions and speeds are given.
+    :param units: The units of the speeds or components ('m/s' or 'knots').
+    :param station_names: The list of station names, None if not known.
+    :param station_ids: The list of station identifiers, None if not known.
+    :param validate: True to check the values (and times) before adding them.
+    :returns: The list of the newly created groups.
+    """
+
+    longitudes = numpy.atleast_1d(numpy.asarray(longitudes, dtype=numpy.float64))
+    latitudes = numpy.atleast_1d(numpy.asarray(latitudes, dtype=numpy.float64))
+    times = get_times(times)
+
+    directions, speeds = get_direction_speed(directions, speeds, u, v, units)
+    directions = numpy.atleast_2d(directions)
+    speeds = numpy.atleast_2d(speeds)
+
+    numberOfStations = longitudes.shape[0]
+    if latitudes.shape[0] != numberOfStations or directions.shape != (numberOfStations, times.shape[0]):
+        raise Exception('The values must have one row per station position and one column per time.')
+
+    for names in (station_names, station_ids):
+        if names is not None and len(names) != numberOfStations:
+            raise Exception('The station names and identifiers must be given for every station.')
+
+    interval = get_interval(times)
+    startTime = times[0].item().replace(tzinfo=pytz.utc)
+
+    #Check every station before changing the file, so bad values leave it untouched.
+    if validate:
+        for stationIndex in range(0, numberOfStations):
+            problems = ascii_time_series.validate_records(times, directions[stationIndex], speeds[stationIndex],
+                                                          startTime, interval, times.shape[0])
+            if len(problems) > 0:
+                raise Exception('Invalid values for station ' + str(stationIndex + 1) + ': ' + '; '.join(problems) + '.')
+
+    groups = []
+    for stationIndex in range(0, numberOfStations):
+        newGroup = station_writer.add_station(hdf_file, longitudes[stationIndex], latitudes[stationIndex], startTime,
+                                              interval, directions[stationIndex], speeds[stationIndex])
+
+        station_writer.write_station_identity(newGroup, None if station_names is None else station_names[stationIndex],
+                                              None if station_ids is None else station_ids[stationIndex])
+        groups.append(newGroup)
+
+    return groups
+
+
+#******************************************************************************
+def add_irregular_grid(hdf_file, longitudes, latitudes, times, directions=None, speeds=None, u=None, v=None, units='m/s',
+                       memory_budget=DEFAULT_MEMORY_BUDGET, pipelined=False):
+    """Add an irregular grid, and its values at each time, to the S-111 file directly from arrays.
+
+    Either the directions and speeds, or the eastward/northward components, are given,
+    with one row per time and one column per node. The grid is written by the same
+    slab writer as the netcdf grids, so directions and speeds are converted to
+    components first.
+
+    :param hdf_file: The S-111 HDF file.
+    :param longitudes: Array of the node longitudes.
+    :param latitudes: Array of the node latitudes.
+    :param times: Array of the times. (numpy.datetime64 or datetime)
+    :param directions: Array of directions (degrees true), None if the components are given.
+    :param speeds: Array of speeds, None if the components are given.
+    :param u: Array of eastward components, None if the directions and speeds are given.
+    :param v: Array of northward components, None if the directions and speeds are given.
+    :param units: The units of the speeds or components ('m/s' or 'knots').
+    :param memory_budget: The memory (in bytes) available for converting the grid values.
+    :param pipelined: True to convert the next slab in a background thread while the current one is written.
+    :returns: A tuple containing the minimum time, maximum time, time interval, minimum speed, and maximum speed (knots).
+    """
+
+    check_values(directions, speeds, u, v, units)
+
+    longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+    latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+    times = get_times(times)
+
+    #The slab writer takes components in metres per second.
+    if u is not None:
+        ua = numpy.atleast_2d(numpy.asarray(u, dtype=numpy.float64))
+        va = numpy.atleast_2d(numpy.asarray(v, dtype=numpy.float64))
+    else:
+        ua, va = current_vectors.direction_speed_to_components(numpy.atleast_2d(directions), numpy.atleast_2d(speeds))
+
+    if units == 'knots':
+        ua = ua / current_vectors.ms2Knots
+        va = va / current_vectors.ms2Knots
+
+    numberOfTimes, numberOfNodes = grid_writer.verify_grid_shapes(times, latitudes, longitudes, ua, va)
+
+    print("Adding irregular grid dataset of", numberOfTimes, "timestamps by", numberOfNodes, "nodes")
+
+    #Two slabs are in memory when pipelined.
+    slabBudget = memory_budget // pipeline.DOUBLE_BUFFERED if pipelined else memory_budget
+    timeSlab, nodeSlab = grid_writer.plan_slabs(numberOfTimes, numberOfNodes, slabBudget)
+
+    minX, minY, maxX, maxY = grid_writer.create_xy_datasets(hdf_file, latitudes, longitudes, nodeSlab)
+
+    minTime, maxTime, interval, minSpeed, maxSpeed = grid_writer.create_grid_groups(hdf_file, times, ua, va, timeSlab, nodeSlab,
+                                                                                    None, pipelined)
+
+    grid_writer.update_grid_metadata(hdf_file, numberOfTimes, numberOfNodes, minTime, maxTime, interval,
+                                     minX, minY, maxX, maxY, minSpeed, maxSpeed)
+
+    return (minTime, maxTime, interval, minSpeed, maxSpeed)
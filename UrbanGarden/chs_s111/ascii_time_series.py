@@ -3,17 +3,261 @@
 #******************************************************************************
 from datetime import datetime
 from datetime import timedelta
+import itertools
+import numpy
 import pytz
+from chs_s111 import series_cache
+
+#******************************************************************************
+class AsciiDialect:
+    """A layout of the ASCII time series files.
+
+    The header fields are at fixed columns of the header rows. The slice of each
+    field is compiled once, when the dialect is created, so decoding a header is a
+    single read of its rows and a slice per field. The records following the header
+    are parsed by parse_records, which is shared by every dialect.
+    """
+
+    #******************************************************************************
+    def __init__(self, name, header_rows, fields, identifying_fields=[]):
+        """Create the dialect.
+
+        :param name: The name of the dialect.
+        :param header_rows: The number of rows in the header.
+        :param fields: Dictionary of the header fields, each a tuple of the row, first column and last column. (One based and inclusive, as in the format descriptions)
+        :param identifying_fields: The fields which must not be blank in a file of this dialect.
+        """
+
+        self.name = name
+        self.header_rows = header_rows
+        self.identifying_fields = identifying_fields
+
+        #Group the slices by row, so each row is only looked up once.
+        self.row_slices = {}
+        for fieldName, (row, firstColumn, lastColumn) in fields.items():
+            if row < 1 or row > header_rows:
+                raise Exception('The ' + fieldName + ' field of the ' + name + ' dialect is not in its header.')
+
+            self.row_slices.setdefault(row - 1, []).append((fieldName, slice(firstColumn - 1, lastColumn)))
+
+        self.row_slices = sorted(self.row_slices.items())
+
+
+    #******************************************************************************
+    def read_header_rows(self, ascii_file):
+        """Read the rows of the header.
+
+        :param ascii_file: The time series file, positioned at its start.
+        :returns: The list of header rows.
+        """
+
+        rows = list(itertools.islice(ascii_file, self.header_rows))
+        if len(rows) != self.header_rows:
+            raise Exception('The time series file is shorter than its ' + str(self.header_rows) + ' row header.')
+
+        return rows
+
+
+    #******************************************************************************
+    def parse_header(self, rows):
+        """Slice the fields out of the header rows.
+
+        :param rows: The list of header rows.
+        :returns: A dictionary of the (unconverted) header field strings.
+        """
+
+        values = {}
+        for rowIndex, slices in self.row_slices:
+            data = rows[rowIndex] if rowIndex < len(rows) else ''
+            for fieldName, columns in slices:
+                values[fieldName] = data[columns]
+
+        return values
+
+
+    #******************************************************************************
+    def matches(self, rows):
+        """Determine if the file starting with the given rows is of this dialect.
+
+        :param rows: The first rows of the file. (At least the rows of the fields)
+        :returns: True if every identifying field has a value, else false.
+        """
+
+        values = self.parse_header(rows)
+        for fieldName in self.identifying_fields:
+            if values[fieldName].strip() == '':
+                return False
+
+        return True
+
+
+#The header fields of the CHS time series format. (row, first column, last column)
+CHS_FIELDS = {
+    #66-66  1 : Units of depth  [m: metres, f: feet]
+    'unit': (1, 66, 66),
+    #68-71  4 : Date (Year) of first data record
+    'year': (1, 68, 71),
+    #73-74  2 : Date (Month) of first data record
+    'month': (1, 73, 74),
+    #76-77  2 : Date (Day) of first data record
+    'day': (1, 76, 77),
+    #14-15  2 : Latitude (Degrees)
+    'latitude_degrees': (2, 14, 15),
+    #17-23  7 : Latitude (Minutes up to 4 places of decimal)
+    'latitude_minutes': (2, 17, 23),
+    #24-24  1 : 'N' or 'S'
+    'latitude_hemisphere': (2, 24, 24),
+    #26-28  3 Longitude (Degrees)
+    'longitude_degrees': (2, 26, 28),
+    #30-36  7 : Longitude (Minutes up to 4 places of decimal)
+    'longitude_minutes': (2, 30, 36),
+    #37-37  1 : 'W' or 'E'
+    'longitude_hemisphere': (2, 37, 37),
+    #62-66  5 : Time Zone [# of hours to add to determine UTC, always include + or - and
+    #           always left justify, (leaves space for Nfld. time). i.e. +03.5]
+    'utc_offset': (2, 62, 66),
+    #68-69  2 : Time (Hour)   of first data record
+    'hour': (2, 68, 69),
+    #70-71  2 : Time (Minute) of first data record
+    'minute': (2, 70, 71),
+    #73-74  2 : Time (Second) of first data record
+    'second': (2, 73, 74),
+    #col 01-10 10 : Number of Records to follow header
+    'number_of_records': (3, 1, 10),
+    #68-69  2 : Sampling interval (Hours)
+    'interval_hours': (3, 68, 69),
+    #70-71  2 : Sampling interval (Minutes)
+    'interval_minutes': (3, 70, 71),
+    #73-74  2 : Sampling interval (Seconds)
+    'interval_seconds': (3, 73, 74)}
+
+#The CHS header fields, with the station's name and identifier in the first row.
+#This column layout is an assumption, no format description (or reader) of it is
+#known, so these files are never detected, only read when the dialect is given.
+CHS_STATION_FIELDS = dict(CHS_FIELDS)
+CHS_STATION_FIELDS.update({
+    #01-30 30 : Station name
+    'station_name': (1, 1, 30),
+    #31-40 10 : Station identifier (number)
+    'station_id': (1, 31, 40)})
+
+#The registered dialects, by name.
+DIALECTS = {}
+
+#The names of the dialects tried when detecting the dialect of a file.
+DETECTED_DIALECTS = []
+
+#******************************************************************************
+def register_dialect(dialect, detected=True):
+    """Register a dialect, so it can be selected by name and (optionally) detected.
+
+    Dialects registered later are tried first when detecting the dialect of a file,
+    so the more specific dialects should be registered last.
+
+    :param dialect: The AsciiDialect.
+    :param detected: True to try the dialect when detecting the dialect of a file, false to only use it when it is given.
+    """
+
+    DIALECTS.pop(dialect.name, None)
+    DIALECTS[dialect.name] = dialect
+
+    if dialect.name in DETECTED_DIALECTS:
+        DETECTED_DIALECTS.remove(dialect.name)
+    if detected:
+        DETECTED_DIALECTS.append(dialect.name)
+
+
+#******************************************************************************
+def get_dialect(name):
+    """Retrieve a registered dialect.
+
+    :param name: The name of the dialect.
+    :returns: The AsciiDialect.
+    """
+
+    if name not in DIALECTS:
+        raise Exception('Unknown time series dialect ' + str(name) + ' (expected one of ' + ', '.join(DIALECTS) + ')')
+
+    return DIALECTS[name]
+
+
+#******************************************************************************
+def get_dialect_names():
+    """Retrieve the names of the registered dialects.
+
+    :returns: The list of dialect names.
+    """
+
+    return list(DIALECTS)
+
+
+#******************************************************************************
+def detect_dialect(ascii_file):
+    """Detect the dialect of a time series file from its header.
+
+    :param ascii_file: The time series file, positioned at its start. (It is left at its start)
+    :returns: The AsciiDialect of the file.
+    """
+
+    dialects = [DIALECTS[name] for name in reversed(DETECTED_DIALECTS)]
+
+    rows = list(itertools.islice(ascii_file, max(dialect.header_rows for dialect in dialects)))
+    ascii_file.seek(0)
+
+    for dialect in dialects:
+        if len(rows) >= dialect.header_rows and dialect.matches(rows):
+            return dialect
+
+    raise Exception('The time series file ' + ascii_file.name + ' is not of any known dialect.')
+
+
+register_dialect(AsciiDialect('chs', 24, CHS_FIELDS, ['number_of_records']))
+register_dialect(AsciiDialect('chs-station', 24, CHS_STATION_FIELDS, ['number_of_records', 'station_name', 'station_id']), False)
+
+#******************************************************************************
+def parse_records(lines, delta_to_utc):
+    """Parse the records of a time series file all at once.
+
+    :param lines: The list of record lines.
+    :param delta_to_utc: The time to add to the record times to get UTC. (timedelta)
+    :returns: A tuple containing arrays of the dates (numpy.datetime64, UTC), directions, and speeds (in m/s).
+    """
+
+    numberOfRows = len(lines)
+
+    #We expect the following: Date (YYYY/MM/DD), HourMinute (hhmm), Direction (deg T), Speed (m/s)
+    components = ''.join(lines).split()
+    if len(components) != 4 * numberOfRows:
+        raise Exception('Record does not have the correct number of values.')
+
+    #decode the dates and times, and then covert them to UTC.
+    timeStrings = [date.replace('/', '-') + 'T' + clock for date, clock in zip(components[0::4], components[1::4])]
+    dateAndTimes = numpy.array(timeStrings, dtype='datetime64[s]')
+    dateAndTimes += numpy.timedelta64(int(delta_to_utc.total_seconds()), 's')
+
+    directions = numpy.array(components[2::4], dtype=numpy.float64)
+    speeds = numpy.array(components[3::4], dtype=numpy.float64)
+
+    return (dateAndTimes, directions, speeds)
+
 
 #******************************************************************************
 class AsciiTimeSeries:
     
 
     #******************************************************************************
-    def __init__(self, file_name):
+    def __init__(self, file_name, cache=None, dialect=None):
+        """Open a time series file and read its header.
+
+        :param file_name: The name of the ASCII time series file.
+        :param cache: The SeriesCache of parsed input files, None to always parse the file.
+        :param dialect: The name of the file's dialect, None to detect it from the header.
+        """
+
         self.file_name = file_name
 
         self.ascii_file = None
+        self.dialect = None
         self.interval = None
         self.start_time = None
         self.end_time = None
@@ -21,100 +265,123 @@ class AsciiTimeSeries:
         self.current_record = 0
         self.latitude = 0
         self.longitude = 0
+        self.station_name = None
+        self.station_id = None
+        self.records = None
+
+        #If the file has been parsed before (with the requested dialect), then use the parsed values.
+        #(Files parsed with a dialect which is only used when given are parsed again when detecting)
+        if cache != None:
+            cached = cache.load(self.file_name)
+            if cached != None and (cached[0]['dialect'] == dialect or (dialect == None and cached[0]['dialect'] in DETECTED_DIALECTS)):
+                header, self.records = cached
+                self.set_header_fields(header)
+                return
         
         #Open the file.
         self.ascii_file = open(self.file_name, 'r')
-        
+
+        if dialect != None:
+            self.dialect = get_dialect(dialect)
+        else:
+            self.dialect = detect_dialect(self.ascii_file)
+
         #Skip the header
         self.read_header()
 
+        #Parse all of the records now, so they can be cached for the next time.
+        if cache != None:
+            dateAndTimes, directions, speeds = self.read_arrays()
+
+            self.records = numpy.empty(self.number_of_records, dtype=series_cache.RECORD_TYPE)
+            self.records['time'] = dateAndTimes.astype(numpy.int64)
+            self.records['direction'] = directions
+            self.records['speed'] = speeds
+
+            cache.store(self.file_name, self.get_header_fields(), self.records)
+
+            self.ascii_file.close()
+            self.current_record = 0
+
 
     #******************************************************************************        
     def read_header(self):
         """Read the header of the time series file."""
 
-        #The header contains 24 rows, so read them all.
-        for rowIndex in range(0, 24):
+        #Read all of the header rows at once, and slice out the fields of the dialect.
+        values = self.dialect.parse_header(self.dialect.read_header_rows(self.ascii_file))
 
-            #Read a line of data
-            data = self.ascii_file.readline()
+        self.unit = values['unit']
 
-            #If this is the 1st row, then lets decode the start date and time.
-            if rowIndex == 0:
-                
-                #66-66  1 : Units of depth  [m: metres, f: feet]
-                self.unit = data[65:66]
+        self.latitude = float(values['latitude_degrees']) + (float(values['latitude_minutes']) / 60.0)
+        if values['latitude_hemisphere'] == 'S':
+            self.latitude *= -1.0
 
-                #68-71  4 : Date (Year) of first data record
-                year = data[67:71]
-                #73-74  2 : Date (Month) of first data record
-                month = data[72:74]
-                #76-77  2 : Date (Day) of first data record
-                day = data[75:77]
+        self.longitude = float(values['longitude_degrees']) + (float(values['longitude_minutes']) / 60.0)
+        if values['longitude_hemisphere'] == 'W':
+            self.longitude *= -1.0
 
-            #If this is the 2nd row, then lets decode the x and y positions.
-            elif rowIndex == 1:
+        #We now have enought information to construct our timestamp.
+        timeNotInUTC = datetime(year = int(values['year']), month = int(values['month']), day = int(values['day']),
+                                hour = int(values['hour']), minute = int(values['minute']), second = int(values['second']), tzinfo = pytz.utc)
 
-                #14-15  2 : Latitude (Degrees)
-                latDeg = data[13:15]
-                #17-23  7 : Latitude (Minutes up to 4 places of decimal)
-                latMin = data[16:23]
+        self.deltaToUTC = timedelta(hours = float(values['utc_offset']))
 
-                self.latitude = float(latDeg) + (float(latMin) / 60.0)
+        #Store the start time as UTC.
+        self.start_time = timeNotInUTC + self.deltaToUTC
 
-                #24-24  1 : 'N' or 'S'
-                if data[23:24] == 'S':
-                    self.latitude *= -1.0
+        self.number_of_records = int(values['number_of_records'])
 
-                #26-28  3 Longitude (Degrees)
-                lonDeg = data[25:28]
-                #30-36  7 : Longitude (Minutes up to 4 places of decimal)
-                lonMin = data[29:36]
+        self.interval = timedelta(hours = int(values['interval_hours']), minutes = int(values['interval_minutes']),
+                                  seconds = int(values['interval_seconds']))
 
-                self.longitude = float(lonDeg) + (float(lonMin) / 60.0)
+        #With the start time, number of records, and interval... we can figure out the end time.
+        self.end_time = self.start_time + (self.number_of_records - 1) * self.interval
 
-                #37-37  1 : 'W' or 'E'
-                if data[36:37] == 'W':
-                    self.longitude *= -1.0
+        #Only some dialects identify the station, and it may still be left blank.
+        if values.get('station_name', '').strip() != '':
+            self.station_name = values['station_name'].strip()
+        if values.get('station_id', '').strip() != '':
+            self.station_id = values['station_id'].strip()
 
 
-                #62-66  5 : Time Zone [# of hours to add to determine UTC, always include + or - and 
-                #           always left justify, (leaves space for Nfld. time). i.e. +03.5]
-                utcOffset = data[61:66]
+    #******************************************************************************
+    def get_header_fields(self):
+        """Retrieve the decoded header fields, so they can be cached.
 
-                #68-69  2 : Time (Hour)   of first data record
-                hour = data[67:69]
-                #70-71  2 : Time (Minute) of first data record
-                minute = data[69:71]
-                #73-74  2 : Time (Second) of first data record
-                seconds = data[72:74]
-                
-                #We now have enought information to construct our timestamp.
-                timeNotInUTC = datetime(year = int(year), month = int(month), day = int(day),
-                                                  hour = int(hour), minute = int(minute), second = int(seconds),  tzinfo = pytz.utc)
-                                
-                self.deltaToUTC = timedelta(hours = float(utcOffset))
+        :returns: A dictionary of the header fields.
+        """
 
-                #Store the start time as UTC.
-                self.start_time = timeNotInUTC + self.deltaToUTC
+        return {'dialect': self.dialect.name,
+                'unit': self.unit,
+                'latitude': self.latitude,
+                'longitude': self.longitude,
+                'start_time': self.start_time.isoformat(),
+                'delta_to_utc': self.deltaToUTC.total_seconds(),
+                'number_of_records': self.number_of_records,
+                'interval': self.interval.total_seconds(),
+                'station_name': self.station_name,
+                'station_id': self.station_id}
 
-            #If this is the 3rd row, then lets decode the number of records in the file.
-            elif rowIndex == 2:
-                
-                #col 01-10 10 : Number of Records to follow header
-                self.number_of_records = int(data[0:10])
 
-                #68-69  2 : Sampling interval (Hours)
-                sampleHours = data[67:69]
-                #70-71  2 : Sampling interval (Minutes)
-                sampleMinutes = data[69:71]
-                #73-74  2 : Sampling interval (Seconds)
-                sampleSeconds = data[72:74]
+    #******************************************************************************
+    def set_header_fields(self, header):
+        """Restore the decoded header fields from the cache.
 
-                self.interval = timedelta(hours = int(sampleHours), minutes = int(sampleMinutes), seconds = int(sampleSeconds))
+        :param header: A dictionary of the header fields.
+        """
 
-                #With the start time, number of records, and interval... we can figure out the end time.
-                self.end_time = self.start_time + (self.number_of_records - 1) * self.interval
+        self.dialect = get_dialect(header['dialect'])
+        self.unit = header['unit']
+        self.latitude = header['latitude']
+        self.longitude = header['longitude']
+        self.start_time = datetime.fromisoformat(header['start_time'])
+        self.deltaToUTC = timedelta(seconds = header['delta_to_utc'])
+        self.number_of_records = header['number_of_records']
+        self.interval = timedelta(seconds = header['interval'])
+        self.end_time = self.start_time + (self.number_of_records - 1) * self.interval
+        self.station_name = header['station_name']
+        self.station_id = header['station_id']
 
 
     #******************************************************************************
@@ -130,6 +397,25 @@ class AsciiTimeSeries:
         return True
 
 
+    #******************************************************************************
+    def read_validated_arrays(self):
+        """Read all of the records from the time series file at once, and check them against the header.
+
+        :returns: A tuple containing arrays of the dates (numpy.datetime64, UTC), directions, and speeds (in m/s).
+        """
+
+        if self.current_record != 0:
+            raise Exception('The records can only be validated when none have been read.')
+
+        dateAndTimes, directions, speeds = self.read_arrays()
+
+        problems = validate_records(dateAndTimes, directions, speeds, self.start_time, self.interval, self.number_of_records)
+        if len(problems) > 0:
+            raise Exception('Invalid records in ' + self.file_name + ': ' + '; '.join(problems) + '.')
+
+        return (dateAndTimes, directions, speeds)
+
+
     #******************************************************************************
     def read_next_row(self):
         """Read the next row of data from the time series file.
@@ -141,6 +427,14 @@ class AsciiTimeSeries:
         if self.done():
             raise Exception('AsciiTimeSeries is done!')
 
+        #If the records have already been parsed, then just return the next one.
+        if self.records is not None:
+            record = self.records[self.current_record]
+            self.current_record += 1
+
+            dateAndTime = numpy.datetime64(int(record['time']), 's').astype(datetime)
+            return (dateAndTime, float(record['direction']), float(record['speed']))
+
         self.current_record += 1
         asciiData = self.ascii_file.readline()
 
@@ -161,3 +455,97 @@ class AsciiTimeSeries:
 
         #Return a tuple with dateAndTime, direction, and speed
         return (dateAndTime, direction, speed)
+
+
+    #******************************************************************************
+    def read_arrays(self):
+        """Read all of the remaining rows of data from the time series file at once.
+
+        :returns: A tuple containing arrays of the dates (numpy.datetime64, UTC), directions, and speeds (in m/s).
+        """
+
+        numberOfRows = self.number_of_records - self.current_record
+
+        #If the records have already been parsed, then just return the rest of them.
+        if self.records is not None:
+            records = self.records[self.current_record:]
+            self.current_record = self.number_of_records
+
+            return (records['time'].astype('datetime64[s]'), numpy.asarray(records['direction']), numpy.asarray(records['speed']))
+
+        lines = list(itertools.islice(self.ascii_file, numberOfRows))
+        if len(lines) != numberOfRows:
+            raise Exception('The time series file contains fewer records than its header specifies.')
+
+        self.current_record += numberOfRows
+
+        return parse_records(lines, self.deltaToUTC)
+
+
+#The maximum number of offending record indices listed for each problem.
+MAX_REPORTED_RECORDS = 10
+
+#******************************************************************************
+def format_indices(indices):
+    """Format a list of offending record indices for an error message.
+
+    :param indices: Array of record indices.
+    :returns: The formatted indices, truncated to MAX_REPORTED_RECORDS.
+    """
+
+    text = ', '.join(str(index) for index in indices[:MAX_REPORTED_RECORDS])
+    if indices.shape[0] > MAX_REPORTED_RECORDS:
+        text += ', ...'
+
+    return text
+
+
+#******************************************************************************
+def validate_records(date_and_times, directions, speeds, start_time, interval, number_of_records):
+    """Check the parsed records of a time series against its header, all at once.
+
+    :param date_and_times: Array of record times (numpy.datetime64, UTC).
+    :param directions: Array of direction values (degrees true).
+    :param speeds: Array of speed values.
+    :param start_time: The time of the first record, from the header.
+    :param interval: The time interval between records, from the header.
+    :param number_of_records: The number of records, from the header.
+    :returns: A list of the problems found, empty if the records are valid.
+    """
+
+    problems = []
+
+    numberOfRecords = date_and_times.shape[0]
+    if numberOfRecords != number_of_records:
+        problems.append('the header specifies ' + str(number_of_records) + ' records but ' + str(numberOfRecords) + ' were read')
+
+    if numberOfRecords == 0:
+        return problems
+
+    #The first record must be at the start time.
+    startTime = numpy.datetime64(start_time.astimezone(pytz.utc).replace(tzinfo=None), 's')
+    if date_and_times[0] != startTime:
+        problems.append('the first record is at ' + str(date_and_times[0]) + ' rather than the start time ' + str(startTime))
+
+    #Every other record must follow the one before by exactly the interval.
+    steps = numpy.diff(date_and_times).astype(numpy.int64)
+    intervalSeconds = int(interval.total_seconds())
+
+    indices = numpy.flatnonzero(steps <= 0) + 1
+    if indices.shape[0] > 0:
+        problems.append(str(indices.shape[0]) + ' records are not after the previous record (records ' + format_indices(indices) + ')')
+
+    indices = numpy.flatnonzero((steps > 0) & (steps != intervalSeconds)) + 1
+    if indices.shape[0] > 0:
+        problems.append(str(indices.shape[0]) + ' records are not one interval after the previous record (records ' + format_indices(indices) + ')')
+
+    #The comparisons are negated so that NaN values are caught as well.
+    indices = numpy.flatnonzero(~((directions >= 0.0) & (directions < 360.0)))
+    if indices.shape[0] > 0:
+        problems.append(str(indices.shape[0]) + ' directions are not in [0, 360) (records ' + format_indices(indices) + ')')
+
+    indices = numpy.flatnonzero(~(speeds >= 0.0))
+    if indices.shape[0] > 0:
+        problems.append(str(indices.shape[0]) + ' speeds are negative (records ' + format_indices(indices) + ')')
+
+    return problems
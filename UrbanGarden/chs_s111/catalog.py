@@ -0,0 +1,386 @@
+#******************************************************************************
+#
+#******************************************************************************
+import concurrent.futures
+import os
+import sqlite3
+from datetime import timedelta
+import h5py
+from chs_s111 import group_statistics
+from chs_s111 import metadata
+
+#The version of the catalog layout, stored so future layouts can be detected.
+CATALOG_VERSION = 2
+
+#The earlier catalog versions, which are rebuilt since their records are missing columns. (The files are indexed again)
+REBUILT_VERSIONS = (1,)
+
+#The tables (and indices) of the catalog. Times are stored in the S-111 time format, which sorts as text.
+SCHEMA = ["""CREATE TABLE IF NOT EXISTS files (
+               id INTEGER PRIMARY KEY,
+               path TEXT UNIQUE NOT NULL,
+               size INTEGER NOT NULL,
+               mtime INTEGER NOT NULL,
+               dataCodingFormat INTEGER,
+               dateTimeOfFirstRecord TEXT,
+               dateTimeOfLastRecord TEXT,
+               westBoundLongitude REAL,
+               eastBoundLongitude REAL,
+               southBoundLatitude REAL,
+               northBoundLatitude REAL,
+               minSurfCurrentSpeed REAL,
+               maxSurfCurrentSpeed REAL,
+               numberOfStations INTEGER,
+               numberOfTimes INTEGER,
+               error TEXT)""",
+          """CREATE TABLE IF NOT EXISTS groups (
+               fileId INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+               groupIndex INTEGER NOT NULL,
+               title TEXT,
+               startTime TEXT,
+               endTime TEXT,
+               x REAL,
+               y REAL,
+               minSurfCurrentSpeed REAL,
+               maxSurfCurrentSpeed REAL,
+               stationName TEXT,
+               stationId TEXT,
+               PRIMARY KEY (fileId, groupIndex))""",
+          "CREATE INDEX IF NOT EXISTS filesByTime ON files (dateTimeOfFirstRecord, dateTimeOfLastRecord)",
+          "CREATE INDEX IF NOT EXISTS filesByLongitude ON files (westBoundLongitude, eastBoundLongitude)",
+          "CREATE INDEX IF NOT EXISTS groupsByTime ON groups (startTime, endTime)",
+          "CREATE INDEX IF NOT EXISTS groupsByStation ON groups (stationName, stationId)"]
+
+#The columns of the files table filled from a file record.
+FILE_COLUMNS = ['dataCodingFormat', 'dateTimeOfFirstRecord', 'dateTimeOfLastRecord',
+                'westBoundLongitude', 'eastBoundLongitude', 'southBoundLatitude', 'northBoundLatitude',
+                'minSurfCurrentSpeed', 'maxSurfCurrentSpeed', 'numberOfStations', 'numberOfTimes', 'error']
+
+#******************************************************************************
+def find_s111_files(paths):
+    """Find the S-111 files to be catalogued.
+
+    :param paths: The list of files and directories. (Directories are searched recursively for .h5 files)
+    :returns: The sorted list of absolute file names.
+    """
+
+    fileNames = set()
+
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, directoryNames, directoryFileNames in os.walk(path):
+                for fileName in directoryFileNames:
+                    if fileName.endswith('.h5'):
+                        fileNames.add(os.path.abspath(os.path.join(directory, fileName)))
+        else:
+            fileNames.add(os.path.abspath(path))
+
+    return sorted(fileNames)
+
+
+#******************************************************************************
+def get_optional_attribute(attributes, name, value_type):
+    """Retrieve an attribute converted to a Python type, None if it is missing.
+
+    :param attributes: The HDF attributes.
+    :param name: The name of the attribute.
+    :param value_type: The Python type to convert to. (int, float or str)
+    :returns: The converted value, None if the attribute is missing.
+    """
+
+    if name not in attributes:
+        return None
+
+    if value_type == str:
+        return metadata.decode_string(attributes[name])
+
+    return value_type(attributes[name])
+
+
+#******************************************************************************
+def read_file_record(file_name):
+    """Read the catalog record of an S-111 file. (Runs in a worker process)
+
+    Only the metadata, the group attributes and the positions are read, never the values.
+
+    :param file_name: The name of the S-111 file.
+    :returns: A dictionary of the file columns, and the list of group rows under 'groups'.
+    """
+
+    record = {name: None for name in FILE_COLUMNS}
+    record['groups'] = []
+
+    try:
+        with h5py.File(file_name, "r") as hdf_file:
+            attributes = hdf_file.attrs
+
+            #Files without a coding format (templates, shards) hold no data of their own.
+            if 'dataCodingFormat' not in attributes:
+                return record
+
+            for name in ['dataCodingFormat', 'numberOfStations', 'numberOfTimes']:
+                record[name] = get_optional_attribute(attributes, name, int)
+            for name in ['dateTimeOfFirstRecord', 'dateTimeOfLastRecord']:
+                record[name] = get_optional_attribute(attributes, name, str)
+            for name in ['minSurfCurrentSpeed', 'maxSurfCurrentSpeed']:
+                record[name] = get_optional_attribute(attributes, name, float)
+
+            #The bounds come from the positions, since grid files do not store them.
+            x = y = None
+            if record['dataCodingFormat'] == 2:
+                originX = float(attributes['gridOriginLongitude'])
+                originY = float(attributes['gridOriginLatitude'])
+                bounds = (originX, originX + float(attributes['gridSpacingLongitudinal']) * (int(attributes['numPointsLongitudinal']) - 1),
+                          originY, originY + float(attributes['gridSpacingLatitudinal']) * (int(attributes['numPointsLatitudinal']) - 1))
+            elif 'Group XY' in hdf_file:
+                x = hdf_file['Group XY']['X'][0]
+                y = hdf_file['Group XY']['Y'][0]
+                bounds = (float(x.min()), float(x.max()), float(y.min()), float(y.max())) if x.shape[0] > 0 else (None, None, None, None)
+            else:
+                bounds = (None, None, None, None)
+
+            record['westBoundLongitude'], record['eastBoundLongitude'], record['southBoundLatitude'], record['northBoundLatitude'] = bounds
+
+            isSeries = record['dataCodingFormat'] == 1
+            seriesLength = None
+            if isSeries and 'timeRecordInterval' in attributes:
+                seriesLength = timedelta(seconds=int(attributes['timeRecordInterval']) * (record['numberOfTimes'] - 1))
+
+            for groupName in group_statistics.get_data_group_names(hdf_file):
+                groupIndex = int(groupName[6:])
+                groupAttributes = hdf_file[groupName].attrs
+
+                startTime = endTime = get_optional_attribute(groupAttributes, 'DateTime', str)
+
+                #A station covers its whole series, a grid group a single time.
+                groupX = groupY = None
+                if isSeries:
+                    if startTime != None and seriesLength != None:
+                        endTime = metadata.format_time(metadata.parse_time(startTime) + seriesLength).decode()
+                    if x is not None and groupIndex <= x.shape[0]:
+                        groupX, groupY = float(x[groupIndex - 1]), float(y[groupIndex - 1])
+
+                record['groups'].append((groupIndex, get_optional_attribute(groupAttributes, 'Title', str), startTime, endTime, groupX, groupY,
+                                         get_optional_attribute(groupAttributes, 'minSurfCurrentSpeed', float),
+                                         get_optional_attribute(groupAttributes, 'maxSurfCurrentSpeed', float),
+                                         get_optional_attribute(groupAttributes, 'StationName', str),
+                                         get_optional_attribute(groupAttributes, 'StationID', str)))
+
+    except Exception as error:
+        record = {name: None for name in FILE_COLUMNS}
+        record['groups'] = []
+        record['error'] = str(error)
+
+    return record
+
+
+#******************************************************************************
+def get_group_ranges(group_indices):
+    """Compress a sorted list of group indices into ranges.
+
+    :param group_indices: The sorted list of group indices.
+    :returns: The list of (first, last) group index tuples.
+    """
+
+    ranges = []
+
+    for groupIndex in group_indices:
+        if len(ranges) > 0 and ranges[-1][1] == groupIndex - 1:
+            ranges[-1] = (ranges[-1][0], groupIndex)
+        else:
+            ranges.append((groupIndex, groupIndex))
+
+    return ranges
+
+
+#******************************************************************************
+class Catalog:
+    """A SQLite index of the metadata and groups of an archive of S-111 files.
+
+    Each file is recorded with its size and modification time, so updating the
+    catalog only reads the files that changed since they were indexed.
+    """
+
+    #******************************************************************************
+    def __init__(self, database_file):
+        self.connection = sqlite3.connect(database_file)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, CATALOG_VERSION) + REBUILT_VERSIONS:
+            raise Exception('Unsupported catalog version in ' + database_file)
+
+        with self.connection:
+            if version in REBUILT_VERSIONS:
+                print("Rebuilding the catalog", database_file, "from version", version)
+                self.connection.execute('DROP TABLE IF EXISTS groups')
+                self.connection.execute('DROP TABLE IF EXISTS files')
+
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+            self.connection.execute('PRAGMA user_version = ' + str(CATALOG_VERSION))
+
+
+    #******************************************************************************
+    def close(self):
+        """Close the catalog database."""
+
+        self.connection.close()
+
+
+    #******************************************************************************
+    def __enter__(self):
+        return self
+
+
+    #******************************************************************************
+    def __exit__(self, *args):
+        self.close()
+
+
+    #******************************************************************************
+    def store(self, file_name, stat, record):
+        """Store (or replace) the record of a file.
+
+        :param file_name: The absolute name of the file.
+        :param stat: The os.stat result of the file when it was read.
+        :param record: The dictionary returned by read_file_record.
+        """
+
+        self.connection.execute('DELETE FROM files WHERE path = ?', (file_name,))
+
+        cursor = self.connection.execute('INSERT INTO files (path, size, mtime, ' + ', '.join(FILE_COLUMNS) + ') VALUES (?, ?, ?' + ', ?' * len(FILE_COLUMNS) + ')',
+                                         [file_name, stat.st_size, stat.st_mtime_ns] + [record[name] for name in FILE_COLUMNS])
+        fileId = cursor.lastrowid
+
+        self.connection.executemany('INSERT INTO groups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    [(fileId,) + group for group in record['groups']])
+
+
+    #******************************************************************************
+    def update(self, paths, workers=1, prune=True):
+        """Index the new and changed S-111 files, in parallel worker processes.
+
+        :param paths: The list of files and directories to index.
+        :param workers: The number of worker processes.
+        :param prune: True to remove the records of catalogued files that no longer exist.
+        :returns: A tuple containing the number of files indexed, unchanged and removed.
+        """
+
+        known = {path: (size, mtime) for path, size, mtime in self.connection.execute('SELECT path, size, mtime FROM files')}
+
+        #Only the files whose size or modification time changed are read again.
+        changed = []
+        unchanged = 0
+        for fileName in find_s111_files(paths):
+            stat = os.stat(fileName)
+            if known.get(fileName) == (stat.st_size, stat.st_mtime_ns):
+                unchanged += 1
+            else:
+                changed.append((fileName, stat))
+
+        removed = 0
+
+        with self.connection:
+            if len(changed) > 0:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+                    records = executor.map(read_file_record, [fileName for fileName, stat in changed], chunksize=16)
+
+                    for (fileName, stat), record in zip(changed, records):
+                        if record['error'] != None:
+                            print("Unable to index", fileName, ":", record['error'])
+                        self.store(fileName, stat, record)
+
+            if prune:
+                for path in known:
+                    if not os.path.exists(path):
+                        self.connection.execute('DELETE FROM files WHERE path = ?', (path,))
+                        removed += 1
+
+        return (len(changed), unchanged, removed)
+
+
+    #******************************************************************************
+    def query(self, bbox=None, start_time=None, end_time=None, data_coding_format=None, min_speed=None, station_name=None, station_id=None):
+        """Find the files, and the ranges of their groups, matching a region, time window, speed and station.
+
+        A station matches if its position is in the region, a grid time step if the grid's
+        bounds overlap the region.
+
+        :param bbox: The (west, south, east, north) region, None for no limit.
+        :param start_time: The earliest time, None for no limit.
+        :param end_time: The latest time, None for no limit.
+        :param data_coding_format: The data coding format (1, 2 or 3), None for any.
+        :param min_speed: The speed (knots) the group's maximum must reach, None for no limit.
+        :param station_name: The name of the station, None for any. (Groups without a name never match a name)
+        :param station_id: The identifier of the station, None for any. (Groups without an identifier never match one)
+        :returns: A list of (file name, list of (first, last) group index tuples), sorted by file name.
+        """
+
+        conditions = ['files.dataCodingFormat IS NOT NULL']
+        values = []
+
+        if bbox != None:
+            west, south, east, north = bbox
+            conditions.append('files.westBoundLongitude <= ? AND files.eastBoundLongitude >= ? AND files.southBoundLatitude <= ? AND files.northBoundLatitude >= ?')
+            values.extend([east, west, north, south])
+            conditions.append('(groups.x IS NULL OR (groups.x BETWEEN ? AND ? AND groups.y BETWEEN ? AND ?))')
+            values.extend([west, east, south, north])
+
+        if start_time != None:
+            startValue = metadata.format_time(start_time).decode()
+            conditions.append('files.dateTimeOfLastRecord >= ? AND groups.endTime >= ?')
+            values.extend([startValue, startValue])
+
+        if end_time != None:
+            endValue = metadata.format_time(end_time).decode()
+            conditions.append('files.dateTimeOfFirstRecord <= ? AND groups.startTime <= ?')
+            values.extend([endValue, endValue])
+
+        if data_coding_format != None:
+            conditions.append('files.dataCodingFormat = ?')
+            values.append(int(data_coding_format))
+
+        if min_speed != None:
+            conditions.append('groups.maxSurfCurrentSpeed >= ?')
+            values.append(float(min_speed))
+
+        if station_name != None:
+            conditions.append('groups.stationName = ?')
+            values.append(station_name)
+
+        if station_id != None:
+            conditions.append('groups.stationId = ?')
+            values.append(station_id)
+
+        rows = self.connection.execute('SELECT files.path, groups.groupIndex FROM files JOIN groups ON groups.fileId = files.id WHERE ' +
+                                       ' AND '.join(conditions) + ' ORDER BY files.path, groups.groupIndex', values)
+
+        matches = []
+        groupIndices = []
+        for path, groupIndex in rows:
+            if len(matches) == 0 or matches[-1][0] != path:
+                if len(matches) > 0:
+                    matches[-1] = (matches[-1][0], get_group_ranges(groupIndices))
+                matches.append((path, None))
+                groupIndices = []
+            groupIndices.append(groupIndex)
+
+        if len(matches) > 0:
+            matches[-1] = (matches[-1][0], get_group_ranges(groupIndices))
+
+        return matches
+
+
+    #******************************************************************************
+    def get_groups(self, file_name):
+        """Retrieve the catalogued groups of a file.
+
+        :param file_name: The name of the file.
+        :returns: A list of (group index, title, start time, end time, x, y, min speed, max speed, station name, station id) tuples.
+        """
+
+        return self.connection.execute('SELECT groupIndex, title, startTime, endTime, x, y, groups.minSurfCurrentSpeed, groups.maxSurfCurrentSpeed, '
+                                       'stationName, stationId '
+                                       'FROM groups JOIN files ON groups.fileId = files.id WHERE files.path = ? ORDER BY groupIndex',
+                                       (os.path.abspath(file_name),)).fetchall()
@@ -0,0 +1,140 @@
+#******************************************************************************
+#
+#******************************************************************************
+import collections
+import numpy
+from chs_s111 import current_vectors
+
+#The supported component units.
+UNITS = ['m/s', 'knots']
+
+#The default number of values converted at a time.
+DEFAULT_CHUNK_SIZE = 65536
+
+#******************************************************************************
+class ComponentReader:
+    """Read the eastward/northward current components of the groups of an S-111 file.
+
+    The stored speeds and directions are converted a chunk at a time. The converted
+    groups are kept in a least recently used cache, bounded in bytes, so repeated
+    queries of the same group are not converted again.
+    """
+
+    #******************************************************************************
+    def __init__(self, hdf_file, cache_size=0, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Create the reader.
+
+        :param hdf_file: The S-111 HDF file.
+        :param cache_size: The maximum size (in bytes) of the converted groups kept, 0 for no cache.
+        :param chunk_size: The maximum number of values converted at a time.
+        """
+
+        self.hdf_file = hdf_file
+        self.cache_size = cache_size
+        self.chunk_size = max(1, chunk_size)
+
+        self.cache = collections.OrderedDict()
+        self.cached_bytes = 0
+
+        #Regular grids flag their land points with the land mask value.
+        self.land_mask_value = None
+        if hdf_file.attrs.get('dataCodingFormat') == 2 and 'gridLandMaskValue' in hdf_file.attrs:
+            self.land_mask_value = hdf_file.attrs['gridLandMaskValue']
+
+
+    #******************************************************************************
+    def convert_group(self, group, units):
+        """Convert the speeds and directions of a group into components.
+
+        :param group: The HDF group containing the Speed and Direction datasets.
+        :param units: The units of the components ('m/s' or 'knots').
+        :returns: A tuple containing the eastward and northward component arrays. (The shape of the datasets)
+        """
+
+        speedDataset = group['Speed']
+        directionDataset = group['Direction']
+
+        u = numpy.empty(speedDataset.shape, dtype=numpy.float64)
+        v = numpy.empty(speedDataset.shape, dtype=numpy.float64)
+
+        #Convert whole rows, as many as fit in a chunk.
+        rowSize = int(numpy.prod(speedDataset.shape[1:]))
+        rowsPerChunk = max(1, self.chunk_size // max(1, rowSize))
+
+        for startRow in range(0, speedDataset.shape[0], rowsPerChunk):
+            rows = slice(startRow, min(speedDataset.shape[0], startRow + rowsPerChunk))
+
+            speeds = speedDataset[rows]
+            directions = directionDataset[rows]
+
+            #The speeds are stored in knots.
+            if units == 'm/s':
+                speeds = speeds / current_vectors.ms2Knots
+
+            u[rows], v[rows] = current_vectors.direction_speed_to_components(directions, speeds)
+
+            if self.land_mask_value != None:
+                land = speedDataset[rows] == self.land_mask_value
+                u[rows][land] = numpy.nan
+                v[rows][land] = numpy.nan
+
+        return u, v
+
+
+    #******************************************************************************
+    def get_components(self, group_index, units='m/s'):
+        """Retrieve the eastward/northward components of a group.
+
+        For time series the group is a station, for grids it is a time step. Land
+        points of regular grids are returned as NaN.
+
+        :param group_index: The one based index of the group.
+        :param units: The units of the components ('m/s' or 'knots').
+        :returns: A tuple containing the eastward and northward component arrays. (Read only, when cached)
+        """
+
+        if units not in UNITS:
+            raise Exception('Unknown component units ' + str(units))
+
+        key = (group_index, units)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        components = self.convert_group(self.hdf_file['Group ' + str(group_index)], units)
+
+        self.store(key, components)
+
+        return components
+
+
+    #******************************************************************************
+    def store(self, key, components):
+        """Keep converted components, evicting the least recently used ones if needed.
+
+        :param key: The (group index, units) the components were converted for.
+        :param components: The tuple of component arrays.
+        """
+
+        size = sum(values.nbytes for values in components)
+        if size > self.cache_size:
+            return
+
+        #The cached arrays are shared between callers, so make sure none of them change them.
+        for values in components:
+            values.flags.writeable = False
+
+        self.cache[key] = components
+        self.cached_bytes += size
+
+        while self.cached_bytes > self.cache_size:
+            evictedKey, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= sum(values.nbytes for values in evicted)
+
+
+    #******************************************************************************
+    def clear(self):
+        """Remove all of the converted components from the cache."""
+
+        self.cache.clear()
+        self.cached_bytes = 0
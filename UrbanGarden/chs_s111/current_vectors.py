@@ -0,0 +1,92 @@
+#******************************************************************************
+#
+#******************************************************************************
+import numpy
+
+ms2Knots = 1.943844
+
+#******************************************************************************
+def compute_direction_speed(ua, va):
+    """Convert velocity components into S-111 direction and speed values.
+
+    This is the vectorized equivalent of converting each value with math.atan2,
+    so whole arrays (of any shape) are converted at once.
+
+    :param ua: Array of velocity values along the x axis in metres per second.
+    :param va: Array of velocity values along the y axis in metres per second.
+    :returns: A tuple containing the directions (degrees true) and speeds (knots).
+    """
+
+    #Convert from metres per second to knots
+    u_knot = numpy.asarray(ua, dtype=numpy.float64) * ms2Knots
+    v_knot = numpy.asarray(va, dtype=numpy.float64) * ms2Knots
+
+    return components_to_direction_speed(u_knot, v_knot)
+
+
+#******************************************************************************
+def components_to_direction_speed(u, v):
+    """Convert eastward/northward components into direction and speed values. (Without changing units)
+
+    :param u: Array of eastward components.
+    :param v: Array of northward components.
+    :returns: A tuple containing the directions (degrees true) and speeds (the units of the components).
+    """
+
+    u = numpy.asarray(u, dtype=numpy.float64)
+    v = numpy.asarray(v, dtype=numpy.float64)
+
+    speeds = numpy.sqrt(u * u + v * v)
+
+    directions = 90.0 - numpy.degrees(numpy.arctan2(v, u))
+
+    #The direction must always be positive.
+    directions = numpy.where(directions < 0.0, directions + 360.0, directions)
+
+    return directions, speeds
+
+
+#******************************************************************************
+def direction_speed_to_components(directions, speeds):
+    """Convert direction and speed values into eastward/northward components. (Without changing units)
+
+    :param directions: Array of directions (degrees true, the direction the current flows towards).
+    :param speeds: Array of speeds.
+    :returns: A tuple containing the eastward and northward components (the units of the speeds).
+    """
+
+    radians = numpy.radians(numpy.asarray(directions, dtype=numpy.float64))
+    speeds = numpy.asarray(speeds, dtype=numpy.float64)
+
+    return speeds * numpy.sin(radians), speeds * numpy.cos(radians)
+
+
+#******************************************************************************
+def compute_direction_speed_into(ua, va, directions, speeds, u_knot, v_knot):
+    """Convert velocity components into S-111 direction and speed values, in preallocated arrays.
+
+    The results are identical to compute_direction_speed, but no arrays are allocated.
+
+    :param ua: Array of velocity values along the x axis in metres per second.
+    :param va: Array of velocity values along the y axis in metres per second.
+    :param directions: The array receiving the directions (degrees true).
+    :param speeds: The array receiving the speeds (knots).
+    :param u_knot: A scratch array, receiving the x components in knots.
+    :param v_knot: A scratch array, receiving the y components in knots.
+    """
+
+    #Convert from metres per second to knots
+    numpy.multiply(ua, ms2Knots, out=u_knot, dtype=numpy.float64)
+    numpy.multiply(va, ms2Knots, out=v_knot, dtype=numpy.float64)
+
+    numpy.multiply(u_knot, u_knot, out=speeds)
+    numpy.multiply(v_knot, v_knot, out=directions)
+    numpy.add(speeds, directions, out=speeds)
+    numpy.sqrt(speeds, out=speeds)
+
+    numpy.arctan2(v_knot, u_knot, out=directions)
+    numpy.degrees(directions, out=directions)
+    numpy.subtract(90.0, directions, out=directions)
+
+    #The direction must always be positive.
+    numpy.add(directions, 360.0, out=directions, where=directions < 0.0)
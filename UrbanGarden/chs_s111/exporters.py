@@ -0,0 +1,341 @@
+#******************************************************************************
+#
+#******************************************************************************
+import csv
+import numpy
+import pytz
+from chs_s111 import metadata
+
+#The supported export formats.
+FORMATS = ['csv', 'geojson', 'npy']
+
+#The default number of values read (and written) at a time.
+DEFAULT_CHUNK_SIZE = 65536
+
+#The layout of the exported records. (The index is the station number for time series, the node or point index for grids)
+EXPORT_TYPE = numpy.dtype([('time', 'datetime64[s]'), ('index', numpy.int64), ('x', numpy.float64),
+                           ('y', numpy.float64), ('direction', numpy.float64), ('speed', numpy.float64)])
+
+#The number of bytes reserved for the .npy header, so the record count can be filled in at the end.
+NPY_HEADER_LENGTH = 256
+
+#******************************************************************************
+def to_datetime64(value):
+    """Convert a date and time into a numpy.datetime64 (UTC).
+
+    :param value: The date and time, None for no value.
+    :returns: The numpy.datetime64, or None.
+    """
+
+    if value == None:
+        return None
+
+    #Naive values are taken to be in UTC.
+    if value.tzinfo != None:
+        value = value.astimezone(pytz.utc).replace(tzinfo=None)
+
+    return numpy.datetime64(value, 's')
+
+
+#******************************************************************************
+def make_chunk(times, indices, x, y, directions, speeds):
+    """Assemble the exported records of a chunk.
+
+    :returns: The array of records. (EXPORT_TYPE)
+    """
+
+    chunk = numpy.empty(directions.shape[0], dtype=EXPORT_TYPE)
+    chunk['time'] = times
+    chunk['index'] = indices
+    chunk['x'] = x
+    chunk['y'] = y
+    chunk['direction'] = directions
+    chunk['speed'] = speeds
+
+    return chunk
+
+
+#******************************************************************************
+def in_bbox(x, y, bbox):
+    """Determine which positions are in a bounding box.
+
+    :param x: Array of x coordinates.
+    :param y: Array of y coordinates.
+    :param bbox: The bounding box (west, south, east, north), None for no limit.
+    :returns: A boolean array, true for the positions in the bounding box.
+    """
+
+    if bbox == None:
+        return numpy.ones(x.shape, dtype=bool)
+
+    west, south, east, north = bbox
+    return (x >= west) & (x <= east) & (y >= south) & (y <= north)
+
+
+#******************************************************************************
+def iter_series_chunks(hdf_file, start_time=None, end_time=None, bbox=None, stations=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the station series of a time series file in chunks.
+
+    The records in the time window are found from each station's start time and the
+    record interval, so only they are read.
+
+    :param hdf_file: The S-111 HDF file.
+    :param start_time: The earliest time to export, None for no limit.
+    :param end_time: The latest time to export, None for no limit.
+    :param bbox: The bounding box (west, south, east, north) of the stations to export, None for no limit.
+    :param stations: The list of (one based) station numbers to export, None for all stations.
+    :param chunk_size: The maximum number of records read at a time.
+    :returns: A generator of record arrays. (EXPORT_TYPE)
+    """
+
+    numberOfStations = int(hdf_file.attrs['numberOfStations'])
+    if numberOfStations == 0:
+        return
+
+    interval = numpy.timedelta64(int(hdf_file.attrs['timeRecordInterval']), 's')
+    startTime = to_datetime64(start_time)
+    endTime = to_datetime64(end_time)
+
+    longitudes = hdf_file['Group XY']['X'][0]
+    latitudes = hdf_file['Group XY']['Y'][0]
+
+    selected = in_bbox(longitudes, latitudes, bbox)
+    if stations != None:
+        wanted = numpy.zeros(numberOfStations, dtype=bool)
+        wanted[[station - 1 for station in stations if 0 < station <= numberOfStations]] = True
+        selected &= wanted
+
+    for stationIndex in numpy.flatnonzero(selected):
+        group = hdf_file['Group ' + str(stationIndex + 1)]
+        numberOfRecords = group['Speed'].shape[1]
+        firstTime = to_datetime64(metadata.parse_time(group.attrs['DateTime']))
+
+        #Find the records in the time window.
+        firstRecord = 0
+        if startTime != None and startTime > firstTime:
+            firstRecord = -((firstTime - startTime) // interval)
+
+        lastRecord = numberOfRecords
+        if endTime != None:
+            lastRecord = min(lastRecord, max(0, int((endTime - firstTime) // interval) + 1))
+
+        for startRecord in range(firstRecord, lastRecord, chunk_size):
+            endRecord = min(lastRecord, startRecord + chunk_size)
+
+            times = firstTime + numpy.arange(startRecord, endRecord) * interval
+            yield make_chunk(times, stationIndex + 1, longitudes[stationIndex], latitudes[stationIndex],
+                             group['Direction'][0, startRecord:endRecord], group['Speed'][0, startRecord:endRecord])
+
+
+#******************************************************************************
+def get_grid_layout(hdf_file, chunk_size):
+    """Retrieve how the points of a grid file are read.
+
+    :param hdf_file: The S-111 HDF file.
+    :param chunk_size: The maximum number of points read at a time.
+    :returns: A tuple containing the number of points, the number of points per chunk, a function reading the positions of a range of points, and a function reading the values of a range of points from a group.
+    """
+
+    dataCodingFormat = hdf_file.attrs['dataCodingFormat']
+
+    if dataCodingFormat == 3:
+        xDataset = hdf_file['Group XY']['X']
+        yDataset = hdf_file['Group XY']['Y']
+
+        def read_positions(start, end):
+            return xDataset[0, start:end], yDataset[0, start:end]
+
+        def read_values(group, start, end):
+            return group['Direction'][0, start:end], group['Speed'][0, start:end]
+
+        return xDataset.shape[1], chunk_size, read_positions, read_values
+
+    #Regular grids are read in whole rows, from the origin.
+    numLongitudinal = int(hdf_file.attrs['numPointsLongitudinal'])
+    numLatitudinal = int(hdf_file.attrs['numPointsLatitudinal'])
+    originX = hdf_file.attrs['gridOriginLongitude']
+    originY = hdf_file.attrs['gridOriginLatitude']
+    spacingX = hdf_file.attrs['gridSpacingLongitudinal']
+    spacingY = hdf_file.attrs['gridSpacingLatitudinal']
+
+    def read_positions(start, end):
+        points = numpy.arange(start, end)
+        return originX + spacingX * (points % numLongitudinal), originY + spacingY * (points // numLongitudinal)
+
+    def read_values(group, start, end):
+        rows = slice(start // numLongitudinal, end // numLongitudinal)
+        return group['Direction'][rows].ravel(), group['Speed'][rows].ravel()
+
+    chunkPoints = max(1, chunk_size // numLongitudinal) * numLongitudinal
+
+    return numLongitudinal * numLatitudinal, chunkPoints, read_positions, read_values
+
+
+#******************************************************************************
+def iter_grid_chunks(hdf_file, start_time=None, end_time=None, bbox=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the time steps of a grid file in chunks of points.
+
+    Land points of regular grids are not exported.
+
+    :param hdf_file: The S-111 HDF file.
+    :param start_time: The earliest time to export, None for no limit.
+    :param end_time: The latest time to export, None for no limit.
+    :param bbox: The bounding box (west, south, east, north) of the points to export, None for no limit.
+    :param chunk_size: The maximum number of points read at a time.
+    :returns: A generator of record arrays. (EXPORT_TYPE)
+    """
+
+    numberOfTimes = int(hdf_file.attrs['numberOfTimes'])
+    numberOfPoints, chunkPoints, read_positions, read_values = get_grid_layout(hdf_file, chunk_size)
+
+    landMaskValue = None
+    if hdf_file.attrs['dataCodingFormat'] == 2 and 'gridLandMaskValue' in hdf_file.attrs:
+        landMaskValue = hdf_file.attrs['gridLandMaskValue']
+
+    startTime = to_datetime64(start_time)
+    endTime = to_datetime64(end_time)
+
+    for timeIndex in range(0, numberOfTimes):
+        group = hdf_file['Group ' + str(timeIndex + 1)]
+        groupTime = to_datetime64(metadata.parse_time(group.attrs['DateTime']))
+
+        if (startTime != None and groupTime < startTime) or (endTime != None and groupTime > endTime):
+            continue
+
+        for startPoint in range(0, numberOfPoints, chunkPoints):
+            endPoint = min(numberOfPoints, startPoint + chunkPoints)
+
+            x, y = read_positions(startPoint, endPoint)
+            selected = in_bbox(x, y, bbox)
+            if not selected.any():
+                continue
+
+            directions, speeds = read_values(group, startPoint, endPoint)
+            if landMaskValue != None:
+                selected &= speeds != landMaskValue
+
+            points = numpy.flatnonzero(selected)
+            yield make_chunk(groupTime, points + startPoint, x[points], y[points], directions[points], speeds[points])
+
+
+#******************************************************************************
+def iter_chunks(hdf_file, start_time=None, end_time=None, bbox=None, stations=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the contents of an S-111 file in chunks, whatever its coding format.
+
+    :param hdf_file: The S-111 HDF file.
+    :param start_time: The earliest time to export, None for no limit.
+    :param end_time: The latest time to export, None for no limit.
+    :param bbox: The bounding box (west, south, east, north) to export, None for no limit.
+    :param stations: The list of (one based) station numbers to export, None for all stations. (Time series only)
+    :param chunk_size: The maximum number of records read at a time.
+    :returns: A generator of record arrays. (EXPORT_TYPE)
+    """
+
+    dataCodingFormat = hdf_file.attrs.get('dataCodingFormat')
+
+    if dataCodingFormat == 1:
+        return iter_series_chunks(hdf_file, start_time, end_time, bbox, stations, chunk_size)
+
+    if dataCodingFormat not in (2, 3):
+        raise Exception('The S-111 file does not contain any data to export.')
+
+    if stations != None:
+        raise Exception('Station filters only apply to time series files.')
+
+    return iter_grid_chunks(hdf_file, start_time, end_time, bbox, chunk_size)
+
+
+#******************************************************************************
+def write_csv(chunks, output_file):
+    """Write the exported records as CSV.
+
+    :param chunks: The generator of record arrays.
+    :param output_file: The open (text) output file.
+    :returns: The number of records written.
+    """
+
+    writer = csv.writer(output_file, lineterminator='\n')
+    writer.writerow(['time', 'index', 'x', 'y', 'direction', 'speed'])
+
+    count = 0
+    for chunk in chunks:
+        times = numpy.char.add(numpy.datetime_as_string(chunk['time'], unit='s'), 'Z')
+        writer.writerows(zip(times.tolist(), chunk['index'].tolist(), chunk['x'].tolist(), chunk['y'].tolist(),
+                             chunk['direction'].tolist(), chunk['speed'].tolist()))
+        count += chunk.shape[0]
+
+    return count
+
+
+#******************************************************************************
+def write_geojson(chunks, output_file):
+    """Write the exported records as newline delimited GeoJSON, one point feature per record.
+
+    :param chunks: The generator of record arrays.
+    :param output_file: The open (text) output file.
+    :returns: The number of records written.
+    """
+
+    featureFormat = ('{"type": "Feature", "geometry": {"type": "Point", "coordinates": [%r, %r]}, '
+                     '"properties": {"time": "%sZ", "index": %d, "direction": %r, "speed": %r}}\n')
+
+    count = 0
+    for chunk in chunks:
+        times = numpy.datetime_as_string(chunk['time'], unit='s')
+        output_file.writelines(featureFormat % values
+                               for values in zip(chunk['x'].tolist(), chunk['y'].tolist(), times.tolist(),
+                                                 chunk['index'].tolist(), chunk['direction'].tolist(), chunk['speed'].tolist()))
+        count += chunk.shape[0]
+
+    return count
+
+
+#******************************************************************************
+def get_npy_header(count):
+    """Create the header of a .npy file of exported records.
+
+    The header is padded to NPY_HEADER_LENGTH, so it can be rewritten once the count is known.
+
+    :param count: The number of records.
+    :returns: The encoded header.
+    """
+
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (numpy.lib.format.dtype_to_descr(EXPORT_TYPE), count)
+
+    #The magic string, version, and header length take 10 bytes, and the header ends with a new line.
+    padding = NPY_HEADER_LENGTH - 10 - len(header) - 1
+    if padding < 0:
+        raise Exception('The .npy header does not fit in the reserved space.')
+
+    header = header + ' ' * padding + '\n'
+
+    return numpy.lib.format.magic(1, 0) + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+#******************************************************************************
+def write_npy(chunks, output_file):
+    """Write the exported records as a .npy file of records. (EXPORT_TYPE)
+
+    The record count is not known until every chunk has been written, so the header
+    is written with room to spare and rewritten at the end.
+
+    :param chunks: The generator of record arrays.
+    :param output_file: The open (binary, seekable) output file.
+    :returns: The number of records written.
+    """
+
+    output_file.write(get_npy_header(0))
+
+    count = 0
+    for chunk in chunks:
+        output_file.write(chunk.tobytes())
+        count += chunk.shape[0]
+
+    output_file.seek(0)
+    output_file.write(get_npy_header(count))
+
+    return count
+
+
+#The function writing each export format.
+WRITERS = {'csv': write_csv, 'geojson': write_geojson, 'npy': write_npy}
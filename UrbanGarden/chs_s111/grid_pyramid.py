@@ -0,0 +1,182 @@
+#******************************************************************************
+#
+#******************************************************************************
+import math
+import numpy
+from chs_s111 import mesh_cache
+
+#The name of the group holding the overview levels.
+OVERVIEWS_GROUP = 'Overviews'
+
+#The number of times the cell size is refined to approach the requested number of nodes.
+THINNING_ITERATIONS = 8
+
+#The version of the cached overview levels, changed when the levels computed from a mesh change.
+OVERVIEWS_VERSION = 2
+
+#******************************************************************************
+def thin_nodes(latitudes, longitudes, target_count):
+    """Spatially thin the nodes, keeping one node per cell of a regular index grid.
+
+    The cell size is refined until roughly target_count cells are occupied, and the
+    node closest to the centre of each occupied cell is kept.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :param target_count: The number of nodes to keep.
+    :returns: A tuple containing the sorted indices of the nodes kept, and the cell size (degrees).
+    """
+
+    west, south = longitudes.min(), latitudes.min()
+    width = max(longitudes.max() - west, 1e-9)
+    height = max(latitudes.max() - south, 1e-9)
+
+    target_count = max(1, target_count)
+    cellSize = math.sqrt(width * height / target_count)
+
+    for iteration in range(0, THINNING_ITERATIONS):
+        columns = numpy.floor((longitudes - west) / cellSize)
+        rows = numpy.floor((latitudes - south) / cellSize)
+        cell = rows * (math.floor(width / cellSize) + 1) + columns
+
+        #Keep the node closest to the centre of each cell.
+        offsetX = longitudes - (west + (columns + 0.5) * cellSize)
+        offsetY = latitudes - (south + (rows + 0.5) * cellSize)
+        order = numpy.lexsort((offsetX * offsetX + offsetY * offsetY, cell))
+        cells, first = numpy.unique(cell[order], return_index=True)
+
+        #The nodes kept are those of this cell size, even if the loop ends without reaching the target.
+        resolution = cellSize
+
+        count = cells.shape[0]
+        if abs(count - target_count) <= 0.1 * target_count:
+            break
+
+        cellSize *= math.sqrt(count / target_count)
+
+    return numpy.sort(order[first]), resolution
+
+
+#******************************************************************************
+def compute_overview_levels(latitudes, longitudes, factors, cache=None):
+    """Compute the nodes of each overview level.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :param factors: The list of decimation factors (e.g. [4, 16]), one per level.
+    :param cache: The MeshCache to use, None to always compute the levels.
+    :returns: A list of levels (finest first), each a dictionary with the 'factor', the 'resolution' (degrees) and the sorted 'nodes'.
+    """
+
+    latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+    longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+    numberOfNodes = latitudes.shape[0]
+
+    def compute():
+        arrays = dict()
+        for factor in sorted(factors):
+            nodes, resolution = thin_nodes(latitudes, longitudes, numberOfNodes // factor)
+            arrays['nodes' + str(factor)] = nodes
+            arrays['resolution' + str(factor)] = numpy.array(resolution)
+        return arrays
+
+    if cache == None:
+        arrays = compute()
+    else:
+        meshHash = mesh_cache.compute_mesh_hash(latitudes, longitudes)
+        arrays = cache.get_or_compute(meshHash, 'overviews', {'factors': sorted(factors), 'version': OVERVIEWS_VERSION}, compute)
+
+    return [{'factor': factor,
+             'resolution': float(arrays['resolution' + str(factor)]),
+             'nodes': arrays['nodes' + str(factor)]}
+            for factor in sorted(factors)]
+
+
+#******************************************************************************
+def create_overview_groups(hdf_file, levels, latitudes, longitudes):
+    """Create the overview level groups, with their node mapping and positions.
+
+    :param hdf_file: The S-111 HDF file.
+    :param levels: The list of overview levels from compute_overview_levels.
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :returns: The list of level groups created, in the order of the levels.
+    """
+
+    latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+    longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+
+    overviews = hdf_file.create_group(OVERVIEWS_GROUP)
+
+    #The nominal resolution of the full data, for choosing between it and the levels.
+    width = max(longitudes.max() - longitudes.min(), 1e-9)
+    height = max(latitudes.max() - latitudes.min(), 1e-9)
+    overviews.attrs.create('resolution', math.sqrt(width * height / latitudes.shape[0]), dtype=numpy.float64)
+
+    levelGroups = []
+    for index, level in enumerate(levels):
+        nodes = level['nodes']
+        numberOfNodes = nodes.shape[0]
+
+        levelName = 'Level ' + str(index + 1)
+        print("Creating overview", levelName, "with", numberOfNodes, "nodes.")
+        levelGroup = overviews.create_group(levelName)
+
+        levelGroup.attrs.create('decimationFactor', level['factor'], dtype=numpy.int64)
+        levelGroup.attrs.create('resolution', level['resolution'], dtype=numpy.float64)
+        levelGroup.attrs.create('numberOfNodes', numberOfNodes, dtype=numpy.int64)
+
+        #The node mapping, an index into the full resolution Group XY for every node of the level.
+        levelGroup.create_dataset('Nodes', (1, numberOfNodes), dtype=numpy.int64, data=nodes.reshape(1, numberOfNodes))
+        levelGroup.create_dataset('X', (1, numberOfNodes), dtype=numpy.float64, data=longitudes[nodes].reshape(1, numberOfNodes))
+        levelGroup.create_dataset('Y', (1, numberOfNodes), dtype=numpy.float64, data=latitudes[nodes].reshape(1, numberOfNodes))
+
+        levelGroups.append(levelGroup)
+
+    return levelGroups
+
+
+#******************************************************************************
+def select_level(hdf_file, resolution):
+    """Choose the coarsest data that is still at least as fine as the requested resolution.
+
+    :param hdf_file: The S-111 HDF file.
+    :param resolution: The requested resolution (degrees between displayed nodes).
+    :returns: The overview level group, or None if the full resolution data should be used.
+    """
+
+    if OVERVIEWS_GROUP not in hdf_file:
+        return None
+
+    chosen = None
+    for levelGroup in hdf_file[OVERVIEWS_GROUP].values():
+        levelResolution = levelGroup.attrs['resolution']
+        if levelResolution <= resolution and (chosen == None or levelResolution > chosen.attrs['resolution']):
+            chosen = levelGroup
+
+    return chosen
+
+
+#******************************************************************************
+def read_grid(hdf_file, group_index, resolution=0.0):
+    """Read one time step of an irregular grid at the requested resolution.
+
+    :param hdf_file: The S-111 HDF file.
+    :param group_index: The one based index of the time group.
+    :param resolution: The requested resolution (degrees between displayed nodes). (0 for the full resolution)
+    :returns: A tuple containing the x, y, direction and speed arrays.
+    """
+
+    groupName = 'Group ' + str(group_index)
+    levelGroup = select_level(hdf_file, resolution)
+
+    #Fall back to the full resolution data.
+    if levelGroup == None:
+        levelGroup = hdf_file
+        positions = hdf_file['Group XY']
+    else:
+        positions = levelGroup
+
+    group = levelGroup[groupName]
+
+    return (positions['X'][0], positions['Y'][0], group['Direction'][0], group['Speed'][0])
@@ -0,0 +1,159 @@
+#******************************************************************************
+#
+#******************************************************************************
+import numpy
+import scipy.sparse
+import scipy.spatial
+from chs_s111 import mesh_cache
+
+#******************************************************************************
+class RegularGrid:
+    """The definition of a regular (dataCodingFormat 2) S-111 grid."""
+
+    #******************************************************************************
+    def __init__(self, origin_longitude, origin_latitude, spacing_longitudinal, spacing_latitudinal,
+                 num_points_longitudinal, num_points_latitudinal):
+        self.origin_longitude = float(origin_longitude)
+        self.origin_latitude = float(origin_latitude)
+        self.spacing_longitudinal = float(spacing_longitudinal)
+        self.spacing_latitudinal = float(spacing_latitudinal)
+        self.num_points_longitudinal = int(num_points_longitudinal)
+        self.num_points_latitudinal = int(num_points_latitudinal)
+
+        if self.num_points_longitudinal < 1 or self.num_points_latitudinal < 1:
+            raise Exception('The regular grid must contain at least one point in each direction.')
+
+
+    #******************************************************************************
+    def get_shape(self):
+        """Retrieve the shape of the grid's datasets.
+
+        :returns: A tuple containing the number of rows (latitudinal) and columns (longitudinal).
+        """
+
+        return (self.num_points_latitudinal, self.num_points_longitudinal)
+
+
+    #******************************************************************************
+    def get_positions(self):
+        """Retrieve the position of every grid point, row by row from the origin.
+
+        :returns: A (points by 2) array of longitude, latitude values.
+        """
+
+        longitudes = self.origin_longitude + self.spacing_longitudinal * numpy.arange(self.num_points_longitudinal)
+        latitudes = self.origin_latitude + self.spacing_latitudinal * numpy.arange(self.num_points_latitudinal)
+
+        gridX, gridY = numpy.meshgrid(longitudes, latitudes)
+
+        return numpy.column_stack((gridX.ravel(), gridY.ravel()))
+
+
+#******************************************************************************
+def compute_resampling_weights(latitudes, longitudes, grid, max_edge_length=None):
+    """Triangulate the irregular nodes and compute the barycentric weights of every grid point.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :param grid: The RegularGrid to interpolate onto.
+    :param max_edge_length: Triangles with a longer edge (in degrees) are treated as land. (None to keep all triangles)
+    :returns: A tuple containing the sparse (points by nodes) weight matrix, and a boolean array flagging the points that are land.
+    """
+
+    nodes = numpy.column_stack((numpy.asarray(longitudes, dtype=numpy.float64),
+                                numpy.asarray(latitudes, dtype=numpy.float64)))
+    points = grid.get_positions()
+
+    triangulation = scipy.spatial.Delaunay(nodes)
+    simplex = triangulation.find_simplex(points)
+    inside = simplex >= 0
+
+    #The triangulation fills in concave coastlines and islands, so drop the long triangles that span them.
+    if max_edge_length != None:
+        corners = nodes[triangulation.simplices]
+        edges = corners - numpy.roll(corners, 1, axis=1)
+        longest = numpy.sqrt((edges * edges).sum(axis=2)).max(axis=1)
+        inside[inside] = longest[simplex[inside]] <= max_edge_length
+
+    insidePoints = numpy.nonzero(inside)[0]
+    insideSimplex = simplex[insidePoints]
+
+    #Barycentric coordinates from the triangulation's affine transforms.
+    transform = triangulation.transform[insideSimplex]
+    delta = points[insidePoints] - transform[:, 2]
+    barycentric = numpy.einsum('ijk,ik->ij', transform[:, :2], delta)
+    weights = numpy.column_stack((barycentric, 1.0 - barycentric.sum(axis=1)))
+
+    rows = numpy.repeat(insidePoints, 3)
+    columns = triangulation.simplices[insideSimplex].ravel()
+
+    weightMatrix = scipy.sparse.csr_matrix((weights.ravel(), (rows, columns)), shape=(points.shape[0], nodes.shape[0]))
+
+    return weightMatrix, ~inside
+
+
+#******************************************************************************
+class GridResampler:
+    """Interpolates irregular grid velocity components onto a regular grid with precomputed weights."""
+
+    #******************************************************************************
+    def __init__(self, grid, weights, land_mask):
+        self.grid = grid
+        self.weights = weights
+        self.land_mask = land_mask
+
+
+    #******************************************************************************
+    def resample(self, ua, va):
+        """Interpolate a slab of velocity components onto the regular grid.
+
+        Both components of every time in the slab are interpolated by a single sparse matrix product.
+
+        :param ua: A (times by nodes) array of velocity values along the x axis.
+        :param va: A (times by nodes) array of velocity values along the y axis.
+        :returns: A tuple containing the (times by rows by columns) arrays of interpolated u and v values. (Land points are undefined)
+        """
+
+        ua = numpy.atleast_2d(numpy.asarray(ua, dtype=numpy.float64))
+        va = numpy.atleast_2d(numpy.asarray(va, dtype=numpy.float64))
+        numberOfTimes = ua.shape[0]
+
+        values = self.weights @ numpy.concatenate((ua, va), axis=0).T
+
+        shape = (numberOfTimes,) + self.grid.get_shape()
+        u_grid = values[:, :numberOfTimes].T.reshape(shape)
+        v_grid = values[:, numberOfTimes:].T.reshape(shape)
+
+        return u_grid, v_grid
+
+
+#******************************************************************************
+def get_resampling_weights(latitudes, longitudes, grid, max_edge_length=None, cache=None):
+    """Retrieve the resampling weights of a mesh, from the mesh cache when possible.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :param grid: The RegularGrid to interpolate onto.
+    :param max_edge_length: Triangles with a longer edge (in degrees) are treated as land. (None to keep all triangles)
+    :param cache: The MeshCache to use, None to always compute the weights.
+    :returns: A tuple containing the sparse (points by nodes) weight matrix, and a boolean array flagging the points that are land.
+    """
+
+    if cache == None:
+        return compute_resampling_weights(latitudes, longitudes, grid, max_edge_length)
+
+    parameters = {'grid': [grid.origin_longitude, grid.origin_latitude, grid.spacing_longitudinal, grid.spacing_latitudinal,
+                           grid.num_points_longitudinal, grid.num_points_latitudinal],
+                  'maxEdgeLength': max_edge_length}
+
+    def compute():
+        weights, land_mask = compute_resampling_weights(latitudes, longitudes, grid, max_edge_length)
+        return {'data': weights.data, 'indices': weights.indices, 'indptr': weights.indptr,
+                'shape': numpy.array(weights.shape), 'landMask': land_mask}
+
+    meshHash = mesh_cache.compute_mesh_hash(latitudes, longitudes)
+    arrays = cache.get_or_compute(meshHash, 'weights', parameters, compute)
+
+    weights = scipy.sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+
+    return weights, arrays['landMask']
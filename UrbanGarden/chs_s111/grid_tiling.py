@@ -0,0 +1,191 @@
+#******************************************************************************
+#
+#******************************************************************************
+import numpy
+from chs_s111 import mesh_cache
+
+#The deepest a quadtree is split. (Stops runaway splitting of nodes sharing a position)
+MAX_QUADTREE_DEPTH = 24
+
+#******************************************************************************
+def get_bounds(latitudes, longitudes):
+    """Retrieve the bounding box of a set of positions.
+
+    :param latitudes: Array of latitude values.
+    :param longitudes: Array of longitude values.
+    :returns: A tuple containing the west, south, east and north bounds.
+    """
+
+    return (float(longitudes.min()), float(latitudes.min()), float(longitudes.max()), float(latitudes.max()))
+
+
+#******************************************************************************
+def partition_fixed_grid(latitudes, longitudes, rows, columns):
+    """Partition the nodes into the cells of a fixed grid of tiles.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :param rows: The number of tile rows (south to north).
+    :param columns: The number of tile columns (west to east).
+    :returns: A list of tiles, each a dictionary with the 'bounds' of the tile and the sorted 'nodes' it contains. (Empty tiles are omitted)
+    """
+
+    west, south, east, north = get_bounds(latitudes, longitudes)
+    width = (east - west) / columns
+    height = (north - south) / rows
+
+    #Find the cell of every node. (Nodes on the east/north edge belong to the last cell)
+    if width > 0.0:
+        column = numpy.minimum(((longitudes - west) / width).astype(numpy.int64), columns - 1)
+    else:
+        column = numpy.zeros(longitudes.shape, dtype=numpy.int64)
+
+    if height > 0.0:
+        row = numpy.minimum(((latitudes - south) / height).astype(numpy.int64), rows - 1)
+    else:
+        row = numpy.zeros(latitudes.shape, dtype=numpy.int64)
+
+    cell = row * columns + column
+
+    #Group the nodes by cell in a single sort. (A stable sort keeps the nodes in order within a cell)
+    order = numpy.argsort(cell, kind='stable')
+    cells, starts = numpy.unique(cell[order], return_index=True)
+    ends = numpy.append(starts[1:], order.shape[0])
+
+    tiles = []
+    for cellIndex, start, end in zip(cells, starts, ends):
+        tileRow = cellIndex // columns
+        tileColumn = cellIndex % columns
+
+        bounds = (west + tileColumn * width, south + tileRow * height,
+                  west + (tileColumn + 1) * width, south + (tileRow + 1) * height)
+
+        tiles.append({'bounds': bounds, 'nodes': order[start:end]})
+
+    return tiles
+
+
+#******************************************************************************
+def partition_quadtree(latitudes, longitudes, max_nodes):
+    """Partition the nodes into quadtree tiles containing at most max_nodes each.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :param max_nodes: The maximum number of nodes in a tile.
+    :returns: A list of tiles, each a dictionary with the 'bounds' of the tile and the sorted 'nodes' it contains. (Empty tiles are omitted)
+    """
+
+    tiles = []
+
+    allNodes = numpy.arange(latitudes.shape[0], dtype=numpy.int64)
+    pending = [(get_bounds(latitudes, longitudes), allNodes, 0)]
+
+    while len(pending) > 0:
+        bounds, nodes, depth = pending.pop()
+
+        if nodes.shape[0] <= max_nodes or depth >= MAX_QUADTREE_DEPTH:
+            tiles.append({'bounds': bounds, 'nodes': nodes})
+            continue
+
+        west, south, east, north = bounds
+        middleX = (west + east) / 2.0
+        middleY = (south + north) / 2.0
+
+        eastSide = longitudes[nodes] >= middleX
+        northSide = latitudes[nodes] >= middleY
+
+        #Push the quadrants in reverse, so they are produced south-west to north-east.
+        quadrants = [((middleX, middleY, east, north), eastSide & northSide),
+                     ((west, middleY, middleX, north), ~eastSide & northSide),
+                     ((middleX, south, east, middleY), eastSide & ~northSide),
+                     ((west, south, middleX, middleY), ~eastSide & ~northSide)]
+
+        for quadrantBounds, selected in quadrants:
+            if selected.any():
+                pending.append((quadrantBounds, nodes[selected], depth + 1))
+
+    return tiles
+
+
+#******************************************************************************
+class NodeSubset:
+    """A read-only view of selected nodes of a (times by nodes) array or netCDF variable.
+
+    The view supports the [t0:t1, n0:n1] slicing used by grid_writer. The source is read
+    in contiguous blocks of nodes, so scattered nodes never require reading the whole row.
+    """
+
+    #******************************************************************************
+    def __init__(self, variable, nodes, block_nodes):
+        self.variable = variable
+        self.nodes = numpy.sort(nodes)
+        self.block_nodes = max(1, block_nodes)
+        self.shape = (variable.shape[0], self.nodes.shape[0])
+
+
+    #******************************************************************************
+    def __getitem__(self, key):
+        """Read the values for a slice of times and a slice of the selected nodes.
+
+        :param key: A tuple containing the time slice and the node slice.
+        :returns: A (times by nodes) array of values.
+        """
+
+        timeKey, nodeKey = key
+        selected = self.nodes[nodeKey]
+        numberOfTimes = len(range(*timeKey.indices(self.shape[0])))
+
+        values = numpy.empty((numberOfTimes, selected.shape[0]), dtype=numpy.float64)
+
+        position = 0
+        while position < selected.shape[0]:
+
+            #Read every selected node that falls within the next block of the source.
+            blockStart = selected[position]
+            blockCount = numpy.searchsorted(selected, blockStart + self.block_nodes) - position
+            blockEnd = selected[position + blockCount - 1] + 1
+
+            block = numpy.asarray(self.variable[timeKey, blockStart:blockEnd])
+            values[:, position:position + blockCount] = block[:, selected[position:position + blockCount] - blockStart]
+
+            position += blockCount
+
+        return values
+
+
+#******************************************************************************
+def get_tiles(latitudes, longitudes, tile_parameters, cache=None):
+    """Partition the nodes into tiles, using the tiles from the mesh cache when possible.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :param tile_parameters: A dictionary with the 'tileMode' ('grid' or 'quadtree') and its settings
+                            ('tileRows' and 'tileColumns', or 'tileMaxNodes').
+    :param cache: The MeshCache to use, None to always partition the nodes.
+    :returns: A list of tiles, each a dictionary with the 'bounds' of the tile and the sorted 'nodes' it contains.
+    """
+
+    def partition():
+        if tile_parameters['tileMode'] == 'grid':
+            return partition_fixed_grid(latitudes, longitudes, tile_parameters['tileRows'], tile_parameters['tileColumns'])
+
+        return partition_quadtree(latitudes, longitudes, tile_parameters['tileMaxNodes'])
+
+    if cache == None:
+        return partition()
+
+    #Store the tiles as flat arrays, the nodes of tile k are nodes[offsets[k]:offsets[k + 1]].
+    def compute():
+        tiles = partition()
+        counts = [tile['nodes'].shape[0] for tile in tiles]
+        return {'bounds': numpy.array([tile['bounds'] for tile in tiles], dtype=numpy.float64).reshape(-1, 4),
+                'offsets': numpy.concatenate(([0], numpy.cumsum(counts))).astype(numpy.int64),
+                'nodes': numpy.concatenate([tile['nodes'] for tile in tiles]).astype(numpy.int64)}
+
+    meshHash = mesh_cache.compute_mesh_hash(latitudes, longitudes)
+    arrays = cache.get_or_compute(meshHash, 'tiles', tile_parameters, compute)
+
+    offsets = arrays['offsets']
+    return [{'bounds': tuple(float(value) for value in arrays['bounds'][index]),
+             'nodes': arrays['nodes'][offsets[index]:offsets[index + 1]]}
+            for index in range(0, offsets.shape[0] - 1)]
@@ -0,0 +1,709 @@
+#******************************************************************************
+#
+#******************************************************************************
+from datetime import datetime
+import iso8601
+import numpy
+import pytz
+from chs_s111 import current_vectors
+from chs_s111 import group_hash
+from chs_s111 import group_statistics
+from chs_s111 import metadata
+from chs_s111 import pipeline
+
+#Approximate number of bytes needed per value while a slab is converted. (The u/v
+#input, their float64 copies in knots, the speed and direction, and the temporaries)
+BYTES_PER_VALUE = 72
+
+#The largest number of nodes stored in a single HDF5 chunk.
+MAX_CHUNK_NODES = 65536
+
+#******************************************************************************
+def plan_slabs(number_of_times, number_of_nodes, memory_budget):
+    """Pick the largest slab of values that can be converted within the memory budget.
+
+    :param number_of_times: The number of times in the source data.
+    :param number_of_nodes: The number of nodes for each time in the source data.
+    :param memory_budget: The memory budget in bytes.
+    :returns: A tuple containing the number of times and the number of nodes in a slab.
+    """
+
+    values = max(1, int(memory_budget) // BYTES_PER_VALUE)
+    node_slab = max(1, min(number_of_nodes, values))
+
+    #Keep large slabs aligned with the chunks, so a chunk is never written twice.
+    if node_slab < number_of_nodes and node_slab > MAX_CHUNK_NODES:
+        node_slab -= node_slab % MAX_CHUNK_NODES
+
+    time_slab = max(1, min(number_of_times, values // node_slab))
+
+    return time_slab, node_slab
+
+
+#******************************************************************************
+def get_chunk_nodes(number_of_nodes, node_slab):
+    """Retrieve the number of nodes to store in each HDF5 chunk.
+
+    :param number_of_nodes: The number of nodes in the dataset.
+    :param node_slab: The number of nodes written at a time.
+    :returns: The number of nodes per chunk.
+    """
+
+    return max(1, min(number_of_nodes, node_slab, MAX_CHUNK_NODES))
+
+
+#******************************************************************************
+def verify_grid_shapes(times, latc, lonc, ua, va):
+    """Verify that the source grid arrays have consistent sizes.
+
+    :param times: The list of time values from the source data.
+    :param latc: The list of latitude values from the source data.
+    :param lonc: The list of longitude values from the source data.
+    :param ua: The velocity values along the x axis from the source data.
+    :param va: The velocity values along the y axis from the source data.
+    :returns: A tuple containing the number of times and the number of nodes.
+    """
+
+    #Verify that these arrays are the same size.
+    numberOfTimes = times.shape[0]
+    numberOfVaSeries = va.shape[0]
+    numberOfUaSeries = ua.shape[0]
+    if numberOfTimes != numberOfVaSeries or numberOfTimes != numberOfUaSeries:
+        raise Exception('The number of time values does not match the number of speed and distance values.')
+
+    #Verify that these arrays are the same size.
+    numberOfLat = latc.shape[0]
+    numberOfLon = lonc.shape[0]
+    numberOfVaValues = va.shape[1]
+    numberOfUaValues = ua.shape[1]
+    if numberOfLat != numberOfLon:
+        raise Exception('The input latitude and longitude array are different sizes.')
+    elif numberOfLat != numberOfVaValues or numberOfLat != numberOfUaValues:
+        raise Exception('The number of positions does not match the number of speed and distance values.')
+
+    return numberOfTimes, numberOfLat
+
+
+#******************************************************************************
+def verify_grid_variables(times, latc, lonc, ua, va):
+    """Verify that the source grid variables are consistent.
+
+    :param times: The list of time values from the source data.
+    :param latc: The list of latitude values from the source data.
+    :param lonc: The list of longitude values from the source data.
+    :param ua: The velocity values along the x axis from the source data.
+    :param va: The velocity values along the y axis from the source data.
+    :returns: A tuple containing the number of times and the number of nodes.
+    """
+
+    numberOfTimes, numberOfLat = verify_grid_shapes(times, latc, lonc, ua, va)
+
+    #Verify that the input data is in the correct units.
+    vaUnits = va.getncattr('units')
+    uaUnits = ua.getncattr('units')
+    if vaUnits != uaUnits and vaUnits != 'metres s-1':
+        raise Exception('The input velocity data is stored in an unsupported unit.')
+
+    return numberOfTimes, numberOfLat
+
+
+#******************************************************************************
+def remove_grid_groups(hdf_file, group_names):
+    """Remove the groups of a previously ingested grid, so it can be reprocessed.
+
+    :param hdf_file: The S-111 HDF file.
+    :param group_names: The list of group names created from the previous grid.
+    """
+
+    for group_name in group_names:
+        if group_name in hdf_file:
+            del hdf_file[group_name]
+
+    #The speed extents came from the removed groups, so they no longer apply.
+    for attribute_name in ['minSurfCurrentSpeed', 'maxSurfCurrentSpeed']:
+        if attribute_name in hdf_file.attrs:
+            del hdf_file.attrs[attribute_name]
+
+
+#******************************************************************************
+def parse_grid_time(value):
+    """Decode a time value from the source grid.
+
+    :param value: The character array containing an ISO 8601 time string, or a numpy.datetime64 (UTC).
+    :returns: The time in UTC.
+    """
+
+    #Times given as arrays of numpy.datetime64 values are already decoded.
+    if isinstance(value, numpy.datetime64):
+        return value.astype('datetime64[us]').astype(datetime).replace(tzinfo=pytz.utc)
+
+    strVal = numpy.asarray(value).tobytes().decode()
+    timeVal = iso8601.parse_date(strVal)
+
+    return timeVal.astimezone(pytz.utc)
+
+
+#******************************************************************************
+def update_grid_metadata(hdf_file, numberOfTimes, numberOfValues, minTime, maxTime, interval, minX, minY, maxX, maxY, minSpeed, maxSpeed):
+    """Update the S-111 file's metadata for an irregular grid.
+
+    :param hdf_file: The S-111 HDF file.
+    :param numberOfTimes: The number of times in the source data.
+    :param numberOfValues: The number of values per record in the source data.
+    :param minTime: The minimum temporal extents of the source data.
+    :param maxTime: The maximum temporal extents of the source data.
+    :param interval: The time interval between records of the source data.
+    :param minX: The minimum x coordinate of the source data.
+    :param minY: The minimum y coordinate of the source data.
+    :param maxX: The maximum x coordinate of the source data.
+    :param maxY: The maximum y coordinate of the source data.
+    :param minSpeed: The minimum surface speed of the source data.
+    :param maxSpeed: The maximum surface speed of the source data.
+    """
+
+    #Set the correct coding format.
+    hdf_file.attrs.create('dataCodingFormat', 3, dtype=numpy.int64)
+
+    #Set the number of times.
+    hdf_file.attrs.create('numberOfTimes', numberOfTimes, dtype=numpy.int64)
+
+    #Set the number of nodes.
+    hdf_file.attrs.create('numberOfNodes', numberOfValues, dtype=numpy.int64)
+    
+    #Set the time interval (if we have one)
+    if interval != None:
+        intervalInSeconds = interval.total_seconds()
+        hdf_file.attrs.create('timeRecordInterval', intervalInSeconds, dtype=numpy.int64)
+
+    #Update the temporal extents in the metadata.
+    strVal = minTime.strftime("%Y%m%dT%H%M%SZ")
+    hdf_file.attrs.create('dateTimeOfFirstRecord', strVal.encode())
+    strVal = maxTime.strftime("%Y%m%dT%H%M%SZ")
+    hdf_file.attrs.create('dateTimeOfLastRecord', strVal.encode())
+
+    #Update the geo coverage in the metadata. (These are not set anymore... since 1.09)
+    #hdf_file.attrs.create('westBoundLongitude', minX, dtype=numpy.float64)
+    #hdf_file.attrs.create('eastBoundLongitude', maxX, dtype=numpy.float64)
+    #hdf_file.attrs.create('southBoundLatitude', minY, dtype=numpy.float64)
+    #hdf_file.attrs.create('northBoundLatitude', maxY, dtype=numpy.float64)
+
+    #Update the surface speed values.
+    if 'minSurfCurrentSpeed' in hdf_file.attrs:
+        minSpeed = min(minSpeed, hdf_file.attrs['minSurfCurrentSpeed'])
+
+    if 'maxSurfCurrentSpeed' in hdf_file.attrs:
+        maxSpeed = max(maxSpeed, hdf_file.attrs['maxSurfCurrentSpeed'])
+
+    hdf_file.attrs.create('minSurfCurrentSpeed', minSpeed)
+    hdf_file.attrs.create('maxSurfCurrentSpeed', maxSpeed)
+
+
+#******************************************************************************
+def create_xy_datasets(hdf_file, latc, lonc, node_slab):
+    """Create the XY group containing the position information, one slab of nodes at a time.
+
+    :param hdf_file: The S-111 HDF file.
+    :param latc: An array (or netCDF variable) of latitude values.
+    :param lonc: An array (or netCDF variable) of longitude values.
+    :param node_slab: The number of nodes to read and write at a time.
+    :returns: A tuple containing minimum x, minimum y, maximum x, maximum y values.
+    """
+
+    numberOfNodes = latc.shape[0]
+    chunkNodes = get_chunk_nodes(numberOfNodes, node_slab)
+    minX = minY = maxX = maxY = None
+
+    #Add the 'Group XY' to store the position information.
+    groupName = 'Group XY'
+    print("Creating", groupName, "dataset.")
+    xy_group = hdf_file.create_group(groupName)
+
+    #Add the x and y datasets to the xy group.
+    x_dataset = xy_group.create_dataset('X', (1, numberOfNodes), dtype=numpy.float64, chunks=(1, chunkNodes))
+    y_dataset = xy_group.create_dataset('Y', (1, numberOfNodes), dtype=numpy.float64, chunks=(1, chunkNodes))
+
+    for startNode in range(0, numberOfNodes, node_slab):
+        endNode = min(numberOfNodes, startNode + node_slab)
+
+        longitudes = numpy.asarray(lonc[startNode:endNode], dtype=numpy.float64)
+        latitudes = numpy.asarray(latc[startNode:endNode], dtype=numpy.float64)
+
+        x_dataset[0, startNode:endNode] = longitudes
+        y_dataset[0, startNode:endNode] = latitudes
+
+        #Keep track of the data extents so we can update the metadata.
+        if minX == None:
+            minX, maxX = longitudes.min(), longitudes.max()
+            minY, maxY = latitudes.min(), latitudes.max()
+        else:
+            minX = min(minX, longitudes.min())
+            maxX = max(maxX, longitudes.max())
+            minY = min(minY, latitudes.min())
+            maxY = max(maxY, latitudes.max())
+
+    return (minX, minY, maxX, maxY)
+
+
+#******************************************************************************
+def create_grid_group(hdf_file, index, time_value, number_of_nodes, chunk_nodes):
+    """Create an (empty) irregular grid time group.
+
+    :param hdf_file: The S-111 HDF file.
+    :param index: The zero based index of the time.
+    :param time_value: The time of the group.
+    :param number_of_nodes: The number of nodes in the grid.
+    :param chunk_nodes: The number of nodes per HDF5 chunk.
+    :returns: The new group.
+    """
+
+    newGroupName = 'Group ' + str(index + 1)
+    print("Creating", newGroupName, "dataset.")
+    newGroup = hdf_file.create_group(newGroupName)
+
+    groupTitle = 'Irregular Grid at DateTime ' + str(index + 1)
+    newGroup.attrs.create('Title', groupTitle.encode())
+
+    #Store the start time.
+    strVal = time_value.strftime("%Y%m%dT%H%M%SZ")
+    newGroup.attrs.create('DateTime', strVal.encode())
+
+    newGroup.create_dataset('Direction', (1, number_of_nodes), dtype=numpy.float64, chunks=(1, chunk_nodes))
+    newGroup.create_dataset('Speed', (1, number_of_nodes), dtype=numpy.float64, chunks=(1, chunk_nodes))
+
+    return newGroup
+
+
+#******************************************************************************
+def create_grid_groups(hdf_file, times, ua, va, time_slab, node_slab, overviews=None, pipelined=False, time_range=None):
+    """Create the data groups in the S-111 file, streaming the values in slabs of times and nodes.
+
+    Only ua[t0:t1, n0:n1] and va[t0:t1, n0:n1] (and their converted values) are in memory
+    at any time, so the slab shape bounds the memory used by the conversion. Overview
+    levels are filled from the same slabs, so the values are only converted once.
+    The speed statistics and content hash of each group are computed from the same slabs too.
+
+    When pipelined, the next slab is read and converted in a background thread while
+    the current one is written, using two preallocated slab buffers. (So twice the memory)
+
+    :param hdf_file: The S-111 HDF file.
+    :param times: The list of time values from the source data.
+    :param ua: Array (or netCDF variable) of velocity values along the x axis in metres per second. (times by nodes)
+    :param va: Array (or netCDF variable) of velocity values along the y axis in metres per second. (times by nodes)
+    :param time_slab: The number of times to convert at a time.
+    :param node_slab: The number of nodes to convert at a time.
+    :param overviews: A list of (overview level group, sorted node indices) tuples to fill, None for no overviews.
+    :param pipelined: True to overlap the reading and converting of the values with writing them.
+    :param time_range: The (first, end) time indices of the groups to create, None for all of them. (The groups keep their numbers)
+    :returns: A tuple containing the minimum time, maximum time, time interval, minimum speed, and maximum speed of the source data.
+    """
+
+    numberOfTimes = times.shape[0]
+    numberOfNodes = ua.shape[1]
+
+    firstGroup, endGroup = (0, numberOfTimes) if time_range == None else time_range
+    chunkNodes = get_chunk_nodes(numberOfNodes, node_slab)
+
+    if overviews == None:
+        overviews = []
+
+    overviewGroups = [[] for levelGroup, levelNodes in overviews]
+    overviewSpeeds = [[None, None] for levelGroup, levelNodes in overviews]
+
+    interval = None
+    minTime = maxTime = None
+    minSpeed = maxSpeed = None
+
+    #The statistics of the groups whose values are split over several slabs of nodes.
+    accumulators = dict()
+    hashers = dict()
+
+    #Create all of the groups (and their empty datasets) up front.
+    groups = dict()
+    timeValues = []
+    for index in range(firstGroup, endGroup):
+
+        timeVal = parse_grid_time(times[index])
+        timeValues.append(timeVal)
+
+        #Keep track of the min/max time so we can update the metadata
+        if minTime == None:
+            minTime = maxTime = timeVal
+        else:
+            minTime = min(minTime, timeVal)
+            maxTime = max(maxTime, timeVal)
+
+        groups[index] = create_grid_group(hdf_file, index, timeVal, numberOfNodes, chunkNodes)
+        newGroupName = 'Group ' + str(index + 1)
+
+        for levelIndex, (levelGroup, levelNodes) in enumerate(overviews):
+            levelTimeGroup = levelGroup.create_group(newGroupName)
+            levelTimeGroup.create_dataset('Direction', (1, levelNodes.shape[0]), dtype=numpy.float64)
+            levelTimeGroup.create_dataset('Speed', (1, levelNodes.shape[0]), dtype=numpy.float64)
+            overviewGroups[levelIndex].append(levelTimeGroup)
+
+    #The slabs to be converted, in the order they are written.
+    slabs = [(startTime, min(endGroup, startTime + time_slab), startNode, min(numberOfNodes, startNode + node_slab))
+             for startTime in range(firstGroup, endGroup, time_slab)
+             for startNode in range(0, numberOfNodes, node_slab)]
+
+    slabShape = (min(time_slab, endGroup - firstGroup), min(node_slab, numberOfNodes))
+    buffers = [{name: numpy.empty(slabShape, dtype=numpy.float64) for name in ('Direction', 'Speed', 'u', 'v')}
+               for index in range(0, pipeline.DOUBLE_BUFFERED if pipelined else 1)]
+
+    def convert_slab(slab, buffer):
+        startTime, endTime, startNode, endNode = slab
+        with pipeline.hdf5_lock:
+            uaSlab = numpy.asarray(ua[startTime:endTime, startNode:endNode])
+            vaSlab = numpy.asarray(va[startTime:endTime, startNode:endNode])
+
+        views = {name: values[:endTime - startTime, :endNode - startNode] for name, values in buffer.items()}
+        current_vectors.compute_direction_speed_into(uaSlab, vaSlab, views['Direction'], views['Speed'], views['u'], views['v'])
+
+        return views['Direction'], views['Speed']
+
+    #Convert and write the values one slab at a time.
+    for (startTime, endTime, startNode, endNode), (directions, speeds) in pipeline.run_pipeline(slabs, convert_slab, buffers, pipelined):
+
+        #A slab holding every node of its times gives the exact statistics in one pass.
+        statistics = None
+        if endNode - startNode == numberOfNodes:
+            statistics = group_statistics.compute_statistics(speeds)
+
+        with pipeline.hdf5_lock:
+            for slabIndex in range(0, endTime - startTime):
+                group = groups[startTime + slabIndex]
+                group['Direction'][0, startNode:endNode] = directions[slabIndex]
+                group['Speed'][0, startNode:endNode] = speeds[slabIndex]
+
+                hasher = hashers.setdefault(startTime + slabIndex, group_hash.GroupHasher())
+                hasher.add(directions[slabIndex], speeds[slabIndex])
+
+                if statistics != None:
+                    group_statistics.write_statistics(group, statistics, slabIndex)
+                else:
+                    accumulator = accumulators.setdefault(startTime + slabIndex, group_statistics.SpeedAccumulator())
+                    accumulator.add(speeds[slabIndex])
+
+                #The last slab of nodes completes the group.
+                if endNode == numberOfNodes:
+                    if statistics == None:
+                        group_statistics.write_statistics(group, accumulators.pop(startTime + slabIndex).get_statistics())
+                    group_hash.write_group_hash(group, hashers.pop(startTime + slabIndex).hexdigest())
+
+            #Keep track of the min/max speed so we can update the metadata
+            if minSpeed == None:
+                minSpeed, maxSpeed = speeds.min(), speeds.max()
+            else:
+                minSpeed = min(minSpeed, speeds.min())
+                maxSpeed = max(maxSpeed, speeds.max())
+
+            #Copy the overview nodes that fall in this slab.
+            for levelIndex, (levelGroup, levelNodes) in enumerate(overviews):
+                levelStart = numpy.searchsorted(levelNodes, startNode)
+                levelEnd = numpy.searchsorted(levelNodes, endNode)
+                if levelStart == levelEnd:
+                    continue
+
+                slabNodes = levelNodes[levelStart:levelEnd] - startNode
+                with pipeline.hdf5_lock:
+                    for slabIndex in range(0, endTime - startTime):
+                        levelTimeGroup = overviewGroups[levelIndex][startTime + slabIndex - firstGroup]
+                        levelTimeGroup['Direction'][0, levelStart:levelEnd] = directions[slabIndex, slabNodes]
+                        levelTimeGroup['Speed'][0, levelStart:levelEnd] = speeds[slabIndex, slabNodes]
+
+                levelSpeeds = speeds[:, slabNodes]
+                extents = overviewSpeeds[levelIndex]
+                if extents[0] == None:
+                    extents[0], extents[1] = levelSpeeds.min(), levelSpeeds.max()
+                else:
+                    extents[0] = min(extents[0], levelSpeeds.min())
+                    extents[1] = max(extents[1], levelSpeeds.max())
+
+    #Each overview level carries its own speed extents.
+    for (levelGroup, levelNodes), (levelMinSpeed, levelMaxSpeed) in zip(overviews, overviewSpeeds):
+        if levelMinSpeed != None:
+            levelGroup.attrs.create('minSurfCurrentSpeed', levelMinSpeed)
+            levelGroup.attrs.create('maxSurfCurrentSpeed', levelMaxSpeed)
+
+    #Figure out what the interval is between the times (use only the first)
+    if len(timeValues) > 1:
+        interval = timeValues[1] - timeValues[0]
+
+    return (minTime, maxTime, interval, minSpeed, maxSpeed)
+
+
+#******************************************************************************
+def has_same_nodes(hdf_file, latc, lonc, node_slab):
+    """Determine if an S-111 irregular grid file has the same nodes as a source grid.
+
+    :param hdf_file: The S-111 HDF file.
+    :param latc: An array (or netCDF variable) of latitude values.
+    :param lonc: An array (or netCDF variable) of longitude values.
+    :param node_slab: The number of nodes to compare at a time.
+    :returns: True if the file holds an irregular grid with the same positions, else false.
+    """
+
+    if hdf_file.attrs.get('dataCodingFormat') != 3 or 'Group XY' not in hdf_file:
+        return False
+
+    x_dataset = hdf_file['Group XY']['X']
+    y_dataset = hdf_file['Group XY']['Y']
+
+    numberOfNodes = latc.shape[0]
+    if x_dataset.shape != (1, numberOfNodes):
+        return False
+
+    for startNode in range(0, numberOfNodes, node_slab):
+        endNode = min(numberOfNodes, startNode + node_slab)
+
+        if not numpy.array_equal(x_dataset[0, startNode:endNode], numpy.asarray(lonc[startNode:endNode], dtype=numpy.float64)):
+            return False
+        if not numpy.array_equal(y_dataset[0, startNode:endNode], numpy.asarray(latc[startNode:endNode], dtype=numpy.float64)):
+            return False
+
+    return True
+
+
+#******************************************************************************
+def update_grid_groups(hdf_file, times, ua, va, time_slab, node_slab):
+    """Update the data groups of an S-111 irregular grid file, only writing the values that changed.
+
+    The existing groups are matched to the source times by their DateTime, and moved
+    (not copied) to their new numbers, so a forecast cycle that shifts the times does
+    not rewrite the overlap. A matched group whose content hash is unchanged is not
+    written, and the groups of times no longer in the source are removed. When the
+    values of a time are split over several slabs of nodes, each slab is compared with
+    the stored values instead, and only the slabs that changed are written.
+
+    The file must hold the same nodes as the source. (See has_same_nodes)
+
+    :param hdf_file: The S-111 HDF file.
+    :param times: The list of time values from the source data.
+    :param ua: Array (or netCDF variable) of velocity values along the x axis in metres per second. (times by nodes)
+    :param va: Array (or netCDF variable) of velocity values along the y axis in metres per second. (times by nodes)
+    :param time_slab: The number of times to convert at a time.
+    :param node_slab: The number of nodes to convert at a time.
+    :returns: A tuple containing the minimum time, maximum time, time interval, minimum speed, maximum speed, and the number of groups written.
+    """
+
+    numberOfTimes = times.shape[0]
+    numberOfNodes = ua.shape[1]
+    chunkNodes = get_chunk_nodes(numberOfNodes, node_slab)
+
+    timeValues = [parse_grid_time(times[index]) for index in range(0, numberOfTimes)]
+
+    #The existing groups, by time.
+    existingGroups = dict()
+    for groupName in group_statistics.get_data_group_names(hdf_file):
+        existingGroups[metadata.decode_string(hdf_file[groupName].attrs['DateTime'])] = groupName
+
+    #Move the matched groups out of the way first, so their new numbers never collide.
+    matchedGroups = dict()
+    for index, timeVal in enumerate(timeValues):
+        groupName = existingGroups.pop(timeVal.strftime("%Y%m%dT%H%M%SZ"), None)
+        if groupName != None:
+            matchedGroups[index] = 'Previous ' + groupName
+            hdf_file.move(groupName, matchedGroups[index])
+
+    #The times no longer in the source are removed.
+    for groupName in existingGroups.values():
+        print("Removing", groupName, "dataset.")
+        del hdf_file[groupName]
+
+    groups = dict()
+    previousHashes = dict()
+    for index, timeVal in enumerate(timeValues):
+
+        if index not in matchedGroups:
+            groups[index] = create_grid_group(hdf_file, index, timeVal, numberOfNodes, chunkNodes)
+            continue
+
+        newGroupName = 'Group ' + str(index + 1)
+        hdf_file.move(matchedGroups[index], newGroupName)
+        group = hdf_file[newGroupName]
+
+        groupTitle = 'Irregular Grid at DateTime ' + str(index + 1)
+        if metadata.decode_string(group.attrs.get('Title', b'')) != groupTitle:
+            group.attrs.create('Title', groupTitle.encode())
+
+        groups[index] = group
+        previousHashes[index] = group_hash.read_group_hash(group)
+
+    changedGroups = set(index for index in groups if index not in matchedGroups)
+    accumulators = dict()
+    hashers = dict()
+    minSpeed = maxSpeed = None
+
+    slabShape = (min(time_slab, numberOfTimes), min(node_slab, numberOfNodes))
+    buffer = {name: numpy.empty(slabShape, dtype=numpy.float64) for name in ('Direction', 'Speed', 'u', 'v')}
+
+    for startTime in range(0, numberOfTimes, time_slab):
+        endTime = min(numberOfTimes, startTime + time_slab)
+
+        for startNode in range(0, numberOfNodes, node_slab):
+            endNode = min(numberOfNodes, startNode + node_slab)
+
+            views = {name: values[:endTime - startTime, :endNode - startNode] for name, values in buffer.items()}
+            current_vectors.compute_direction_speed_into(numpy.asarray(ua[startTime:endTime, startNode:endNode]),
+                                                         numpy.asarray(va[startTime:endTime, startNode:endNode]),
+                                                         views['Direction'], views['Speed'], views['u'], views['v'])
+            directions, speeds = views['Direction'], views['Speed']
+
+            #Keep track of the min/max speed so we can update the metadata
+            if minSpeed == None:
+                minSpeed, maxSpeed = speeds.min(), speeds.max()
+            else:
+                minSpeed = min(minSpeed, speeds.min())
+                maxSpeed = max(maxSpeed, speeds.max())
+
+            statistics = None
+            if endNode - startNode == numberOfNodes:
+                statistics = group_statistics.compute_statistics(speeds)
+
+            for slabIndex in range(0, endTime - startTime):
+                index = startTime + slabIndex
+                group = groups[index]
+
+                hasher = hashers.setdefault(index, group_hash.GroupHasher())
+                hasher.add(directions[slabIndex], speeds[slabIndex])
+
+                if statistics != None:
+                    #The whole group is in the slab, so its hash decides.
+                    newHash = hashers.pop(index).hexdigest()
+                    if index not in changedGroups and newHash == previousHashes[index]:
+                        continue
+
+                    group['Direction'][0, :] = directions[slabIndex]
+                    group['Speed'][0, :] = speeds[slabIndex]
+                    group_statistics.write_statistics(group, statistics, slabIndex)
+                    group_hash.write_group_hash(group, newHash)
+                    changedGroups.add(index)
+                    continue
+
+                #Otherwise compare the slab with the stored values. (Groups written without a hash are always rewritten)
+                if index in changedGroups or previousHashes[index] == None or \
+                   not numpy.array_equal(group['Direction'][0, startNode:endNode], directions[slabIndex]) or \
+                   not numpy.array_equal(group['Speed'][0, startNode:endNode], speeds[slabIndex]):
+                    group['Direction'][0, startNode:endNode] = directions[slabIndex]
+                    group['Speed'][0, startNode:endNode] = speeds[slabIndex]
+                    changedGroups.add(index)
+
+                accumulator = accumulators.setdefault(index, group_statistics.SpeedAccumulator())
+                accumulator.add(speeds[slabIndex])
+
+                #The last slab of nodes completes the group.
+                if endNode == numberOfNodes:
+                    groupStatistics = accumulators.pop(index).get_statistics()
+                    newHash = hashers.pop(index).hexdigest()
+                    if index in changedGroups:
+                        group_statistics.write_statistics(group, groupStatistics)
+                        group_hash.write_group_hash(group, newHash)
+
+    #Figure out what the interval is between the times (use only the first)
+    interval = None
+    if numberOfTimes > 1:
+        interval = timeValues[1] - timeValues[0]
+
+    return (min(timeValues), max(timeValues), interval, minSpeed, maxSpeed, len(changedGroups))
+
+
+#******************************************************************************
+def plan_resample_slab(number_of_times, number_of_nodes, number_of_points, memory_budget):
+    """Pick the number of times that can be resampled at once within the memory budget.
+
+    Resampling needs every node of a time, so only the time dimension is sliced.
+
+    :param number_of_times: The number of times in the source data.
+    :param number_of_nodes: The number of nodes for each time in the source data.
+    :param number_of_points: The number of points in the regular grid.
+    :param memory_budget: The memory budget in bytes.
+    :returns: The number of times in a slab.
+    """
+
+    bytesPerTime = number_of_nodes * 24 + number_of_points * BYTES_PER_VALUE
+
+    return max(1, min(number_of_times, int(memory_budget) // bytesPerTime))
+
+
+#******************************************************************************
+def create_regular_grid_groups(hdf_file, times, ua, va, resampler, land_mask_value, time_slab):
+    """Create the regular grid data groups in the S-111 file, resampled from the irregular source grid.
+
+    :param hdf_file: The S-111 HDF file.
+    :param times: The list of time values from the source data.
+    :param ua: Array (or netCDF variable) of velocity values along the x axis in metres per second. (times by nodes)
+    :param va: Array (or netCDF variable) of velocity values along the y axis in metres per second. (times by nodes)
+    :param resampler: The GridResampler used to interpolate onto the regular grid.
+    :param land_mask_value: The value stored at land (and uncovered) grid points.
+    :param time_slab: The number of times to resample at a time.
+    :returns: A tuple containing the minimum time, maximum time, time interval, minimum speed, and maximum speed of the resampled data.
+    """
+
+    numberOfTimes = times.shape[0]
+    shape = resampler.grid.get_shape()
+    landMask = resampler.land_mask.reshape(shape)
+    anyWater = not landMask.all()
+
+    interval = None
+    minTime = maxTime = None
+    minSpeed = maxSpeed = None
+    timeValues = []
+
+    for startTime in range(0, numberOfTimes, time_slab):
+        endTime = min(numberOfTimes, startTime + time_slab)
+
+        #Interpolate the components (not the speed and direction), then convert.
+        u_grid, v_grid = resampler.resample(ua[startTime:endTime, :], va[startTime:endTime, :])
+        directions, speeds = current_vectors.compute_direction_speed(u_grid, v_grid)
+
+        #Keep track of the min/max speed (of the water points) so we can update the metadata
+        statistics = None
+        if anyWater:
+            waterSpeeds = speeds[:, ~landMask]
+            statistics = group_statistics.compute_statistics(waterSpeeds)
+            if minSpeed == None:
+                minSpeed, maxSpeed = waterSpeeds.min(), waterSpeeds.max()
+            else:
+                minSpeed = min(minSpeed, waterSpeeds.min())
+                maxSpeed = max(maxSpeed, waterSpeeds.max())
+
+        directions[:, landMask] = land_mask_value
+        speeds[:, landMask] = land_mask_value
+
+        for slabIndex in range(0, endTime - startTime):
+            index = startTime + slabIndex
+
+            newGroupName = 'Group ' + str(index + 1)
+            print("Creating", newGroupName, "dataset.")
+            newGroup = hdf_file.create_group(newGroupName)
+
+            groupTitle = 'Regular Grid at DateTime ' + str(index + 1)
+            newGroup.attrs.create('Title', groupTitle.encode())
+
+            #Store the start time.
+            timeVal = parse_grid_time(times[index])
+            timeValues.append(timeVal)
+
+            #Keep track of the min/max time so we can update the metadata
+            if minTime == None:
+                minTime = maxTime = timeVal
+            else:
+                minTime = min(minTime, timeVal)
+                maxTime = max(maxTime, timeVal)
+
+            strVal = timeVal.strftime("%Y%m%dT%H%M%SZ")
+            newGroup.attrs.create('DateTime', strVal.encode())
+
+            newGroup.create_dataset('Direction', shape, dtype=numpy.float64, data=directions[slabIndex])
+            newGroup.create_dataset('Speed', shape, dtype=numpy.float64, data=speeds[slabIndex])
+
+            if statistics != None:
+                group_statistics.write_statistics(newGroup, statistics, slabIndex)
+
+            group_hash.write_group_hash(newGroup, group_hash.compute_group_hash(directions[slabIndex], speeds[slabIndex]))
+
+    #Figure out what the interval is between the times (use only the first)
+    if numberOfTimes > 1:
+        interval = timeValues[1] - timeValues[0]
+
+    return (minTime, maxTime, interval, minSpeed, maxSpeed)
@@ -0,0 +1,84 @@
+#******************************************************************************
+#
+#******************************************************************************
+import hashlib
+import numpy
+from chs_s111 import metadata
+
+#The group attribute holding the content hash of the group's values.
+HASH_ATTRIBUTE = 'contentHash'
+
+#******************************************************************************
+class GroupHasher:
+    """Compute the content hash of a group's values, which may arrive in several slabs.
+
+    The directions and speeds are hashed separately, so the hash only depends on the
+    values (in order), not on how they were sliced into slabs.
+    """
+
+    #******************************************************************************
+    def __init__(self):
+        self.directions = hashlib.sha256()
+        self.speeds = hashlib.sha256()
+
+
+    #******************************************************************************
+    def add(self, directions, speeds):
+        """Add the next slab of the group's values.
+
+        :param directions: Array of direction values (degrees true).
+        :param speeds: Array of speed values (knots).
+        """
+
+        self.directions.update(numpy.ascontiguousarray(directions, dtype=numpy.float64))
+        self.speeds.update(numpy.ascontiguousarray(speeds, dtype=numpy.float64))
+
+
+    #******************************************************************************
+    def hexdigest(self):
+        """Retrieve the content hash of the values added.
+
+        :returns: The hexadecimal digest.
+        """
+
+        return hashlib.sha256(self.directions.digest() + self.speeds.digest()).hexdigest()
+
+
+#******************************************************************************
+def compute_group_hash(directions, speeds):
+    """Compute the content hash of a group's values.
+
+    :param directions: Array of direction values (degrees true).
+    :param speeds: Array of speed values (knots).
+    :returns: The hexadecimal digest.
+    """
+
+    hasher = GroupHasher()
+    hasher.add(directions, speeds)
+
+    return hasher.hexdigest()
+
+
+#******************************************************************************
+def write_group_hash(group, content_hash):
+    """Store the content hash of a group's values.
+
+    :param group: The HDF group.
+    :param content_hash: The hexadecimal digest.
+    """
+
+    group.attrs.create(HASH_ATTRIBUTE, content_hash.encode())
+
+
+#******************************************************************************
+def read_group_hash(group):
+    """Retrieve the content hash stored when a group's values were written.
+
+    :param group: The HDF group.
+    :returns: The hexadecimal digest, None if the group was written without one.
+    """
+
+    if HASH_ATTRIBUTE not in group.attrs:
+        return None
+
+    return metadata.decode_string(group.attrs[HASH_ATTRIBUTE])
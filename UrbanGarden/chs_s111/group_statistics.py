@@ -0,0 +1,212 @@
+#******************************************************************************
+#
+#******************************************************************************
+from datetime import timedelta
+import numpy
+from chs_s111 import metadata
+
+#The percentile of the speeds stored for each group.
+SPEED_PERCENTILE = 95
+
+#The width (in knots) of the histogram bins used when a group's values are converted in several slabs.
+HISTOGRAM_RESOLUTION = 0.001
+
+#The fastest speed (in knots) binned in the histogram, faster speeds (e.g. fill values) share its last bin.
+HISTOGRAM_MAX_SPEED = 64.0
+
+#The group attribute holding each statistic.
+STATISTICS_ATTRIBUTES = {'min': 'minSurfCurrentSpeed',
+                         'max': 'maxSurfCurrentSpeed',
+                         'mean': 'meanSurfCurrentSpeed',
+                         'percentile': 'percentile' + str(SPEED_PERCENTILE) + 'SurfCurrentSpeed'}
+
+#The group attribute holding the time of the maximum speed. (Time series only, a grid group is a single time)
+MAX_TIME_ATTRIBUTE = 'dateTimeOfMaxSurfCurrentSpeed'
+
+#******************************************************************************
+def compute_statistics(speeds):
+    """Compute the speed statistics of each row of values.
+
+    A row holding a NaN has NaN statistics. (Its argmax is the first NaN)
+
+    :param speeds: The array of speeds (knots), one row per group.
+    :returns: A dictionary of the min, max, mean, percentile and index of the maximum (argmax) arrays, one value per row.
+    """
+
+    return {'min': speeds.min(axis=1),
+            'max': speeds.max(axis=1),
+            'mean': speeds.mean(axis=1),
+            'percentile': numpy.percentile(speeds, SPEED_PERCENTILE, axis=1),
+            'argmax': speeds.argmax(axis=1)}
+
+
+#******************************************************************************
+def write_statistics(group, statistics, row=0):
+    """Store a row of speed statistics as attributes of a group.
+
+    :param group: The HDF group the statistics were computed for.
+    :param statistics: The dictionary returned by compute_statistics.
+    :param row: The row of the statistics to store.
+    """
+
+    for name, attributeName in STATISTICS_ATTRIBUTES.items():
+        group.attrs.create(attributeName, statistics[name][row], dtype=numpy.float64)
+
+
+#******************************************************************************
+def write_series_statistics(group, speeds):
+    """Store the speed statistics of a time series group, including the time of its maximum.
+
+    :param group: The HDF group of the station. (With its DateTime, in a file with its timeRecordInterval)
+    :param speeds: Array of speed values (knots).
+    :returns: The dictionary of statistics.
+    """
+
+    statistics = compute_statistics(speeds.reshape(1, -1))
+    write_statistics(group, statistics)
+
+    startTime = metadata.parse_time(group.attrs['DateTime'])
+    interval = timedelta(seconds=int(group.file.attrs['timeRecordInterval']))
+
+    group.attrs.create(MAX_TIME_ATTRIBUTE, metadata.format_time(startTime + int(statistics['argmax'][0]) * interval))
+
+    return statistics
+
+
+#******************************************************************************
+class SpeedAccumulator:
+    """Accumulate the speed statistics of a group whose values arrive in several slabs.
+
+    The percentile is taken from a histogram of the speeds, so it is accurate to half
+    of HISTOGRAM_RESOLUTION up to HISTOGRAM_MAX_SPEED. (The other statistics are exact)
+    As with compute_statistics, a group holding a NaN has NaN statistics.
+    """
+
+    #******************************************************************************
+    def __init__(self):
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.count = 0
+        self.histogram = numpy.zeros(0, dtype=numpy.int64)
+
+
+    #******************************************************************************
+    def add(self, speeds):
+        """Add a slab of the group's speeds.
+
+        :param speeds: Array of speed values (knots).
+        """
+
+        if speeds.size == 0:
+            return
+
+        #The NaNs carry through the min and max, as they do in compute_statistics.
+        if self.minimum == None:
+            self.minimum, self.maximum = speeds.min(), speeds.max()
+        else:
+            self.minimum = numpy.minimum(self.minimum, speeds.min())
+            self.maximum = numpy.maximum(self.maximum, speeds.max())
+
+        self.total += speeds.sum()
+        self.count += speeds.size
+
+        #Only the speeds which are numbers are binned, and those beyond the histogram share its last bin.
+        values = speeds[~numpy.isnan(speeds)]
+        values = numpy.clip(values, 0.0, HISTOGRAM_MAX_SPEED)
+        counts = numpy.bincount(numpy.floor(values / HISTOGRAM_RESOLUTION).astype(numpy.int64).ravel())
+
+        #The histogram grows to the largest speed seen. (Up to HISTOGRAM_MAX_SPEED)
+        if counts.shape[0] > self.histogram.shape[0]:
+            counts[:self.histogram.shape[0]] += self.histogram
+            self.histogram = counts
+        else:
+            self.histogram[:counts.shape[0]] += counts
+
+
+    #******************************************************************************
+    def get_statistics(self):
+        """Retrieve the statistics of the speeds added.
+
+        :returns: A dictionary of single value arrays, like compute_statistics.
+        """
+
+        #Find the bin holding the percentile's rank (as numpy.percentile's linear method ranks it).
+        if numpy.isnan(self.maximum):
+            percentile = numpy.nan
+        else:
+            rank = SPEED_PERCENTILE / 100.0 * (self.count - 1)
+            percentileBin = numpy.searchsorted(numpy.cumsum(self.histogram), rank, side='right')
+            percentile = min(max((percentileBin + 0.5) * HISTOGRAM_RESOLUTION, self.minimum), self.maximum)
+
+        return {'min': numpy.array([self.minimum]),
+                'max': numpy.array([self.maximum]),
+                'mean': numpy.array([self.total / self.count]),
+                'percentile': numpy.array([percentile])}
+
+
+#******************************************************************************
+def get_data_group_names(hdf_file):
+    """Retrieve the names of the data groups of an S-111 file, in order.
+
+    :param hdf_file: The S-111 HDF file.
+    :returns: The list of 'Group N' names.
+    """
+
+    groupNames = [name for name in hdf_file if name.startswith('Group ') and name[6:].isdigit()]
+
+    return sorted(groupNames, key=lambda name: int(name[6:]))
+
+
+#******************************************************************************
+def read_statistics(hdf_file):
+    """Read the speed statistics of every data group, from the group attributes alone.
+
+    :param hdf_file: The S-111 HDF file.
+    :returns: A list of dictionaries, one per group, with the group name, min, max, mean, percentile and time of the maximum.
+    """
+
+    groupStatistics = []
+
+    for groupName in get_data_group_names(hdf_file):
+        attributes = hdf_file[groupName].attrs
+
+        if STATISTICS_ATTRIBUTES['max'] not in attributes:
+            raise Exception(groupName + ' has no statistics, re-ingest its input (with --force) to compute them.')
+
+        statistics = {name: float(attributes[attributeName]) for name, attributeName in STATISTICS_ATTRIBUTES.items()}
+        statistics['group'] = groupName
+
+        #A grid group holds a single time, so that is when its maximum is.
+        statistics['timeOfMax'] = metadata.parse_time(attributes.get(MAX_TIME_ATTRIBUTE, attributes['DateTime']))
+
+        groupStatistics.append(statistics)
+
+    return groupStatistics
+
+
+#******************************************************************************
+def find_groups_exceeding(hdf_file, speed):
+    """Find the groups whose maximum speed exceeds a speed. (e.g. the stations exceeding 3 knots)
+
+    :param hdf_file: The S-111 HDF file.
+    :param speed: The speed (knots).
+    :returns: The list of statistics dictionaries (see read_statistics) of the groups.
+    """
+
+    return [statistics for statistics in read_statistics(hdf_file) if statistics['max'] > speed]
+
+
+#******************************************************************************
+def find_peak_group(hdf_file):
+    """Find the group with the highest maximum speed. (e.g. the time step with the peak flow)
+
+    :param hdf_file: The S-111 HDF file.
+    :returns: The statistics dictionary (see read_statistics) of the group, None if there are no groups.
+    """
+
+    groupStatistics = read_statistics(hdf_file)
+    if len(groupStatistics) == 0:
+        return None
+
+    return max(groupStatistics, key=lambda statistics: statistics['max'])
@@ -0,0 +1,163 @@
+#******************************************************************************
+#
+#******************************************************************************
+import h5py
+import numpy
+from chs_s111 import metadata
+
+#The maximum number of differing values described for each dataset or attribute.
+MAX_REPORTED_VALUES = 3
+
+#******************************************************************************
+def get_comparable_value(value):
+    """Convert an attribute or dataset value for comparison.
+
+    String values are decoded, so bytes and str values (from different versions of
+    h5py) compare equal.
+
+    :param value: The attribute or dataset value.
+    :returns: The value as a numpy array.
+    """
+
+    value = numpy.asarray(value)
+
+    if value.dtype.kind in ('S', 'O'):
+        value = numpy.array([metadata.decode_string(item) for item in value.ravel()], dtype=object).reshape(value.shape)
+
+    return value
+
+
+#******************************************************************************
+def compare_values(path, first, second, rtol, atol, differences):
+    """Compare two attribute or dataset values.
+
+    Strings must be identical, numbers must be equal within the tolerances (NaNs compare equal).
+
+    :param path: The path of the attribute or dataset, for the report.
+    :param first: The first value.
+    :param second: The second value.
+    :param rtol: The relative tolerance of numeric values.
+    :param atol: The absolute tolerance of numeric values.
+    :param differences: The list the descriptions of any differences are added to.
+    """
+
+    first = get_comparable_value(first)
+    second = get_comparable_value(second)
+
+    if first.shape != second.shape:
+        differences.append(path + ': shape ' + str(first.shape) + ' != ' + str(second.shape))
+        return
+
+    if first.dtype != second.dtype and not (first.dtype == object and second.dtype == object):
+        differences.append(path + ': type ' + str(first.dtype) + ' != ' + str(second.dtype))
+        return
+
+    if first.dtype == object or first.dtype.kind in ('U', 'b', 'V'):
+        equal = first == second
+    else:
+        equal = numpy.isclose(first, second, rtol=rtol, atol=atol, equal_nan=True)
+
+    equal = numpy.atleast_1d(equal)
+    if equal.all():
+        return
+
+    firstValues = numpy.atleast_1d(first)
+    secondValues = numpy.atleast_1d(second)
+    indices = numpy.flatnonzero(~equal)
+
+    description = path + ': ' + str(indices.shape[0]) + ' of ' + str(equal.size) + ' values differ'
+    if first.dtype != object and first.dtype.kind in ('f', 'i', 'u'):
+        with numpy.errstate(invalid='ignore'):
+            maxDifference = numpy.nanmax(numpy.abs(firstValues.ravel()[indices].astype(numpy.float64) -
+                                                   secondValues.ravel()[indices].astype(numpy.float64)))
+        description += ' (max difference ' + repr(float(maxDifference)) + ')'
+
+    examples = [str(firstValues.ravel()[index]) + ' != ' + str(secondValues.ravel()[index]) for index in indices[0:MAX_REPORTED_VALUES]]
+    differences.append(description + ': ' + ', '.join(examples))
+
+
+#******************************************************************************
+def compare_attributes(path, first, second, rtol, atol, optional_attributes, differences):
+    """Compare the attributes of two groups or datasets.
+
+    :param path: The path of the group or dataset, for the report.
+    :param first: The first group or dataset.
+    :param second: The second group or dataset.
+    :param rtol: The relative tolerance of numeric values.
+    :param atol: The absolute tolerance of numeric values.
+    :param optional_attributes: The names of the attributes which may be in only one of the files. (Compared if in both)
+    :param differences: The list the descriptions of any differences are added to.
+    """
+
+    firstNames = set(first.attrs)
+    secondNames = set(second.attrs)
+
+    #The attributes of the file itself are reported at the root.
+    if path == '':
+        path = '/'
+
+    for name in sorted((firstNames - secondNames) - set(optional_attributes)):
+        differences.append(path + '@' + name + ': only in the first file')
+    for name in sorted((secondNames - firstNames) - set(optional_attributes)):
+        differences.append(path + '@' + name + ': only in the second file')
+
+    for name in sorted(firstNames & secondNames):
+        compare_values(path + '@' + name, first.attrs[name], second.attrs[name], rtol, atol, differences)
+
+
+#******************************************************************************
+def compare_groups(path, first, second, rtol, atol, optional_attributes, differences):
+    """Compare two groups, and everything they contain.
+
+    :param path: The path of the group, for the report.
+    :param first: The first group.
+    :param second: The second group.
+    :param rtol: The relative tolerance of numeric values.
+    :param atol: The absolute tolerance of numeric values.
+    :param optional_attributes: The names of the attributes which may be in only one of the files. (Compared if in both)
+    :param differences: The list the descriptions of any differences are added to.
+    """
+
+    compare_attributes(path, first, second, rtol, atol, optional_attributes, differences)
+
+    firstNames = set(first)
+    secondNames = set(second)
+
+    for name in sorted(firstNames - secondNames):
+        differences.append(path + '/' + name + ': only in the first file')
+    for name in sorted(secondNames - firstNames):
+        differences.append(path + '/' + name + ': only in the second file')
+
+    for name in sorted(firstNames & secondNames):
+        memberPath = path + '/' + name
+        firstMember = first[name]
+        secondMember = second[name]
+
+        if isinstance(firstMember, h5py.Group) != isinstance(secondMember, h5py.Group):
+            differences.append(memberPath + ': a group in one file, and a dataset in the other')
+        elif isinstance(firstMember, h5py.Group):
+            compare_groups(memberPath, firstMember, secondMember, rtol, atol, optional_attributes, differences)
+        else:
+            compare_attributes(memberPath, firstMember, secondMember, rtol, atol, optional_attributes, differences)
+            compare_values(memberPath, firstMember[()], secondMember[()], rtol, atol, differences)
+
+
+#******************************************************************************
+def diff_hdf_files(first_file, second_file, rtol=0.0, atol=0.0, optional_attributes=()):
+    """Compare the group layout, attributes and datasets of two HDF files.
+
+    The storage layout (chunking, compression) is not compared, only the contents.
+    With the default tolerances the numeric values must be identical.
+
+    :param first_file: The first HDF file.
+    :param second_file: The second HDF file.
+    :param rtol: The relative tolerance of numeric values.
+    :param atol: The absolute tolerance of numeric values.
+    :param optional_attributes: The names of the attributes which may be in only one of the files. (Compared if in both)
+    :returns: The list of the descriptions of the differences, empty if the files are equivalent.
+    """
+
+    differences = []
+    compare_groups('', first_file, second_file, rtol, atol, optional_attributes, differences)
+
+    return differences
@@ -0,0 +1,204 @@
+#******************************************************************************
+#
+#******************************************************************************
+import hashlib
+import json
+import os
+
+#The version of the manifest layout, stored so future layouts can be detected.
+MANIFEST_VERSION = 1
+
+#******************************************************************************
+def get_manifest_name(hdf_file_name):
+    """Retrieve the name of the sidecar manifest for an S-111 file.
+
+    :param hdf_file_name: The name of the S-111 HDF file.
+    :returns: The name of the manifest file.
+    """
+
+    return hdf_file_name + '.manifest.json'
+
+
+#******************************************************************************
+def remove_manifest(hdf_file_name):
+    """Remove the sidecar manifest of an S-111 file (if it exists).
+
+    :param hdf_file_name: The name of the S-111 HDF file.
+    """
+
+    manifest_name = get_manifest_name(hdf_file_name)
+    if os.path.exists(manifest_name):
+        os.remove(manifest_name)
+
+
+#******************************************************************************
+def compute_file_hash(file_name, block_size=1048576):
+    """Compute the SHA-256 content hash of a file.
+
+    :param file_name: The name of the file to hash.
+    :param block_size: The number of bytes to read at a time.
+    :returns: The hexadecimal digest of the file contents.
+    """
+
+    digest = hashlib.sha256()
+
+    with open(file_name, 'rb') as input_file:
+        while True:
+            block = input_file.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+#******************************************************************************
+class IngestManifest:
+    """Sidecar manifest recording every input ingested into an S-111 file.
+
+    Each entry is keyed by the absolute path of the input and stores its content
+    hash, the ingest parameters, and the S-111 groups that were created from it.
+    """
+
+    #******************************************************************************
+    def __init__(self, hdf_file_name):
+        self.file_name = get_manifest_name(hdf_file_name)
+        self.entries = dict()
+
+        #True to hold the saves back until write() is called. (For files only written to disk on close)
+        self.deferred = False
+
+        #Load the existing manifest (if we have one).
+        if os.path.exists(self.file_name):
+            with open(self.file_name, 'r') as manifest_file:
+                contents = json.load(manifest_file)
+
+            if contents.get('version') != MANIFEST_VERSION:
+                raise Exception('Unsupported ingest manifest version in ' + self.file_name)
+
+            self.entries = contents['inputs']
+
+
+    #******************************************************************************
+    def get_key(self, input_file):
+        """Retrieve the key used to store an input file in the manifest.
+
+        :param input_file: The name of the input file.
+        :returns: The manifest key.
+        """
+
+        return os.path.abspath(input_file)
+
+
+    #******************************************************************************
+    def get_entry(self, input_file):
+        """Retrieve the manifest entry of an input file.
+
+        :param input_file: The name of the input file.
+        :returns: The manifest entry, None if the file has not been ingested.
+        """
+
+        return self.entries.get(self.get_key(input_file))
+
+
+    #******************************************************************************
+    def hash_input(self, input_file):
+        """Compute the content hash of an input file.
+
+        If the size and modification time match the recorded entry, the recorded
+        hash is reused, so unchanged inputs are not read again.
+
+        :param input_file: The name of the input file.
+        :returns: The hexadecimal digest of the file contents.
+        """
+
+        stat = os.stat(input_file)
+        entry = self.get_entry(input_file)
+
+        if entry != None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry['hash']
+
+        return compute_file_hash(input_file)
+
+
+    #******************************************************************************
+    def is_current(self, input_file, content_hash, parameters):
+        """Determine if an input file has already been ingested unchanged.
+
+        :param input_file: The name of the input file.
+        :param content_hash: The content hash of the input file.
+        :param parameters: A dictionary of the parameters used for the ingest.
+        :returns: True if the same contents were ingested with the same parameters, else false.
+        """
+
+        entry = self.get_entry(input_file)
+        if entry == None:
+            return False
+
+        return entry['hash'] == content_hash and entry['parameters'] == parameters
+
+
+    #******************************************************************************
+    def record(self, input_file, content_hash, parameters, groups):
+        """Record a successfully ingested input file.
+
+        :param input_file: The name of the input file.
+        :param content_hash: The content hash of the input file.
+        :param parameters: A dictionary of the parameters used for the ingest.
+        :param groups: The list of S-111 group names created from the input.
+        """
+
+        stat = os.stat(input_file)
+
+        self.entries[self.get_key(input_file)] = {
+            'hash': content_hash,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'parameters': parameters,
+            'groups': list(groups)
+        }
+
+
+    #******************************************************************************
+    def remove(self, input_file):
+        """Remove an input file from the manifest.
+
+        :param input_file: The name of the input file.
+        """
+
+        self.entries.pop(self.get_key(input_file), None)
+
+
+    #******************************************************************************
+    def rename_groups(self, renamed):
+        """Update the groups recorded for every input after groups were renamed.
+
+        :param renamed: A dictionary of the new name of each renamed group, keyed by its old name.
+        """
+
+        for entry in self.entries.values():
+            entry['groups'] = [renamed.get(group_name, group_name) for group_name in entry['groups']]
+
+
+    #******************************************************************************
+    def save(self):
+        """Write the manifest next to the S-111 file, unless the saves are deferred."""
+
+        if self.deferred:
+            return
+
+        self.write()
+
+
+    #******************************************************************************
+    def write(self):
+        """Write the manifest next to the S-111 file."""
+
+        contents = {'version': MANIFEST_VERSION, 'inputs': self.entries}
+
+        #Write to a temporary file first, so an interrupted run never leaves a partial manifest.
+        temp_name = self.file_name + '.tmp'
+        with open(temp_name, 'w') as manifest_file:
+            json.dump(contents, manifest_file, indent=2, sort_keys=True)
+
+        os.replace(temp_name, self.file_name)
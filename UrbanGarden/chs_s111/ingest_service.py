@@ -0,0 +1,407 @@
+#******************************************************************************
+#
+#******************************************************************************
+import itertools
+import multiprocessing.connection
+import os
+import queue
+import threading
+import time
+import h5py
+from chs_s111 import ingest_manifest
+from chs_s111 import station_matrix
+
+#The default maximum number of requests waiting to be written, before producers are held back.
+DEFAULT_MAX_PENDING = 64
+
+#The default maximum number of requests written (and committed) as one batch.
+DEFAULT_BATCH_SIZE = 32
+
+#The default time (in seconds) to wait for more requests to fill a batch.
+DEFAULT_BATCH_DELAY = 0.05
+
+#The default number of requests a producer can have waiting for their acknowledgements.
+DEFAULT_MAX_IN_FLIGHT = 8
+
+#The request stopping the service, once the requests before it have been written.
+SHUTDOWN = 'shutdown'
+
+#The number of random bytes in the key producers authenticate with.
+AUTHKEY_SIZE = 32
+
+#******************************************************************************
+def get_key_file_name(address):
+    """Retrieve the name of the file holding the key of a service.
+
+    :param address: The path of the service's Unix socket.
+    :returns: The name of the key file, next to the socket.
+    """
+
+    return address + '.key'
+
+
+#******************************************************************************
+def read_authkey(address):
+    """Read the key of a running service.
+
+    :param address: The path of the service's Unix socket.
+    :returns: The key.
+    """
+
+    keyFileName = get_key_file_name(address)
+    if not os.path.exists(keyFileName):
+        raise Exception('The service key ' + keyFileName + ' does not exist. (Is the service running?)')
+
+    with open(keyFileName, 'rb') as key_file:
+        return key_file.read()
+
+
+#******************************************************************************
+class ServiceFile(h5py.File):
+    """An S-111 file owned by the ingest service.
+
+    The flushes of each request are held back, and the file is flushed once when its
+    batch is committed.
+    """
+
+    #******************************************************************************
+    def flush(self):
+        """Hold the flush back until the batch is committed."""
+
+        pass
+
+
+    #******************************************************************************
+    def commit(self):
+        """Flush the edits of the batch out."""
+
+        h5py.File.flush(self)
+
+
+#******************************************************************************
+class IngestService:
+    """A service owning an S-111 file, writing the ingest requests of many producer processes.
+
+    Producers connect to a Unix socket and send requests, each a dictionary with a
+    'type' (and the arguments of its handler). Only the owner of the service can
+    connect, and every connection must authenticate with the key written next to the
+    socket before any request is read. Every connection is read by its own
+    thread into a bounded queue, which holds the producers back once it is full. The
+    requests are written by a single thread, in batches: the file is flushed, the
+    ingest manifest saved and the station matrix rewritten once per batch, and then
+    each producer is sent the acknowledgement of its requests.
+    """
+
+    #******************************************************************************
+    def __init__(self, hdf_file_name, address, handlers, max_pending=DEFAULT_MAX_PENDING, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_delay=DEFAULT_BATCH_DELAY):
+        """Create the service.
+
+        :param hdf_file_name: The name of the S-111 file.
+        :param address: The path of the Unix socket the producers connect to.
+        :param handlers: Dictionary of the functions writing each type of request, called with (hdf_file, manifest, request).
+        :param max_pending: The maximum number of requests waiting to be written.
+        :param batch_size: The maximum number of requests written as one batch.
+        :param batch_delay: The time (in seconds) to wait for more requests to fill a batch.
+        """
+
+        self.hdf_file_name = hdf_file_name
+        self.address = address
+        self.handlers = handlers
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
+
+        self.pending = queue.Queue(max(1, max_pending))
+        self.stopping = threading.Event()
+        self.listener = None
+        self.authkey = None
+
+
+    #******************************************************************************
+    def serve(self):
+        """Accept and write requests until a shutdown request (or interrupt) is received."""
+
+        keyFileName = get_key_file_name(self.address)
+
+        if os.path.exists(self.address):
+            raise Exception('The service socket ' + self.address + ' already exists. (Is another service running?)')
+
+        self.authkey = os.urandom(AUTHKEY_SIZE)
+
+        #Only the owner of the service can send it requests, so the socket and key are never accessible to anyone else.
+        previousMask = os.umask(0o077)
+        try:
+            #A key left by a service which did not stop cleanly is replaced, rather than reused with its permissions.
+            if os.path.exists(keyFileName):
+                os.remove(keyFileName)
+
+            with os.fdopen(os.open(keyFileName, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as key_file:
+                key_file.write(self.authkey)
+
+            self.listener = multiprocessing.connection.Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        except Exception:
+            if os.path.exists(keyFileName):
+                os.remove(keyFileName)
+            raise
+        finally:
+            os.umask(previousMask)
+
+        acceptor = threading.Thread(target=self.accept_connections, name='s111-accept', daemon=True)
+        acceptor.start()
+
+        print("Serving", self.hdf_file_name, "on", self.address)
+
+        try:
+            with ServiceFile(self.hdf_file_name, "r+") as hdf_file:
+
+                #Load the record of what has already been ingested into this file, it is saved once per batch.
+                manifest = ingest_manifest.IngestManifest(self.hdf_file_name)
+                manifest.deferred = True
+
+                while not self.stopping.is_set() or not self.pending.empty():
+                    batch = self.get_batch()
+                    if len(batch) > 0:
+                        self.write_batch(hdf_file, manifest, batch)
+
+        except KeyboardInterrupt:
+            print("Interrupted, the requests not yet acknowledged were not written")
+
+        finally:
+            self.listener.close()
+            for fileName in (self.address, keyFileName):
+                if os.path.exists(fileName):
+                    os.remove(fileName)
+
+
+    #******************************************************************************
+    def accept_connections(self):
+        """Accept the producer connections, reading each in its own thread."""
+
+        while not self.stopping.is_set():
+            try:
+                connection = self.listener.accept()
+            except (multiprocessing.AuthenticationError, EOFError):
+                #The producer did not know the key (or gave up), nothing it sent is read.
+                continue
+            except OSError:
+                return
+
+            reader = threading.Thread(target=self.read_requests, args=(connection,), name='s111-producer', daemon=True)
+            reader.start()
+
+
+    #******************************************************************************
+    def read_requests(self, connection):
+        """Queue the requests of a producer, until it disconnects.
+
+        :param connection: The connection to the producer.
+        """
+
+        #Acknowledgements are sent by the writer thread, so they are serialized per connection.
+        sendLock = threading.Lock()
+
+        while True:
+            try:
+                requestId, request = connection.recv()
+            except (EOFError, OSError):
+                return
+
+            #Once the queue is full this blocks, so the producer is held back.
+            self.pending.put((connection, sendLock, requestId, request))
+
+
+    #******************************************************************************
+    def get_batch(self):
+        """Take the next batch of requests from the queue.
+
+        :returns: The list of (connection, send lock, request id, request) tuples, empty if none arrived.
+        """
+
+        try:
+            batch = [self.pending.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        #Wait a little for more requests, so they share the commit.
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.pending.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+
+        return batch
+
+
+    #******************************************************************************
+    def write_batch(self, hdf_file, manifest, batch):
+        """Write a batch of requests, commit them, and acknowledge them.
+
+        :param hdf_file: The ServiceFile.
+        :param manifest: The ingest manifest of the S-111 file.
+        :param batch: The list of (connection, send lock, request id, request) tuples.
+        """
+
+        acknowledgements = []
+        changed = False
+
+        for connection, sendLock, requestId, request in batch:
+            requestType = request.get('type')
+
+            if requestType == SHUTDOWN:
+                self.stopping.set()
+                acknowledgements.append((connection, sendLock, {'id': requestId, 'ok': True, 'result': None}))
+                continue
+
+            try:
+                if requestType not in self.handlers:
+                    raise Exception('Unknown ingest request type ' + str(requestType))
+
+                result = self.handlers[requestType](hdf_file, manifest, request)
+                acknowledgements.append((connection, sendLock, {'id': requestId, 'ok': True, 'result': result, 'written': True}))
+                changed = True
+
+            except Exception as error:
+                print("Request", requestId, "failed:", error)
+                acknowledgements.append((connection, sendLock, {'id': requestId, 'ok': False, 'error': str(error)}))
+
+        try:
+            #The stations changed, so an existing matrix is rewritten (once for the batch).
+            station_matrix.update_station_matrix(hdf_file, False, changed)
+
+            #Commit the file before the manifest, so the manifest never gets ahead of the file.
+            hdf_file.commit()
+            manifest.write()
+
+            print("Committed a batch of", len(batch), "requests")
+
+        except Exception as error:
+            #The written requests can not be acknowledged, but the producers must not be left waiting.
+            print("Committing the batch failed:", error)
+            for connection, sendLock, acknowledgement in acknowledgements:
+                if acknowledgement.pop('written', False):
+                    del acknowledgement['result']
+                    acknowledgement.update({'ok': False, 'error': 'The batch could not be committed: ' + str(error)})
+
+        #Only acknowledge the requests once they are committed.
+        for connection, sendLock, acknowledgement in acknowledgements:
+            acknowledgement.pop('written', None)
+            try:
+                with sendLock:
+                    connection.send(acknowledgement)
+            except (OSError, ValueError):
+                pass
+
+
+#******************************************************************************
+class IngestClient:
+    """A producer's connection to an IngestService.
+
+    Requests are sent without waiting for their acknowledgements, up to a limit of
+    requests in flight, after which submitting waits for the oldest to be
+    acknowledged.
+    """
+
+    #******************************************************************************
+    def __init__(self, address, max_in_flight=DEFAULT_MAX_IN_FLIGHT, authkey=None):
+        """Connect to the service.
+
+        :param address: The path of the service's Unix socket.
+        :param max_in_flight: The maximum number of requests waiting for their acknowledgements.
+        :param authkey: The key of the service, None to read it from the key file next to the socket.
+        """
+
+        if authkey == None:
+            authkey = read_authkey(address)
+
+        self.connection = multiprocessing.connection.Client(address, family='AF_UNIX', authkey=authkey)
+        self.max_in_flight = max(1, max_in_flight)
+
+        self.request_ids = itertools.count(1)
+        self.in_flight = []
+        self.acknowledgements = {}
+
+
+    #******************************************************************************
+    def __enter__(self):
+        return self
+
+
+    #******************************************************************************
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    #******************************************************************************
+    def close(self):
+        """Close the connection, without waiting for the requests in flight."""
+
+        self.connection.close()
+
+
+    #******************************************************************************
+    def submit(self, request):
+        """Send a request to the service.
+
+        :param request: The request dictionary, with its 'type'.
+        :returns: The id of the request, to wait for its acknowledgement with.
+        """
+
+        #Hold back until the service has caught up with this producer.
+        while len(self.in_flight) >= self.max_in_flight:
+            self.receive()
+
+        requestId = next(self.request_ids)
+        self.connection.send((requestId, request))
+        self.in_flight.append(requestId)
+
+        return requestId
+
+
+    #******************************************************************************
+    def receive(self):
+        """Receive the next acknowledgement from the service."""
+
+        acknowledgement = self.connection.recv()
+
+        self.in_flight.remove(acknowledgement['id'])
+        self.acknowledgements[acknowledgement['id']] = acknowledgement
+
+
+    #******************************************************************************
+    def wait(self, request_id):
+        """Wait for the acknowledgement of a request.
+
+        :param request_id: The id of the request.
+        :returns: The result of the request.
+        """
+
+        while request_id not in self.acknowledgements:
+            if request_id not in self.in_flight:
+                raise Exception('Request ' + str(request_id) + ' was not sent.')
+
+            self.receive()
+
+        acknowledgement = self.acknowledgements.pop(request_id)
+        if not acknowledgement['ok']:
+            raise Exception('The ingest request failed: ' + acknowledgement['error'])
+
+        return acknowledgement['result']
+
+
+    #******************************************************************************
+    def request(self, request):
+        """Send a request to the service and wait for its acknowledgement.
+
+        :param request: The request dictionary, with its 'type'.
+        :returns: The result of the request.
+        """
+
+        return self.wait(self.submit(request))
+
+
+    #******************************************************************************
+    def shutdown(self):
+        """Stop the service, once the requests sent before are written."""
+
+        self.request({'type': SHUTDOWN})
@@ -0,0 +1,105 @@
+#******************************************************************************
+#
+#******************************************************************************
+import os
+import h5py
+
+#The default maximum size (in megabytes) of a file built in memory.
+DEFAULT_MAX_SIZE = 1024.0
+
+#******************************************************************************
+def estimate_build_size(file_name, mode, input_file_names):
+    """Estimate the size of an S-111 file once its inputs have been added.
+
+    The ASCII and netcdf inputs are at least as large as the values stored from them,
+    so the estimate is the size of the existing file plus the size of the inputs.
+
+    :param file_name: The name of the S-111 file.
+    :param mode: The mode the file is opened with. ('w' starts from an empty file)
+    :param input_file_names: The list of input files to be added.
+    :returns: The estimated size (in bytes).
+    """
+
+    size = 0
+    if mode != 'w' and os.path.exists(file_name):
+        size += os.path.getsize(file_name)
+
+    for inputFileName in input_file_names:
+        if os.path.exists(inputFileName):
+            size += os.path.getsize(inputFileName)
+
+    return size
+
+
+#******************************************************************************
+class MemoryFile(h5py.File):
+    """An S-111 file built in memory with the HDF5 core driver.
+
+    An existing file is read into memory when opened, and the whole image is written
+    to disk once, when the file is closed. Flushes are ignored, since they would write
+    the whole image each time. The manifests deferred to the file are written after
+    the image, so they never get ahead of it.
+    """
+
+    #******************************************************************************
+    def __init__(self, file_name, mode):
+        super().__init__(file_name, mode, driver='core', backing_store=True)
+
+        self.manifests = []
+
+
+    #******************************************************************************
+    def flush(self):
+        """Ignore flushes, the image is written when the file is closed."""
+
+        pass
+
+
+    #******************************************************************************
+    def close(self):
+        """Write the image to disk and close the file, then write the deferred manifests."""
+
+        wasOpen = bool(self.id.valid)
+
+        super().close()
+
+        if wasOpen:
+            for manifest in self.manifests:
+                manifest.write()
+
+
+#******************************************************************************
+def open_s111_file(file_name, mode, in_memory=False, max_size=int(DEFAULT_MAX_SIZE * 1024 * 1024), input_file_names=[]):
+    """Open an S-111 file, in memory if requested and it is small enough.
+
+    :param file_name: The name of the S-111 file.
+    :param mode: The mode to open the file with. ('w' or 'r+')
+    :param in_memory: True to build the file in memory and write it once, on close.
+    :param max_size: The maximum estimated size (in bytes) of a file built in memory.
+    :param input_file_names: The list of input files to be added. (For the size estimate)
+    :returns: The opened HDF file.
+    """
+
+    if in_memory:
+        estimatedSize = estimate_build_size(file_name, mode, input_file_names)
+
+        if estimatedSize <= max_size:
+            print("Building", file_name, "in memory")
+            return MemoryFile(file_name, mode)
+
+        print("Building", file_name, "on disk, the estimated size of", estimatedSize, "bytes exceeds the in memory limit")
+
+    return h5py.File(file_name, mode)
+
+
+#******************************************************************************
+def defer_manifest(hdf_file, manifest):
+    """Hold the manifest's saves back until an in memory file has been written to disk.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    """
+
+    if isinstance(hdf_file, MemoryFile):
+        manifest.deferred = True
+        hdf_file.manifests.append(manifest)
@@ -0,0 +1,177 @@
+#******************************************************************************
+#
+#******************************************************************************
+import glob
+import hashlib
+import json
+import os
+import numpy
+
+#The environment variable naming the default cache directory.
+CACHE_DIR_VARIABLE = 'S111_MESH_CACHE'
+
+#******************************************************************************
+def open_mesh_cache(cache_dir, max_size_megabytes):
+    """Open the mesh cache (if one is configured).
+
+    :param cache_dir: The cache directory, None to use the S111_MESH_CACHE environment variable.
+    :param max_size_megabytes: The maximum size of the cache in megabytes.
+    :returns: The MeshCache, None if no cache directory is configured.
+    """
+
+    if cache_dir == None:
+        cache_dir = os.environ.get(CACHE_DIR_VARIABLE)
+
+    if not cache_dir:
+        return None
+
+    return MeshCache(cache_dir, int(max_size_megabytes * 1024 * 1024))
+
+
+#******************************************************************************
+def compute_mesh_hash(latitudes, longitudes):
+    """Compute a hash identifying a mesh from its node positions.
+
+    :param latitudes: Array of latitude values, one per node.
+    :param longitudes: Array of longitude values, one per node.
+    :returns: The hexadecimal digest of the node positions.
+    """
+
+    digest = hashlib.sha256()
+    digest.update(numpy.ascontiguousarray(latitudes, dtype=numpy.float64).tobytes())
+    digest.update(numpy.ascontiguousarray(longitudes, dtype=numpy.float64).tobytes())
+
+    return digest.hexdigest()
+
+
+#******************************************************************************
+class MeshCache:
+    """An on-disk cache of arrays derived from a mesh, keyed by the mesh hash.
+
+    Each artifact is stored as a .npz file. The modification time of a file records
+    its last use, and the least recently used files are evicted once the cache grows
+    beyond its maximum size.
+    """
+
+    #******************************************************************************
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        #The maximum size may have been lowered since the cache was last used.
+        self.evict()
+
+
+    #******************************************************************************
+    def get_file_name(self, mesh_hash, artifact_name, parameters):
+        """Retrieve the name of the file storing an artifact.
+
+        :param mesh_hash: The hash of the mesh the artifact was derived from.
+        :param artifact_name: The name of the artifact.
+        :param parameters: A dictionary of the parameters used to derive the artifact.
+        :returns: The name of the cache file.
+        """
+
+        parameterHash = hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+        return os.path.join(self.cache_dir, mesh_hash[:32] + '_' + artifact_name + '_' + parameterHash[:16] + '.npz')
+
+
+    #******************************************************************************
+    def load(self, mesh_hash, artifact_name, parameters):
+        """Load an artifact from the cache.
+
+        :param mesh_hash: The hash of the mesh the artifact was derived from.
+        :param artifact_name: The name of the artifact.
+        :param parameters: A dictionary of the parameters used to derive the artifact.
+        :returns: A dictionary of the artifact's arrays, None if it is not cached.
+        """
+
+        fileName = self.get_file_name(mesh_hash, artifact_name, parameters)
+
+        try:
+            with numpy.load(fileName) as cached:
+                arrays = {name: cached[name] for name in cached.files}
+        except (OSError, ValueError):
+            return None
+
+        #Mark the artifact as recently used.
+        os.utime(fileName)
+
+        return arrays
+
+
+    #******************************************************************************
+    def store(self, mesh_hash, artifact_name, parameters, arrays):
+        """Store an artifact in the cache, evicting the least recently used artifacts if needed.
+
+        :param mesh_hash: The hash of the mesh the artifact was derived from.
+        :param artifact_name: The name of the artifact.
+        :param parameters: A dictionary of the parameters used to derive the artifact.
+        :param arrays: A dictionary of the artifact's arrays.
+        """
+
+        fileName = self.get_file_name(mesh_hash, artifact_name, parameters)
+
+        #Write to a temporary file first, so concurrent runs never read a partial artifact.
+        tempName = fileName + '.' + str(os.getpid()) + '.tmp'
+        with open(tempName, 'wb') as cache_file:
+            numpy.savez(cache_file, **arrays)
+
+        os.replace(tempName, fileName)
+
+        self.evict()
+
+
+    #******************************************************************************
+    def get_or_compute(self, mesh_hash, artifact_name, parameters, compute):
+        """Load an artifact from the cache, computing (and storing) it if it is not cached.
+
+        :param mesh_hash: The hash of the mesh the artifact was derived from.
+        :param artifact_name: The name of the artifact.
+        :param parameters: A dictionary of the parameters used to derive the artifact.
+        :param compute: A function returning the dictionary of the artifact's arrays.
+        :returns: A dictionary of the artifact's arrays.
+        """
+
+        arrays = self.load(mesh_hash, artifact_name, parameters)
+        if arrays != None:
+            print("Using cached", artifact_name, "for mesh", mesh_hash[:12])
+            return arrays
+
+        arrays = compute()
+        self.store(mesh_hash, artifact_name, parameters, arrays)
+
+        return arrays
+
+
+    #******************************************************************************
+    def evict(self):
+        """Remove the least recently used artifacts until the cache fits in its maximum size."""
+
+        entries = []
+        totalSize = 0
+
+        for fileName in glob.glob(os.path.join(self.cache_dir, '*.npz')):
+            try:
+                stat = os.stat(fileName)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime_ns, stat.st_size, fileName))
+            totalSize += stat.st_size
+
+        entries.sort()
+
+        for mtime, size, fileName in entries:
+            if totalSize <= self.max_size:
+                break
+
+            try:
+                os.remove(fileName)
+            except OSError:
+                continue
+
+            totalSize -= size
@@ -0,0 +1,238 @@
+#******************************************************************************
+#
+#******************************************************************************
+import csv
+import iso8601
+import numpy
+import pytz
+
+#The format of the S-111 date and time attributes.
+TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+#******************************************************************************
+def decode_string(value):
+    """Decode a string attribute value.
+
+    Older versions of h5py return string attributes as bytes, newer versions as str.
+
+    :param value: The attribute value.
+    :returns: The value as a str.
+    """
+
+    if isinstance(value, bytes):
+        return value.decode()
+
+    return str(value)
+
+
+#******************************************************************************
+def parse_time(value):
+    """Decode an S-111 date and time attribute.
+
+    :param value: The attribute value.
+    :returns: The date and time in UTC.
+    """
+
+    return iso8601.parse_date(decode_string(value)).astimezone(pytz.utc)
+
+
+#******************************************************************************
+def format_time(value):
+    """Encode a date and time as an S-111 attribute value.
+
+    :param value: The date and time. (Naive values are taken to be in UTC)
+    :returns: The encoded attribute value.
+    """
+
+    if value.tzinfo != None:
+        value = value.astimezone(pytz.utc)
+
+    return value.strftime(TIME_FORMAT).encode()
+
+
+#The type of each known S-111 carrier metadata attribute.
+METADATA_TYPES = {
+    #Integer types
+    'horizDatumValue': numpy.int64,
+    'timeRecordInterval': numpy.int64,
+    'numberOfTimes': numpy.int64,
+    'numberOfStations': numpy.int64,
+    'verticalDatum': numpy.int64,
+    'numPointsLongitudinal': numpy.int64,
+    'numPointsLatitudinal': numpy.int64,
+    'minGridPointLongitudinal': numpy.int64,
+    'minGridPointLatitudinal': numpy.int64,
+
+    #Real types
+    'surfaceCurrentDepth': numpy.float64,
+    'gridOriginLongitude': numpy.float64,
+    'gridOriginLatitude': numpy.float64,
+    'gridSpacingLongitudinal': numpy.float64,
+    'gridSpacingLatitudinal': numpy.float64,
+    'gridLandMaskValue': numpy.float64,
+    'uncertaintyOfSpeed': numpy.float64,
+    'uncertaintyOfDirection': numpy.float64,
+    'uncertaintyOfHorzPosition': numpy.float64,
+    'uncertaintyOfVertPosition': numpy.float64,
+    'uncertaintyOfTime': numpy.float64,
+    'minSurfCurrentSpeed': numpy.float64,
+    'maxSurfCurrentSpeed': numpy.float64,
+
+    #String types
+    'productSpecification': numpy.bytes_,
+    'dateTimeOfIssue': numpy.bytes_,
+    'nameRegion': numpy.bytes_,
+    'nameSubregion': numpy.bytes_,
+    'horizDatumReference': numpy.bytes_,
+    'protectionScheme': numpy.bytes_,
+    'dateTimeOfFirstRecord': numpy.bytes_,
+    'dateTimeOfLastRecord': numpy.bytes_,
+    'methodCurrentsProduct': numpy.bytes_,
+
+    #Enumeration types
+    'dataProtection': numpy.int64,
+    'typeOfCurrentData': numpy.int64,
+    'dataCodingFormat': numpy.int64,
+    'depthTypeIndex': numpy.int64,
+
+    #Removed?
+    'nationalOriginator': numpy.bytes_,
+    'producingAgency': numpy.bytes_,
+    'updateApplicationDate': numpy.bytes_,
+    'fileName': numpy.bytes_,
+    'dataType': numpy.bytes_,
+    'methodOrSource': numpy.bytes_,
+    'editionNumber': numpy.int64,
+    'updateNumber': numpy.int64,
+    'numberOfNodes': numpy.int64,
+}
+
+#The attributes computed from the data, so any value given in the metadata is ignored.
+COMPUTED_ATTRIBUTES = ['dateTimeOfFirstRecord', 'dateTimeOfLastRecord', 'numberOfStations', 'numberOfTimes',
+                       'dataCodingFormat', 'timeRecordInterval', 'minSurfCurrentSpeed', 'maxSurfCurrentSpeed']
+
+#The attributes removed from the product specification, and the edition that removed them.
+REMOVED_ATTRIBUTES = {'westBoundLongitude': '1.09',
+                      'eastBoundLongitude': '1.09',
+                      'southBoundLatitude': '1.09',
+                      'northBoundLatitude': '1.09'}
+
+#******************************************************************************
+def get_metadata_type(attribute_name):
+    """Retrieve the specified attribute's type.
+
+    :param attribute_name: The name of the attribute to retrieve the type for.
+    :returns: The attribute's type, None if not found.
+    """
+
+    return METADATA_TYPES.get(attribute_name)
+
+
+#******************************************************************************
+def read_metadata_table(metadata_file, all_rows=False):
+    """Read the header and the data rows of an ASCII CSV metadata file.
+
+    Only the first data row is used unless all of the rows are requested. As before
+    the table was read as a whole, that row may be shorter than the header, its
+    missing values are None (and not written). With all of the rows, every row must
+    have a value for each column.
+
+    :param metadata_file: The ASCII CSV file to retrieve the metadata values from.
+    :param all_rows: True to read (and check) all of the data rows, false for only the first.
+    :returns: A tuple containing the list of attribute names, and the list of data rows.
+    """
+
+    with open(metadata_file) as csvfile:
+        reader = csv.reader(csvfile)
+
+        header = [name.strip() for name in next(reader)]
+
+        #Skip any blank lines (e.g. at the end of the sheet)
+        rows = [row for row in reader if any(col.strip() for col in row)]
+
+    if len(rows) == 0:
+        raise Exception('The metadata file ' + metadata_file + ' does not contain any data rows.')
+
+    if not all_rows:
+        rows = rows[:1]
+
+    for rowIndex, row in enumerate(rows):
+        if len(row) > len(header) or (all_rows and len(row) != len(header)):
+            raise Exception('Metadata row ' + str(rowIndex + 1) + ' does not have a value for each column of the header.')
+
+    #Pad a short row, its missing values are not written.
+    rows = [row + [None] * (len(header) - len(row)) for row in rows]
+
+    return header, rows
+
+
+#******************************************************************************
+def compile_metadata(header, rows):
+    """Validate and convert the metadata values of every data row.
+
+    Each column is checked and converted once for all of the rows, and unknown,
+    computed or removed columns are reported once rather than for every row.
+
+    :param header: The list of attribute names.
+    :param rows: The list of data rows, each a list of values as text. (None for a missing value)
+    :returns: A list (one per row) of lists of (attribute name, value, type) tuples.
+    """
+
+    compiled = [[] for row in rows]
+
+    for colnum, attribute_name in enumerate(header):
+        attribute_type = get_metadata_type(attribute_name)
+
+        if attribute_name in COMPUTED_ATTRIBUTES:
+            print("Information: The value for", attribute_name, "has been ignored.")
+            continue
+        elif attribute_name in REMOVED_ATTRIBUTES:
+            print("Information: The value for", attribute_name, "has been ignored. (Removed in", REMOVED_ATTRIBUTES[attribute_name] + ")")
+            continue
+        elif attribute_type == None:
+            print("Warning: Unknown metadata value", attribute_name)
+            continue
+
+        #Missing values (of a short row) are not written.
+        rowIndices = [rowIndex for rowIndex, row in enumerate(rows) if row[colnum] != None]
+        column = [rows[rowIndex][colnum].strip() for rowIndex in rowIndices]
+
+        if attribute_type == numpy.bytes_:
+            values = [value.encode() for value in column]
+        else:
+            try:
+                values = numpy.array(column, dtype=attribute_type)
+            except ValueError:
+                for rowIndex, value in zip(rowIndices, column):
+                    try:
+                        attribute_type(value)
+                    except ValueError:
+                        raise Exception('Invalid value "' + value + '" for ' + attribute_name + ' in metadata row ' + str(rowIndex + 1) + '.')
+                raise
+
+        for rowIndex, value in zip(rowIndices, values):
+            compiled[rowIndex].append((attribute_name, value, attribute_type))
+
+    return compiled
+
+
+#******************************************************************************
+def write_metadata(attributes, values):
+    """Add compiled metadata values to the attributes of a new S-111 file.
+
+    :param attributes: The S-111 attributes to be populated.
+    :param values: The list of (attribute name, value, type) tuples of one data row.
+    """
+
+    for attribute_name, attribute_value, attribute_type in values:
+
+        #If this is a string type...
+        if attribute_type == numpy.bytes_:
+            attributes.create(attribute_name, attribute_value)
+        #Else use the type returned.
+        else:
+            attributes.create(attribute_name, attribute_value, dtype=attribute_type)
+
+    #Since this is a new file, we don't have any stations yet.
+    attributes.create('numberOfStations', 0, dtype=numpy.int64)
+    attributes.create('numberOfTimes', 0, dtype=numpy.int64)
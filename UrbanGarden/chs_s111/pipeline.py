@@ -0,0 +1,82 @@
+#******************************************************************************
+#
+#******************************************************************************
+import queue
+import threading
+
+#The number of buffers used for double buffering.
+DOUBLE_BUFFERED = 2
+
+#Serializes HDF5 library calls between the pipeline threads. (HDF5 is not built thread safe)
+hdf5_lock = threading.RLock()
+
+#The marker queued once the producer has filled every task.
+_DONE = object()
+
+#******************************************************************************
+def run_pipeline(tasks, fill, buffers, threaded=True):
+    """Fill buffers in a background thread while the caller consumes the filled ones.
+
+    The producer thread takes a free buffer, calls fill(task, buffer) and queues the
+    result. Once the caller has consumed a result, its buffer is returned to the free
+    list for the next task. The number of buffers bounds how far the producer can get
+    ahead (and the memory used), and no buffer is allocated per task.
+
+    Each result must be consumed before asking for the next one, since its buffer is
+    refilled after that.
+
+    :param tasks: The list of tasks, in the order the results are wanted.
+    :param fill: The function filling a buffer for a task, returning the result.
+    :param buffers: The list of reusable buffers. (None entries if fill allocates its own)
+    :param threaded: False to fill and consume in turn on the calling thread, with the first buffer.
+    :returns: A generator of (task, result) tuples, in the order of the tasks.
+    """
+
+    if not threaded:
+        for task in tasks:
+            yield (task, fill(task, buffers[0]))
+        return
+
+    free = queue.Queue()
+    for buffer in buffers:
+        free.put(buffer)
+
+    filled = queue.Queue()
+    stopping = threading.Event()
+
+    def produce():
+        try:
+            for task in tasks:
+                buffer = free.get()
+                if stopping.is_set():
+                    return
+                filled.put((task, buffer, fill(task, buffer), None))
+        except BaseException as error:
+            filled.put((None, None, None, error))
+            return
+
+        filled.put(_DONE)
+
+    producer = threading.Thread(target=produce, name='s111-pipeline', daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = filled.get()
+            if item is _DONE:
+                break
+
+            task, buffer, result, error = item
+            if error != None:
+                raise error
+
+            yield (task, result)
+
+            #The caller is done with the result, so the buffer can be refilled.
+            free.put(buffer)
+
+    finally:
+        #If the caller stopped early, then wake the producer up so it can exit.
+        stopping.set()
+        free.put(None)
+        producer.join()
@@ -0,0 +1,155 @@
+#******************************************************************************
+#
+#******************************************************************************
+import hashlib
+import json
+import os
+import numpy
+from chs_s111 import ingest_manifest
+
+#The version of the cache layout, stored so future layouts can be detected.
+CACHE_VERSION = 2
+
+#The layout of the cached records.
+RECORD_TYPE = numpy.dtype([('time', numpy.int64), ('direction', numpy.float64), ('speed', numpy.float64)])
+
+#******************************************************************************
+def open_series_cache(enabled, cache_dir):
+    """Open the parsed series cache (if one is requested).
+
+    :param enabled: True to cache the parsed series next to each input file.
+    :param cache_dir: The directory to cache the parsed series in instead, None if not given.
+    :returns: The SeriesCache, None if no cache is requested.
+    """
+
+    if cache_dir != None:
+        return SeriesCache(cache_dir)
+
+    if enabled:
+        return SeriesCache()
+
+    return None
+
+
+#******************************************************************************
+class SeriesCache:
+    """A cache of parsed timeseries files, so they are only parsed once.
+
+    Each parsed file is stored as a .json file holding the header fields and a .npy
+    file holding the records, which is loaded by memory map. The cache entry is only
+    used while the input file has the same size and modification time, or failing
+    that, the same content hash.
+    """
+
+    #******************************************************************************
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+
+        if self.cache_dir != None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+
+    #******************************************************************************
+    def get_file_names(self, input_file):
+        """Retrieve the names of the files caching an input file.
+
+        :param input_file: The name of the input file.
+        :returns: A tuple containing the name of the header (.json) and records (.npy) files.
+        """
+
+        inputPath = os.path.abspath(input_file)
+
+        #Without a cache directory, the cache sits next to the input.
+        if self.cache_dir == None:
+            baseName = inputPath + '.s111cache'
+        else:
+            pathHash = hashlib.sha256(inputPath.encode()).hexdigest()
+            baseName = os.path.join(self.cache_dir, os.path.basename(inputPath) + '_' + pathHash[:16])
+
+        return baseName + '.json', baseName + '.npy'
+
+
+    #******************************************************************************
+    def load(self, input_file):
+        """Load a parsed input file from the cache.
+
+        :param input_file: The name of the input file.
+        :returns: A tuple containing the dictionary of header fields and the (memory mapped) records, None if not cached.
+        """
+
+        headerName, recordsName = self.get_file_names(input_file)
+
+        try:
+            with open(headerName, 'r') as header_file:
+                entry = json.load(header_file)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get('version') != CACHE_VERSION:
+            return None
+
+        stat = os.stat(input_file)
+        if stat.st_size != entry['size']:
+            return None
+
+        #If the file was touched, then make sure the content is really unchanged.
+        if stat.st_mtime_ns != entry['mtime']:
+            if ingest_manifest.compute_file_hash(input_file) != entry['hash']:
+                return None
+
+            entry['mtime'] = stat.st_mtime_ns
+            self.write_header(headerName, entry)
+
+        try:
+            records = numpy.load(recordsName, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        if records.dtype != RECORD_TYPE or records.shape[0] != entry['header']['number_of_records']:
+            return None
+
+        return entry['header'], records
+
+
+    #******************************************************************************
+    def store(self, input_file, header, records):
+        """Store a parsed input file in the cache.
+
+        :param input_file: The name of the input file.
+        :param header: The dictionary of header fields.
+        :param records: The array of records. (RECORD_TYPE)
+        """
+
+        headerName, recordsName = self.get_file_names(input_file)
+
+        stat = os.stat(input_file)
+        entry = {'version': CACHE_VERSION,
+                 'size': stat.st_size,
+                 'mtime': stat.st_mtime_ns,
+                 'hash': ingest_manifest.compute_file_hash(input_file),
+                 'header': header}
+
+        #Write to a temporary file first, so concurrent runs never read partial records.
+        tempName = recordsName + '.' + str(os.getpid()) + '.tmp'
+        with open(tempName, 'wb') as records_file:
+            numpy.save(records_file, records)
+
+        os.replace(tempName, recordsName)
+
+        #The header is written last, it is what makes the entry valid.
+        self.write_header(headerName, entry)
+
+
+    #******************************************************************************
+    def write_header(self, header_name, entry):
+        """Write the header file of a cache entry.
+
+        :param header_name: The name of the header file.
+        :param entry: The dictionary to be written.
+        """
+
+        tempName = header_name + '.' + str(os.getpid()) + '.tmp'
+        with open(tempName, 'w') as header_file:
+            json.dump(entry, header_file)
+
+        os.replace(tempName, header_name)
@@ -0,0 +1,90 @@
+#******************************************************************************
+#
+#******************************************************************************
+import numpy
+from chs_s111 import current_vectors
+
+#The supported resampling methods.
+METHODS = ['mean', 'decimate']
+
+#******************************************************************************
+def get_resample_factor(source_interval, target_interval):
+    """Retrieve the number of source records in each resampled record.
+
+    :param source_interval: The time interval between the source records.
+    :param target_interval: The time interval between the resampled records.
+    :returns: The number of source records per resampled record.
+    """
+
+    sourceSeconds = int(source_interval.total_seconds())
+    targetSeconds = int(target_interval.total_seconds())
+
+    if sourceSeconds <= 0 or targetSeconds < sourceSeconds or targetSeconds % sourceSeconds != 0:
+        raise Exception('The resampled interval must be a multiple of the source interval.')
+
+    return targetSeconds // sourceSeconds
+
+
+#******************************************************************************
+def decimate_series(directions, speeds, factor):
+    """Keep every factor'th record of a series.
+
+    :param directions: Array of direction values (degrees true). (The last axis is time)
+    :param speeds: Array of speed values. (The last axis is time)
+    :param factor: The number of source records per resampled record.
+    :returns: A tuple containing the decimated directions and speeds.
+    """
+
+    return directions[..., ::factor].copy(), speeds[..., ::factor].copy()
+
+
+#******************************************************************************
+def average_series(directions, speeds, factor):
+    """Vector average each window of factor records of a series.
+
+    The directions and speeds are averaged as eastward/northward components, so
+    359 and 1 degrees average to 0 degrees (not 180). Record k of the result is the
+    average of the source records k * factor to (k + 1) * factor - 1; a trailing
+    partial window is dropped.
+
+    :param directions: Array of direction values (degrees true). (The last axis is time)
+    :param speeds: Array of speed values. (The last axis is time)
+    :param factor: The number of source records per resampled record.
+    :returns: A tuple containing the averaged directions and speeds.
+    """
+
+    numberOfRecords = directions.shape[-1] // factor
+    if numberOfRecords == 0:
+        raise Exception('The series is shorter than the resampled interval.')
+
+    windowShape = directions.shape[:-1] + (numberOfRecords, factor)
+    usedRecords = numberOfRecords * factor
+
+    u, v = current_vectors.direction_speed_to_components(directions[..., :usedRecords], speeds[..., :usedRecords])
+
+    u = u.reshape(windowShape).mean(axis=-1)
+    v = v.reshape(windowShape).mean(axis=-1)
+
+    return current_vectors.components_to_direction_speed(u, v)
+
+
+#******************************************************************************
+def resample_series(directions, speeds, factor, method):
+    """Resample a series to a coarser interval.
+
+    :param directions: Array of direction values (degrees true). (The last axis is time)
+    :param speeds: Array of speed values. (The last axis is time)
+    :param factor: The number of source records per resampled record.
+    :param method: 'mean' to vector average each window, 'decimate' to keep the first record of each window.
+    :returns: A tuple containing the resampled directions and speeds.
+    """
+
+    directions = numpy.asarray(directions, dtype=numpy.float64)
+    speeds = numpy.asarray(speeds, dtype=numpy.float64)
+
+    if method == 'mean':
+        return average_series(directions, speeds, factor)
+    elif method == 'decimate':
+        return decimate_series(directions, speeds, factor)
+
+    raise Exception('Unknown resampling method ' + str(method))
@@ -0,0 +1,226 @@
+#******************************************************************************
+#
+#******************************************************************************
+import math
+from datetime import timedelta
+import numpy
+from chs_s111 import metadata
+
+#The group holding the station by time matrices.
+MATRIX_GROUP = 'Station Matrix'
+
+#The number of values in each chunk of the matrices. (256 KiB of float64)
+CHUNK_VALUES = 32768
+
+#******************************************************************************
+def get_matrix_chunks(number_of_stations, number_of_times):
+    """Pick the chunk shape of a station by time matrix.
+
+    The chunk is shaped like the matrix, so reading a snapshot (a column) touches
+    about as many chunks as reading a station's series (a row).
+
+    :param number_of_stations: The number of rows in the matrix.
+    :param number_of_times: The number of columns in the matrix.
+    :returns: The (rows, columns) chunk shape.
+    """
+
+    chunkRows = int(round(math.sqrt(CHUNK_VALUES * number_of_stations / number_of_times)))
+    chunkRows = max(1, min(number_of_stations, chunkRows))
+    chunkColumns = max(1, min(number_of_times, CHUNK_VALUES // chunkRows))
+
+    return (chunkRows, chunkColumns)
+
+
+#******************************************************************************
+def get_column(start_time, time, interval):
+    """Retrieve the matrix column of a time.
+
+    :param start_time: The time of the first column.
+    :param time: The time.
+    :param interval: The time interval between the columns.
+    :returns: The column index.
+    """
+
+    offset = (time - start_time).total_seconds()
+    seconds = interval.total_seconds()
+
+    if offset % seconds != 0:
+        raise Exception('The time ' + str(time) + ' is not on the station matrix time axis.')
+
+    return int(offset // seconds)
+
+
+#******************************************************************************
+def is_on_time_axis(start_time, time, interval):
+    """Determine if a time is on a time axis.
+
+    :param start_time: The time of the first column.
+    :param time: The time.
+    :param interval: The time interval between the columns.
+    :returns: True if the time is a whole number of intervals from the start of the axis, else false.
+    """
+
+    return (time - start_time).total_seconds() % interval.total_seconds() == 0
+
+
+#******************************************************************************
+def check_station_alignment(hdf_file, start_time):
+    """Check that a new station starts on the time axis of the stations already in the file.
+
+    The matrix has a single time axis, so its stations must start a whole number of
+    record intervals apart. Stations starting between the times of the axis are not
+    resampled onto it, so they are refused before they are added.
+
+    :param hdf_file: The S-111 HDF file. (Time series)
+    :param start_time: The time of the new station's first record.
+    """
+
+    if hdf_file.attrs['numberOfStations'] == 0:
+        return
+
+    firstTime = metadata.parse_time(hdf_file.attrs['dateTimeOfFirstRecord'])
+    interval = timedelta(seconds=int(hdf_file.attrs['timeRecordInterval']))
+
+    if not is_on_time_axis(firstTime, start_time, interval):
+        raise Exception('The station starting at ' + str(start_time) + ' is not on the station matrix time axis, which starts at ' +
+                        str(firstTime) + ' every ' + str(int(interval.total_seconds())) + ' seconds. ' +
+                        '(The stations of a matrix must start a whole number of intervals apart)')
+
+
+#******************************************************************************
+def write_station_matrix(hdf_file):
+    """Write the (station, time) matrices of the speeds and directions of every station.
+
+    Row i holds station 'Group i+1', column j the time dateTimeOfFirstRecord plus j
+    intervals. The stations must start a whole number of intervals apart, the times
+    a station does not cover are NaN. Any existing matrix is replaced, the stations
+    are copied a chunk of rows at a time.
+
+    :param hdf_file: The S-111 HDF file. (Time series)
+    :returns: The matrix group.
+    """
+
+    if hdf_file.attrs['dataCodingFormat'] != 1:
+        raise Exception('The station matrix can only be written for time series data.')
+
+    numberOfStations = int(hdf_file.attrs['numberOfStations'])
+    if numberOfStations == 0:
+        raise Exception('The S-111 file does not contain any stations.')
+
+    startTime = metadata.parse_time(hdf_file.attrs['dateTimeOfFirstRecord'])
+    endTime = metadata.parse_time(hdf_file.attrs['dateTimeOfLastRecord'])
+    interval = timedelta(seconds=int(hdf_file.attrs['timeRecordInterval']))
+
+    numberOfColumns = get_column(startTime, endTime, interval) + 1
+    chunks = get_matrix_chunks(numberOfStations, numberOfColumns)
+
+    #Find the column of each station first, so misaligned stations leave any existing matrix untouched.
+    columns = []
+    misaligned = []
+    for row in range(0, numberOfStations):
+        stationTime = metadata.parse_time(hdf_file['Group ' + str(row + 1)].attrs['DateTime'])
+        if is_on_time_axis(startTime, stationTime, interval):
+            columns.append(get_column(startTime, stationTime, interval))
+        else:
+            misaligned.append(str(row + 1))
+
+    if len(misaligned) > 0:
+        raise Exception('Stations ' + ', '.join(misaligned) + ' are not on the station matrix time axis, which starts at ' +
+                        str(startTime) + ' every ' + str(int(interval.total_seconds())) + ' seconds. ' +
+                        '(The stations of a matrix must start a whole number of intervals apart)')
+
+    if MATRIX_GROUP in hdf_file:
+        del hdf_file[MATRIX_GROUP]
+
+    matrixGroup = hdf_file.create_group(MATRIX_GROUP)
+    matrixGroup.attrs.create('dateTimeOfFirstRecord', metadata.format_time(startTime))
+    matrixGroup.attrs.create('timeRecordInterval', int(interval.total_seconds()), dtype=numpy.int64)
+    matrixGroup.attrs.create('numberOfStations', numberOfStations, dtype=numpy.int64)
+    matrixGroup.attrs.create('numberOfTimes', numberOfColumns, dtype=numpy.int64)
+
+    datasets = {name: matrixGroup.create_dataset(name, (numberOfStations, numberOfColumns), dtype=numpy.float64,
+                                                 chunks=chunks, fillvalue=numpy.nan)
+                for name in ('Direction', 'Speed')}
+
+    #Fill whole rows of chunks, so each chunk is written once.
+    for startRow in range(0, numberOfStations, chunks[0]):
+        endRow = min(numberOfStations, startRow + chunks[0])
+
+        for name, dataset in datasets.items():
+            block = numpy.full((endRow - startRow, numberOfColumns), numpy.nan, dtype=numpy.float64)
+
+            for row in range(startRow, endRow):
+                values = hdf_file['Group ' + str(row + 1)][name][0]
+                block[row - startRow, columns[row]:columns[row] + values.shape[0]] = values
+
+            dataset[startRow:endRow, :] = block
+
+    print("Created station matrix of", numberOfStations, "stations by", numberOfColumns, "times")
+
+    return matrixGroup
+
+
+#******************************************************************************
+def update_station_matrix(hdf_file, requested=False, changed=True):
+    """Write the station matrix if it is requested and missing, or rewrite an existing matrix if the stations changed.
+
+    :param hdf_file: The S-111 HDF file. (Time series)
+    :param requested: True if the matrix is requested.
+    :param changed: True if the stations changed.
+    """
+
+    hasMatrix = MATRIX_GROUP in hdf_file
+    if (requested and not hasMatrix) or (changed and hasMatrix):
+        write_station_matrix(hdf_file)
+
+
+#******************************************************************************
+def get_matrix_group(hdf_file):
+    """Retrieve the station matrix group of an S-111 file.
+
+    :param hdf_file: The S-111 HDF file.
+    :returns: The matrix group.
+    """
+
+    if MATRIX_GROUP not in hdf_file:
+        raise Exception('The S-111 file does not contain a station matrix.')
+
+    return hdf_file[MATRIX_GROUP]
+
+
+#******************************************************************************
+def read_snapshot(hdf_file, time):
+    """Read the values of every station at a time, with a single read of each matrix.
+
+    :param hdf_file: The S-111 HDF file.
+    :param time: The time. (On the time axis of the matrix)
+    :returns: A tuple containing the direction and speed arrays, one value per station. (NaN if the station does not cover the time)
+    """
+
+    matrixGroup = get_matrix_group(hdf_file)
+
+    startTime = metadata.parse_time(matrixGroup.attrs['dateTimeOfFirstRecord'])
+    interval = timedelta(seconds=int(matrixGroup.attrs['timeRecordInterval']))
+
+    column = get_column(startTime, time, interval)
+    if column < 0 or column >= matrixGroup.attrs['numberOfTimes']:
+        raise Exception('The time ' + str(time) + ' is outside of the station matrix.')
+
+    return matrixGroup['Direction'][:, column], matrixGroup['Speed'][:, column]
+
+
+#******************************************************************************
+def read_station_series(hdf_file, station_index):
+    """Read the series of a station, with a single read of each matrix.
+
+    :param hdf_file: The S-111 HDF file.
+    :param station_index: The one based index of the station.
+    :returns: A tuple containing the direction and speed arrays, one value per time of the matrix.
+    """
+
+    matrixGroup = get_matrix_group(hdf_file)
+
+    if station_index < 1 or station_index > matrixGroup.attrs['numberOfStations']:
+        raise Exception('Station ' + str(station_index) + ' is not in the station matrix.')
+
+    return matrixGroup['Direction'][station_index - 1, :], matrixGroup['Speed'][station_index - 1, :]
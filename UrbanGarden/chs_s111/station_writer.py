@@ -0,0 +1,322 @@
+#******************************************************************************
+#
+#******************************************************************************
+from datetime import timedelta
+import numpy
+from chs_s111 import group_hash
+from chs_s111 import group_statistics
+from chs_s111 import metadata
+from chs_s111 import station_matrix
+
+#******************************************************************************
+def update_temporal_coverage(hdf_file, start_time, end_time):
+    """Update the temporal extents of the S-111 file.
+
+    :param hdf_file: The S-111 HDF file.
+    :param start_time: The new start time.
+    :param end_time: The new end time.
+    """
+
+    if 'dateTimeOfFirstRecord' in hdf_file.attrs:
+        dateTimeOfFirstRecord = metadata.parse_time(hdf_file.attrs['dateTimeOfFirstRecord'])
+        dateTimeOfFirstRecord = min(dateTimeOfFirstRecord, start_time)
+    else:
+        dateTimeOfFirstRecord = start_time
+
+    if 'dateTimeOfLastRecord' in hdf_file.attrs:
+        dateTimeOfLastRecord = metadata.parse_time(hdf_file.attrs['dateTimeOfLastRecord'])
+        dateTimeOfLastRecord = max(dateTimeOfLastRecord, end_time)
+    else:
+        dateTimeOfLastRecord = end_time
+
+    hdf_file.attrs.create('dateTimeOfFirstRecord', metadata.format_time(dateTimeOfFirstRecord))
+    hdf_file.attrs.create('dateTimeOfLastRecord', metadata.format_time(dateTimeOfLastRecord))
+
+
+#******************************************************************************
+def recompute_temporal_coverage(hdf_file):
+    """Recompute the temporal extents of the S-111 file from all station groups.
+
+    Replacing or removing a station can narrow the extents, so they cannot simply be merged.
+
+    :param hdf_file: The S-111 HDF file. (Time series)
+    """
+
+    for attribute_name in ['dateTimeOfFirstRecord', 'dateTimeOfLastRecord']:
+        if attribute_name in hdf_file.attrs:
+            del hdf_file.attrs[attribute_name]
+
+    numStations = hdf_file.attrs['numberOfStations']
+    if numStations == 0:
+        return
+
+    #Every station has the same number of records and interval, only their start times differ.
+    seriesLength = timedelta(seconds=int(hdf_file.attrs['timeRecordInterval']) * (int(hdf_file.attrs['numberOfTimes']) - 1))
+
+    for stationIndex in range(0, numStations):
+        startTime = metadata.parse_time(hdf_file['Group ' + str(stationIndex + 1)].attrs['DateTime'])
+        update_temporal_coverage(hdf_file, startTime, startTime + seriesLength)
+
+
+#******************************************************************************
+def update_current_speed(hdf_file, min_speed, max_speed):
+    """Update the min/max current speed values of the S-111 file.
+
+    :param hdf_file: The S-111 HDF file.
+    :param min_speed: The minimum current speed value added.
+    :param max_speed: The maximum current speed value added.
+    """
+
+    if 'minSurfCurrentSpeed' in hdf_file.attrs:
+        min_speed = min(min_speed, hdf_file.attrs['minSurfCurrentSpeed'])
+
+    if 'maxSurfCurrentSpeed' in hdf_file.attrs:
+        max_speed = max(max_speed, hdf_file.attrs['maxSurfCurrentSpeed'])
+
+    hdf_file.attrs.create('minSurfCurrentSpeed', min_speed)
+    hdf_file.attrs.create('maxSurfCurrentSpeed', max_speed)
+
+
+#******************************************************************************
+def add_station_group(hdf_file, longitude, latitude, start_time, end_time, number_of_records, interval):
+    """Add a new timeseries group to the given S-111 HDF file.
+
+    :param hdf_file: The S-111 HDF file.
+    :param longitude: The x coordinate of the station.
+    :param latitude: The y coordinate of the station.
+    :param start_time: The time of the station's first record.
+    :param end_time: The time of the station's last record.
+    :param number_of_records: The number of records in the station's series.
+    :param interval: The time interval between records.
+    :returns: The newly created group.
+    """
+
+    #Read the file metadata to find out how many time stations we currently have.
+    numCurrentStations = hdf_file.attrs['numberOfStations']
+
+    #If this is the first station, then we need to initialize a few things.
+    if numCurrentStations == 0:
+
+        #Set the number of times.
+        hdf_file.attrs.create('numberOfTimes', number_of_records, dtype=numpy.int64)
+
+        #Set the correct coding format.
+        hdf_file.attrs.create('dataCodingFormat', 1, dtype=numpy.int64)
+
+        #Set the correct record interval.
+        intervalInSeconds = interval.total_seconds()
+        hdf_file.attrs.create('timeRecordInterval', intervalInSeconds, dtype=numpy.int64)
+
+        x_dataset = numpy.empty((1, 1), dtype=numpy.float64)
+        x_dataset[0][0] = longitude
+
+        y_dataset = numpy.empty((1, 1), dtype=numpy.float64)
+        y_dataset[0][0] = latitude
+
+        #Add the 'Group XY' to store the position information.
+        xy_group = hdf_file.create_group('Group XY')
+
+        #Add the x and y datasets to the xy group.
+        xy_group.create_dataset('X', (1, 1), maxshape=(1, None), dtype=numpy.float64, data=x_dataset)
+        xy_group.create_dataset('Y', (1, 1), maxshape=(1, None), dtype=numpy.float64, data=y_dataset)
+
+
+    #Else this is not a new file, so lets verify a few things.
+    else:
+
+        #Make sure this file contains the correct number of times.
+        numTimesInFile = hdf_file.attrs['numberOfTimes']
+        if numTimesInFile != number_of_records:
+            raise Exception('Number of times in file does not match file header.')
+
+        #Make sure the given file contains the correct type of data.
+        dataCodingFormat = hdf_file.attrs['dataCodingFormat']
+        if dataCodingFormat != 1:
+            raise Exception('The specified S-111 file does not contain time series data.')
+
+        #Make sure the given file has the correct record interval.
+        timeRecordInterval = hdf_file.attrs['timeRecordInterval']
+        intervalInSeconds = interval.total_seconds()
+        if intervalInSeconds != timeRecordInterval:
+            raise Exception('The specified S-111 file does not match the input time interval.')
+
+        #A station matrix has a single time axis, which the new station must start on.
+        if station_matrix.MATRIX_GROUP in hdf_file:
+            station_matrix.check_station_alignment(hdf_file, start_time)
+
+        #Update the XY group with the position information of this time series file.
+        xy_group = hdf_file['Group XY']
+
+        x_dataset = xy_group['X']
+        x_dataset.resize((1, numCurrentStations+1))
+        x_dataset[(0, numCurrentStations)] = longitude
+
+        y_dataset = xy_group['Y']
+        y_dataset.resize((1, numCurrentStations+1))
+        y_dataset[(0, numCurrentStations)] = latitude
+
+    #Update the temporal information.
+    update_temporal_coverage(hdf_file, start_time, end_time)
+
+    #Increment the number of time stations and store it back in the file.
+    numCurrentStations += 1
+    hdf_file.attrs.create('numberOfStations', numCurrentStations, dtype=numpy.int64)
+
+    #Create the new group
+    newGroupName = 'Group ' + str(numCurrentStations)
+    newGroup = hdf_file.create_group(newGroupName)
+
+    #Store the title
+    newGroupTitle = 'Station No. ' + str(numCurrentStations)
+    newGroup.attrs.create('Title', newGroupTitle.encode())
+
+    #Store the start time.
+    newGroup.attrs.create('DateTime', metadata.format_time(start_time))
+
+    print("Created tide station group #", str(numCurrentStations))
+
+    return newGroup
+
+
+#******************************************************************************
+def remove_station_groups(hdf_file, group_names):
+    """Remove the stations of a previous ingest, so they can be replaced.
+
+    The stations are numbered by their position in the XY group, so the remaining
+    stations are renumbered to close the gaps.
+
+    :param hdf_file: The S-111 HDF file.
+    :param group_names: The list of the names of the station groups to remove.
+    :returns: A dictionary of the new name of each renumbered station group, keyed by its old name.
+    """
+
+    numCurrentStations = hdf_file.attrs['numberOfStations']
+    removed = set(group_names)
+
+    keptIndices = [stationIndex for stationIndex in range(0, numCurrentStations)
+                   if 'Group ' + str(stationIndex + 1) not in removed]
+
+    for group_name in group_names:
+        if group_name in hdf_file:
+            del hdf_file[group_name]
+
+    renamed = dict()
+    for newIndex, stationIndex in enumerate(keptIndices):
+        if newIndex == stationIndex:
+            continue
+
+        oldGroupName = 'Group ' + str(stationIndex + 1)
+        newGroupName = 'Group ' + str(newIndex + 1)
+        hdf_file.move(oldGroupName, newGroupName)
+
+        newGroupTitle = 'Station No. ' + str(newIndex + 1)
+        hdf_file[newGroupName].attrs.create('Title', newGroupTitle.encode())
+        renamed[oldGroupName] = newGroupName
+
+    numberOfStations = len(keptIndices)
+    hdf_file.attrs.create('numberOfStations', numberOfStations, dtype=numpy.int64)
+
+    #The speed extents may have come from the removed stations, so merge them again from the remaining ones.
+    for attribute_name in ['minSurfCurrentSpeed', 'maxSurfCurrentSpeed']:
+        if attribute_name in hdf_file.attrs:
+            del hdf_file.attrs[attribute_name]
+
+    #So may the temporal extents, which the station matrix and the catalog read.
+    recompute_temporal_coverage(hdf_file)
+
+    if numberOfStations == 0:
+        #The XY group is created again with the first station.
+        if 'Group XY' in hdf_file:
+            del hdf_file['Group XY']
+        return renamed
+
+    xy_group = hdf_file['Group XY']
+    for dataset_name in ['X', 'Y']:
+        values = xy_group[dataset_name][0, :][keptIndices]
+        xy_group[dataset_name].resize((1, numberOfStations))
+        xy_group[dataset_name][0, :] = values
+
+    for stationIndex in range(0, numberOfStations):
+        group = hdf_file['Group ' + str(stationIndex + 1)]
+
+        #Use the station's stored statistics, only reading the speeds of stations added without them.
+        if 'minSurfCurrentSpeed' in group.attrs:
+            update_current_speed(hdf_file, group.attrs['minSurfCurrentSpeed'], group.attrs['maxSurfCurrentSpeed'])
+        else:
+            speeds = group['Speed'][()]
+            update_current_speed(hdf_file, speeds.min(), speeds.max())
+
+    return renamed
+
+
+#******************************************************************************
+def write_station_identity(group, station_name, station_id):
+    """Store the name and identifier of a station, for the dialects which give them.
+
+    :param group: The HDF group of the station.
+    :param station_name: The name of the station, None if not known.
+    :param station_id: The identifier of the station, None if not known.
+    """
+
+    #Store the Station Name
+    if station_name != None:
+        group.attrs.create('StationName', station_name.encode())
+
+    #Store the Station ID
+    if station_id != None:
+        group.attrs.create('StationID', station_id.encode())
+
+
+#******************************************************************************
+def write_station_datasets(group, directions, speeds):
+    """Add the timeseries data to the specified HDF group.
+
+    :param group: The HDF group to add the speed and direction datasets to.
+    :param directions: Array of direction values (degrees true).
+    :param speeds: Array of speed values (knots).
+    :returns: A tuple containing the minimum and maximum speed values added.
+    """
+
+    numberOfRecords = directions.shape[0]
+
+    group.create_dataset('Direction', (1, numberOfRecords), dtype=numpy.float64, data=directions.reshape(1, numberOfRecords))
+    group.create_dataset('Speed', (1, numberOfRecords), dtype=numpy.float64, data=speeds.reshape(1, numberOfRecords))
+
+    #Store the station's statistics, so queries do not need to read the values.
+    statistics = group_statistics.write_series_statistics(group, speeds)
+
+    #Store the content hash, so an update can tell if the values changed.
+    group_hash.write_group_hash(group, group_hash.compute_group_hash(directions, speeds))
+
+    return (statistics['min'][0], statistics['max'][0])
+
+
+#******************************************************************************
+def add_station(hdf_file, longitude, latitude, start_time, interval, directions, speeds):
+    """Add a station, and its series of values, to the given S-111 HDF file.
+
+    :param hdf_file: The S-111 HDF file.
+    :param longitude: The x coordinate of the station.
+    :param latitude: The y coordinate of the station.
+    :param start_time: The time of the station's first record.
+    :param interval: The time interval between records.
+    :param directions: Array of direction values (degrees true).
+    :param speeds: Array of speed values (knots).
+    :returns: The newly created group.
+    """
+
+    directions = numpy.asarray(directions, dtype=numpy.float64).ravel()
+    speeds = numpy.asarray(speeds, dtype=numpy.float64).ravel()
+
+    numberOfRecords = directions.shape[0]
+    if numberOfRecords == 0 or speeds.shape[0] != numberOfRecords:
+        raise Exception('The station must have the same (non zero) number of direction and speed values.')
+
+    end_time = start_time + (numberOfRecords - 1) * interval
+
+    newGroup = add_station_group(hdf_file, longitude, latitude, start_time, end_time, numberOfRecords, interval)
+
+    min_speed, max_speed = write_station_datasets(newGroup, directions, speeds)
+    update_current_speed(hdf_file, min_speed, max_speed)
+
+    return newGroup
@@ -0,0 +1,466 @@
+#******************************************************************************
+#
+#******************************************************************************
+import csv
+from datetime import datetime
+import numpy
+import pytz
+from chs_s111 import current_vectors
+from chs_s111 import pipeline
+from chs_s111 import station_writer
+
+#The default number of times predicted at a time.
+DEFAULT_CHUNK_TIMES = 65536
+
+#The start of the Julian century the astronomical arguments are computed from. (J2000.0)
+J2000 = datetime(2000, 1, 1, 12, 0, 0, tzinfo=pytz.utc)
+
+#The hours in a Julian century.
+HOURS_PER_CENTURY = 36525.0 * 24.0
+
+#The polynomials (degrees, in Julian centuries since J2000.0) of the mean longitudes of the
+#moon (s), the sun (h), the lunar perigee (p), the lunar node (N) and the solar perigee (p').
+MOON_LONGITUDE = [218.3164591, 481267.88134236, -0.0013268, 1.0 / 538841.0, -1.0 / 65194000.0]
+SUN_LONGITUDE = [280.46645, 36000.76983, 0.0003032]
+LUNAR_PERIGEE = [83.3532430, 4069.0137111, -0.0103238, -1.0 / 80053.0, 1.0 / 18999000.0]
+LUNAR_NODE = [125.0445550, -1934.1361849, 0.0020762, 1.0 / 467410.0, -1.0 / 60616000.0]
+SOLAR_PERIGEE = [282.93768, 1.7195366, 0.00045688, -0.000000018]
+
+#The tidal constituents, each a tuple of its Doodson numbers (multiples of the lunar time, s, h,
+#p, N' and p'), its phase offset (degrees) and its nodal correction (the constituent whose
+#correction applies, and the power it is raised to).
+CONSTITUENTS = {
+    'SA': ((0, 0, 1, 0, 0, 0), 0.0, (None, 0)),
+    'SSA': ((0, 0, 2, 0, 0, 0), 0.0, (None, 0)),
+    'MM': ((0, 1, 0, -1, 0, 0), 0.0, ('MM', 1)),
+    'MSF': ((0, 2, -2, 0, 0, 0), 0.0, ('M2', -1)),
+    'MF': ((0, 2, 0, 0, 0, 0), 0.0, ('MF', 1)),
+    'Q1': ((1, -2, 0, 1, 0, 0), -90.0, ('O1', 1)),
+    'O1': ((1, -1, 0, 0, 0, 0), -90.0, ('O1', 1)),
+    'P1': ((1, 1, -2, 0, 0, 0), -90.0, (None, 0)),
+    'K1': ((1, 1, 0, 0, 0, 0), 90.0, ('K1', 1)),
+    'J1': ((1, 2, 0, -1, 0, 0), 90.0, ('J1', 1)),
+    'OO1': ((1, 3, 0, 0, 0, 0), 90.0, ('OO1', 1)),
+    '2N2': ((2, -2, 0, 2, 0, 0), 0.0, ('M2', 1)),
+    'MU2': ((2, -2, 2, 0, 0, 0), 0.0, ('M2', 1)),
+    'N2': ((2, -1, 0, 1, 0, 0), 0.0, ('M2', 1)),
+    'NU2': ((2, -1, 2, -1, 0, 0), 0.0, ('M2', 1)),
+    'M2': ((2, 0, 0, 0, 0, 0), 0.0, ('M2', 1)),
+    'L2': ((2, 1, 0, -1, 0, 0), 180.0, ('M2', 1)),
+    'T2': ((2, 2, -3, 0, 0, 1), 0.0, (None, 0)),
+    'S2': ((2, 2, -2, 0, 0, 0), 0.0, (None, 0)),
+    'K2': ((2, 2, 0, 0, 0, 0), 0.0, ('K2', 1)),
+    'MN4': ((4, -1, 0, 1, 0, 0), 0.0, ('M2', 2)),
+    'M4': ((4, 0, 0, 0, 0, 0), 0.0, ('M2', 2)),
+    'MS4': ((4, 2, -2, 0, 0, 0), 0.0, ('M2', 1)),
+    'M6': ((6, 0, 0, 0, 0, 0), 0.0, ('M2', 3)),
+    'M8': ((8, 0, 0, 0, 0, 0), 0.0, ('M2', 4))}
+
+#The nodal corrections (Schureman), each a tuple of the cosine terms of f and the sine terms (degrees) of u,
+#as multiples of 0, 1, 2 and 3 times the longitude of the lunar node.
+NODAL_CORRECTIONS = {
+    'MM': ([1.0, -0.1300, 0.0013, 0.0], [0.0, 0.0, 0.0, 0.0]),
+    'MF': ([1.0429, 0.4135, -0.004, 0.0], [0.0, -23.74, 2.68, -0.38]),
+    'O1': ([1.0089, 0.1871, -0.0147, 0.0014], [0.0, 10.80, -1.34, 0.19]),
+    'K1': ([1.0060, 0.1150, -0.0088, 0.0006], [0.0, -8.86, 0.68, -0.07]),
+    'J1': ([1.0129, 0.1676, -0.0170, 0.0016], [0.0, -12.94, 1.34, -0.19]),
+    'OO1': ([1.1027, 0.6504, 0.0317, -0.0014], [0.0, -36.68, 4.02, -0.57]),
+    'M2': ([1.0004, -0.0373, 0.0002, 0.0], [0.0, -2.14, 0.0, 0.0]),
+    'K2': ([1.0241, 0.2863, 0.0083, -0.0015], [0.0, -17.74, 0.68, -0.04])}
+
+#The columns of a constituent table.
+TABLE_COLUMNS = ['station', 'latitude', 'longitude', 'constituent', 'major', 'minor', 'inclination', 'phase']
+
+#******************************************************************************
+def evaluate_polynomial(coefficients, centuries):
+    """Evaluate the polynomial of an astronomical argument.
+
+    :param coefficients: The coefficients, from the constant term up.
+    :param centuries: The time in Julian centuries since J2000.0.
+    :returns: The value of the polynomial.
+    """
+
+    return sum(coefficient * centuries ** power for power, coefficient in enumerate(coefficients))
+
+
+#******************************************************************************
+def get_centuries(time):
+    """Convert a time into Julian centuries since J2000.0.
+
+    :param time: The time. (UTC)
+    :returns: The number of Julian centuries.
+    """
+
+    return (time - J2000).total_seconds() / 3600.0 / HOURS_PER_CENTURY
+
+
+#******************************************************************************
+def get_astronomical_arguments(time):
+    """Compute the astronomical arguments the constituents are combinations of.
+
+    :param time: The time. (UTC)
+    :returns: An array of the lunar time, s, h, p, N' and p' (degrees).
+    """
+
+    centuries = get_centuries(time)
+
+    s = evaluate_polynomial(MOON_LONGITUDE, centuries)
+    h = evaluate_polynomial(SUN_LONGITUDE, centuries)
+    p = evaluate_polynomial(LUNAR_PERIGEE, centuries)
+    N = evaluate_polynomial(LUNAR_NODE, centuries)
+    pp = evaluate_polynomial(SOLAR_PERIGEE, centuries)
+
+    #The hour angle of the mean sun, which is 180 degrees at midnight.
+    utc = time.astimezone(pytz.utc)
+    hourAngle = 180.0 + 15.0 * (utc.hour + utc.minute / 60.0 + (utc.second + utc.microsecond / 1e6) / 3600.0)
+
+    return numpy.array([hourAngle + h - s, s, h, p, -N, pp])
+
+
+#******************************************************************************
+def get_argument_rates():
+    """Compute the rates of the astronomical arguments.
+
+    :returns: An array of the rates of the lunar time, s, h, p, N' and p' (degrees per hour).
+    """
+
+    s = MOON_LONGITUDE[1] / HOURS_PER_CENTURY
+    h = SUN_LONGITUDE[1] / HOURS_PER_CENTURY
+
+    return numpy.array([15.0 + h - s, s, h, LUNAR_PERIGEE[1] / HOURS_PER_CENTURY,
+                        -LUNAR_NODE[1] / HOURS_PER_CENTURY, SOLAR_PERIGEE[1] / HOURS_PER_CENTURY])
+
+
+#******************************************************************************
+def get_doodson_numbers(constituents):
+    """Retrieve the Doodson numbers of constituents.
+
+    :param constituents: The list of constituent names.
+    :returns: An array of the Doodson numbers. (One row per constituent)
+    """
+
+    for name in constituents:
+        if name not in CONSTITUENTS:
+            raise Exception('Unknown tidal constituent ' + str(name))
+
+    return numpy.array([CONSTITUENTS[name][0] for name in constituents], dtype=numpy.float64)
+
+
+#******************************************************************************
+def get_constituent_speeds(constituents):
+    """Compute the speeds of constituents.
+
+    :param constituents: The list of constituent names.
+    :returns: An array of the speeds (degrees per hour).
+    """
+
+    return get_doodson_numbers(constituents) @ get_argument_rates()
+
+
+#******************************************************************************
+def get_equilibrium_arguments(constituents, time):
+    """Compute the equilibrium arguments (V) of constituents.
+
+    :param constituents: The list of constituent names.
+    :param time: The time. (UTC)
+    :returns: An array of the equilibrium arguments (degrees).
+    """
+
+    offsets = numpy.array([CONSTITUENTS[name][1] for name in constituents], dtype=numpy.float64)
+
+    return numpy.mod(get_doodson_numbers(constituents) @ get_astronomical_arguments(time) + offsets, 360.0)
+
+
+#******************************************************************************
+def get_nodal_corrections(constituents, time):
+    """Compute the nodal corrections of constituents.
+
+    :param constituents: The list of constituent names.
+    :param time: The time. (UTC)
+    :returns: A tuple containing the arrays of the amplitude factors (f) and phase corrections (u, degrees).
+    """
+
+    node = numpy.radians(evaluate_polynomial(LUNAR_NODE, get_centuries(time)))
+    multiples = numpy.arange(4) * node
+
+    f = numpy.ones(len(constituents), dtype=numpy.float64)
+    u = numpy.zeros(len(constituents), dtype=numpy.float64)
+
+    for index, name in enumerate(constituents):
+        base, power = CONSTITUENTS[name][2]
+        if base == None:
+            continue
+
+        cosines, sines = NODAL_CORRECTIONS[base]
+        f[index] = numpy.dot(cosines, numpy.cos(multiples)) ** abs(power)
+        u[index] = numpy.dot(sines, numpy.sin(multiples)) * power
+
+    return f, u
+
+
+#******************************************************************************
+class ConstituentTable:
+    """The harmonic constituents of the tidal currents at a set of stations.
+
+    Each constituent is a current ellipse: the semi-major and semi-minor axes (m/s,
+    the minor axis negative for clockwise rotation), the inclination of the major
+    axis (degrees counterclockwise from east) and the Greenwich phase lag (degrees).
+    A constituent a station does not list has no amplitude there.
+    """
+
+    #******************************************************************************
+    def __init__(self, station_names, latitudes, longitudes, constituents, major, minor, inclination, phase):
+        """Create the table.
+
+        :param station_names: The list of station names.
+        :param latitudes: Array of the station latitudes.
+        :param longitudes: Array of the station longitudes.
+        :param constituents: The list of constituent names.
+        :param major: Array of the semi-major axes. (stations x constituents, m/s)
+        :param minor: Array of the semi-minor axes. (stations x constituents, m/s)
+        :param inclination: Array of the inclinations. (stations x constituents, degrees)
+        :param phase: Array of the Greenwich phase lags. (stations x constituents, degrees)
+        """
+
+        self.station_names = station_names
+        self.latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+        self.longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+        self.constituents = constituents
+        self.major = numpy.asarray(major, dtype=numpy.float64)
+        self.minor = numpy.asarray(minor, dtype=numpy.float64)
+        self.inclination = numpy.asarray(inclination, dtype=numpy.float64)
+        self.phase = numpy.asarray(phase, dtype=numpy.float64)
+
+        #Make sure the constituents are known before predicting anything.
+        get_doodson_numbers(constituents)
+
+        shape = (len(station_names), len(constituents))
+        for values in (self.major, self.minor, self.inclination, self.phase):
+            if values.shape != shape:
+                raise Exception('The constituent table must have a value for each station and constituent.')
+
+
+    #******************************************************************************
+    def get_coefficients(self, stations):
+        """Compute the coefficients of the eastward/northward components for some stations.
+
+        With the equilibrium argument X of a constituent (including its nodal phase
+        correction), each component is a sum of f cos(X) and f sin(X) terms.
+
+        :param stations: The slice of stations.
+        :returns: An array of the coefficients. (Eastward then northward rows for the stations, cosine then sine columns for the constituents)
+        """
+
+        #The ellipse is the sum of a counterclockwise and a clockwise rotating vector.
+        counterclockwise = (self.major[stations] + self.minor[stations]) / 2.0
+        clockwise = (self.major[stations] - self.minor[stations]) / 2.0
+
+        inclination = numpy.radians(self.inclination[stations])
+        phase = numpy.radians(self.phase[stations])
+
+        plus = counterclockwise * numpy.exp(1j * (inclination - phase))
+        minus = clockwise * numpy.exp(1j * (inclination + phase))
+
+        eastward = numpy.hstack([plus.real + minus.real, minus.imag - plus.imag])
+        northward = numpy.hstack([plus.imag + minus.imag, plus.real - minus.real])
+
+        return numpy.vstack([eastward, northward])
+
+
+#******************************************************************************
+def read_constituent_table(file_name):
+    """Read a constituent table from an ASCII CSV file.
+
+    The file has a header row and one row per station and constituent, with the
+    columns: station, latitude, longitude, constituent, major, minor, inclination and
+    phase. The stations are kept in the order they are first listed.
+
+    :param file_name: The ASCII CSV file containing the constituents.
+    :returns: The ConstituentTable.
+    """
+
+    with open(file_name) as csvfile:
+        reader = csv.reader(csvfile)
+
+        header = [name.strip().lower() for name in next(reader)]
+
+        #Skip any blank lines (e.g. at the end of the sheet)
+        rows = [row for row in reader if any(col.strip() for col in row)]
+
+    for column in TABLE_COLUMNS:
+        if column not in header:
+            raise Exception('The constituent table ' + file_name + ' does not have a ' + column + ' column.')
+
+    columns = [header.index(column) for column in TABLE_COLUMNS]
+
+    stations = {}
+    constituents = {}
+    values = []
+
+    for rowIndex, row in enumerate(rows):
+        if len(row) != len(header):
+            raise Exception('Constituent row ' + str(rowIndex + 1) + ' does not have a value for each column of the header.')
+
+        station, latitude, longitude, constituent, major, minor, inclination, phase = [row[column].strip() for column in columns]
+        constituent = constituent.upper()
+
+        position = (float(latitude), float(longitude))
+        if station not in stations:
+            stations[station] = position
+        elif stations[station] != position:
+            raise Exception('Constituent row ' + str(rowIndex + 1) + ' gives another position for station ' + station)
+
+        constituents.setdefault(constituent, len(constituents))
+
+        values.append((station, constituent, float(major), float(minor), float(inclination), float(phase)))
+
+    stationIndices = {station: index for index, station in enumerate(stations)}
+
+    shape = (len(stations), len(constituents))
+    major = numpy.zeros(shape, dtype=numpy.float64)
+    minor = numpy.zeros(shape, dtype=numpy.float64)
+    inclination = numpy.zeros(shape, dtype=numpy.float64)
+    phase = numpy.zeros(shape, dtype=numpy.float64)
+
+    for station, constituent, majorValue, minorValue, inclinationValue, phaseValue in values:
+        index = (stationIndices[station], constituents[constituent])
+        major[index] = majorValue
+        minor[index] = minorValue
+        inclination[index] = inclinationValue
+        phase[index] = phaseValue
+
+    positions = list(stations.values())
+
+    return ConstituentTable(list(stations), [position[0] for position in positions], [position[1] for position in positions],
+                            list(constituents), major, minor, inclination, phase)
+
+
+#******************************************************************************
+def get_harmonic_terms(constituents, start_time, interval, first_record, number_of_records):
+    """Compute the f cos(X) and f sin(X) terms of constituents at a run of times.
+
+    The equilibrium arguments advance linearly from the start time, and the nodal
+    corrections are taken at the middle of the run.
+
+    :param constituents: The list of constituent names.
+    :param start_time: The time of the first record. (UTC)
+    :param interval: The time interval between records.
+    :param first_record: The index of the first record of the run.
+    :param number_of_records: The number of records in the run.
+    :returns: An array of the cosine then sine terms. (Two rows per constituent, one column per time)
+    """
+
+    intervalHours = interval.total_seconds() / 3600.0
+
+    f, u = get_nodal_corrections(constituents, start_time + (first_record + number_of_records // 2) * interval)
+
+    #The arguments are reduced before they grow, so a long run keeps its precision.
+    speeds = get_constituent_speeds(constituents)
+    firstArguments = get_equilibrium_arguments(constituents, start_time) + u + numpy.mod(speeds * first_record * intervalHours, 360.0)
+
+    hours = numpy.arange(number_of_records, dtype=numpy.float64) * intervalHours
+    arguments = numpy.radians(firstArguments[:, numpy.newaxis] + speeds[:, numpy.newaxis] * hours)
+
+    terms = numpy.empty((2 * len(constituents), number_of_records), dtype=numpy.float64)
+    numpy.cos(arguments, out=terms[:len(constituents)])
+    numpy.sin(arguments, out=terms[len(constituents):])
+    terms *= numpy.concatenate([f, f])[:, numpy.newaxis]
+
+    return terms
+
+
+#******************************************************************************
+def predict_direction_speed(table, start_time, interval, number_of_records, stations=slice(None), chunk_times=DEFAULT_CHUNK_TIMES):
+    """Predict the currents of stations, every station and time at once.
+
+    The components of all of the stations are a single matrix product of their
+    coefficients with the harmonic terms of the times, a chunk of times at a time.
+
+    :param table: The ConstituentTable.
+    :param start_time: The time of the first record. (UTC)
+    :param interval: The time interval between records.
+    :param number_of_records: The number of records of each station.
+    :param stations: The slice of stations to predict.
+    :param chunk_times: The maximum number of times predicted at a time.
+    :returns: A tuple containing the arrays of directions (degrees true) and speeds (knots). (stations x times)
+    """
+
+    coefficients = table.get_coefficients(stations)
+    numberOfStations = coefficients.shape[0] // 2
+    chunkTimes = max(1, min(chunk_times, number_of_records))
+
+    directions = numpy.empty((numberOfStations, number_of_records), dtype=numpy.float64)
+    speeds = numpy.empty((numberOfStations, number_of_records), dtype=numpy.float64)
+
+    components = numpy.empty((2 * numberOfStations, chunkTimes), dtype=numpy.float64)
+    uKnot = numpy.empty((numberOfStations, chunkTimes), dtype=numpy.float64)
+    vKnot = numpy.empty((numberOfStations, chunkTimes), dtype=numpy.float64)
+
+    for firstRecord in range(0, number_of_records, chunkTimes):
+        count = min(chunkTimes, number_of_records - firstRecord)
+        times = slice(firstRecord, firstRecord + count)
+
+        terms = get_harmonic_terms(table.constituents, start_time, interval, firstRecord, count)
+        numpy.matmul(coefficients, terms, out=components[:, :count])
+
+        current_vectors.compute_direction_speed_into(components[:numberOfStations, :count], components[numberOfStations:, :count],
+                                                     directions[:, times], speeds[:, times], uKnot[:, :count], vKnot[:, :count])
+
+    return directions, speeds
+
+
+#******************************************************************************
+def add_predicted_stations(hdf_file, table, start_time, interval, number_of_records, memory_budget, pipelined=False,
+                           chunk_times=DEFAULT_CHUNK_TIMES):
+    """Predict the currents of every station of a table and add them as stations of the S-111 file.
+
+    The stations are predicted in blocks, as many as fit in the memory budget, and
+    written through the same path as the stations read from ASCII files. When
+    pipelined, the next block is predicted in a background thread while the current
+    one is written.
+
+    :param hdf_file: The S-111 HDF file.
+    :param table: The ConstituentTable.
+    :param start_time: The time of the first record. (UTC)
+    :param interval: The time interval between records.
+    :param number_of_records: The number of records of each station.
+    :param memory_budget: The memory (in bytes) available for the predicted values.
+    :param pipelined: True to overlap predicting the stations with writing them.
+    :param chunk_times: The maximum number of times predicted at a time.
+    :returns: The list of the newly created groups.
+    """
+
+    if number_of_records <= 0:
+        raise Exception('At least one record must be predicted.')
+
+    #Each block is predicted into its own arrays, the buffers only bound how far ahead the predictions get.
+    buffers = [None] * (pipeline.DOUBLE_BUFFERED if pipelined else 1)
+
+    #Each station holds its directions and speeds, for each of the blocks in flight, and while a block is predicted
+    #its coefficients (cosine and sine of each constituent, for both components) and a chunk of its components and knots.
+    chunkTimes = max(1, min(chunk_times, number_of_records))
+    resultValues = len(buffers) * 2 * number_of_records
+    predictionValues = 4 * len(table.constituents) + 4 * chunkTimes
+    stationBytes = (resultValues + predictionValues) * numpy.dtype(numpy.float64).itemsize
+    stationsPerBlock = max(1, memory_budget // stationBytes)
+    numberOfStations = len(table.station_names)
+
+    print("Predicting", numberOfStations, "stations with", len(table.constituents), "constituents,", number_of_records, "records each")
+
+    blocks = [slice(firstStation, min(numberOfStations, firstStation + stationsPerBlock))
+              for firstStation in range(0, numberOfStations, stationsPerBlock)]
+
+    def predict_block(stations, buffer):
+        return predict_direction_speed(table, start_time, interval, number_of_records, stations, chunk_times)
+
+    groups = []
+
+    for stations, (directions, speeds) in pipeline.run_pipeline(blocks, predict_block, buffers, pipelined):
+        with pipeline.hdf5_lock:
+            for index, stationIndex in enumerate(range(stations.start, stations.stop)):
+                newGroup = station_writer.add_station(hdf_file, table.longitudes[stationIndex], table.latitudes[stationIndex],
+                                                      start_time, interval, directions[index], speeds[index])
+                station_writer.write_station_identity(newGroup, table.station_names[stationIndex], None)
+                groups.append(newGroup)
+
+    return groups
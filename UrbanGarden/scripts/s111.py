@@ -0,0 +1,339 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import importlib
+import json
+import os
+
+#The script module run by each subcommand. (Imported only when the subcommand is run)
+COMMANDS = {'create': 's111_create_file',
+            'add-timeseries': 's111_add_timeseries',
+            'add-irregular-grid': 's111_add_irregular_grid',
+            'add-regular-grid': 's111_add_regular_grid',
+            'resample-timeseries': 's111_resample_timeseries',
+            'predict-timeseries': 's111_predict_timeseries',
+            'print': 's111_print_file',
+            'export': 's111_export',
+            'stats': 's111_query_statistics',
+            'catalog': 's111_catalog',
+            'serve': 's111_ingest_service',
+            'benchmark-build': 's111_benchmark_build',
+            'check-equivalence': 's111_check_equivalence'}
+
+#******************************************************************************
+def resolve_path(base_dir, path):
+    """Resolve a path in the build manifest, relative to the manifest's directory.
+
+    :param base_dir: The directory containing the build manifest.
+    :param path: The path to be resolved.
+    :returns: The resolved path.
+    """
+
+    return os.path.join(base_dir, os.path.expanduser(path))
+
+
+#******************************************************************************
+def get_step_files(step, base_dir):
+    """Retrieve the input files of a build step, which may give either 'file' or 'files'.
+
+    :param step: The build step.
+    :param base_dir: The directory containing the build manifest.
+    :returns: The list of resolved input file names.
+    """
+
+    if 'files' in step:
+        fileNames = step['files']
+    elif 'file' in step:
+        fileNames = [step['file']]
+    else:
+        raise Exception('The ' + step['type'] + ' build step does not specify any input files.')
+
+    return [resolve_path(base_dir, fileName) for fileName in fileNames]
+
+
+#******************************************************************************
+def run_timeseries_step(hdf_file, manifest, step, options):
+    """Add the timeseries files of a build step.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param step: The build step.
+    :param options: The build options. (base directory, force, memory budget and caches)
+    """
+
+    s111_add_timeseries = importlib.import_module('s111_add_timeseries')
+
+    s111_add_timeseries.add_time_series_files(hdf_file, manifest, get_step_files(step, options['baseDir']),
+                                              step.get('force', options['force']), options['seriesCache'],
+                                              step.get('validate', True), step.get('pipeline', False), step.get('matrix', False),
+                                              step.get('update', False), step.get('dialect'))
+
+
+#******************************************************************************
+def run_irregular_grid_step(hdf_file, manifest, step, options):
+    """Add the irregular grid files of a build step.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param step: The build step.
+    :param options: The build options. (base directory, force, memory budget and caches)
+    """
+
+    s111_add_irregular_grid = importlib.import_module('s111_add_irregular_grid')
+
+    for fileName in get_step_files(step, options['baseDir']):
+        if 'shards' in step:
+            s111_add_irregular_grid.add_sharded_grid(hdf_file, manifest, fileName, step['shards'], step.get('workers', os.cpu_count()),
+                                                     options['memoryBudget'], step.get('consolidate', False),
+                                                     step.get('force', options['force']))
+            continue
+
+        if step.get('update', False):
+            s111_add_irregular_grid.update_grid_file(hdf_file, manifest, fileName, options['memoryBudget'], step.get('force', options['force']))
+            continue
+
+        s111_add_irregular_grid.add_grid_file(hdf_file, manifest, fileName, options['memoryBudget'],
+                                              step.get('overviews'), options['cache'], step.get('force', options['force']),
+                                              step.get('pipeline', False))
+
+
+#******************************************************************************
+def run_regular_grid_step(hdf_file, manifest, step, options):
+    """Resample the irregular grid files of a build step onto a regular grid.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param step: The build step.
+    :param options: The build options. (base directory, force, memory budget and caches)
+    """
+
+    s111_add_regular_grid = importlib.import_module('s111_add_regular_grid')
+
+    grid = s111_add_regular_grid.get_grid_definition(hdf_file, step.get('gridOrigin'), step.get('gridSpacing'), step.get('gridSize'))
+
+    for fileName in get_step_files(step, options['baseDir']):
+        s111_add_regular_grid.add_regular_grid_file(hdf_file, manifest, fileName, grid, options['memoryBudget'],
+                                                    step.get('maxEdgeLength'), options['cache'], step.get('force', options['force']))
+
+
+#******************************************************************************
+def run_resample_timeseries_step(hdf_file, manifest, step, options):
+    """Add the resampled timeseries of a build step.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file. (Resampled series are not recorded)
+    :param step: The build step.
+    :param options: The build options. (base directory, force, memory budget and caches)
+    """
+
+    from datetime import timedelta
+    import h5py
+    from chs_s111 import station_matrix
+    s111_resample_timeseries = importlib.import_module('s111_resample_timeseries')
+
+    if 'interval' not in step:
+        raise Exception('The resample-timeseries build step does not specify the interval.')
+
+    targetInterval = timedelta(seconds=int(step['interval']))
+    method = step.get('method', 'mean')
+
+    if 'sourceFile' in step:
+        with h5py.File(resolve_path(options['baseDir'], step['sourceFile']), "r") as source_file:
+            s111_resample_timeseries.resample_s111_file(hdf_file, source_file, targetInterval, method)
+    else:
+        for fileName in get_step_files(step, options['baseDir']):
+            s111_resample_timeseries.resample_time_series_file(hdf_file, fileName, targetInterval, method, options['seriesCache'],
+                                                               step.get('validate', True), step.get('dialect'))
+
+    #The stations changed, so an existing matrix is rewritten too.
+    station_matrix.update_station_matrix(hdf_file, step.get('matrix', False))
+
+
+#******************************************************************************
+def run_predict_timeseries_step(hdf_file, manifest, step, options):
+    """Add the stations predicted from the constituent tables of a build step.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param step: The build step.
+    :param options: The build options. (base directory, force, memory budget and caches)
+    """
+
+    from datetime import timedelta
+    from chs_s111 import station_matrix
+    s111_predict_timeseries = importlib.import_module('s111_predict_timeseries')
+
+    for key in ('start', 'interval'):
+        if key not in step:
+            raise Exception('The predict-timeseries build step does not specify the ' + key + '.')
+
+    startTime = s111_predict_timeseries.parse_time_argument(step['start'])
+    interval = timedelta(seconds=int(step['interval']))
+
+    if 'records' in step:
+        numberOfRecords = int(step['records'])
+    elif 'end' in step:
+        numberOfRecords = s111_predict_timeseries.get_number_of_records(startTime, s111_predict_timeseries.parse_time_argument(step['end']), interval)
+    else:
+        raise Exception('The predict-timeseries build step does not specify the records or end.')
+
+    predicted = False
+    for fileName in get_step_files(step, options['baseDir']):
+        if s111_predict_timeseries.predict_time_series(hdf_file, manifest, fileName, startTime, interval, numberOfRecords,
+                                                       options['memoryBudget'], step.get('pipeline', False),
+                                                       step.get('force', options['force'])):
+            predicted = True
+
+    #If the stations changed, then an existing matrix is rewritten too.
+    station_matrix.update_station_matrix(hdf_file, step.get('matrix', False), predicted)
+
+
+#The function running each type of build step.
+STEPS = {'timeseries': run_timeseries_step,
+         'irregular-grid': run_irregular_grid_step,
+         'regular-grid': run_regular_grid_step,
+         'resample-timeseries': run_resample_timeseries_step,
+         'predict-timeseries': run_predict_timeseries_step}
+
+#******************************************************************************
+def run_build(build_file_name):
+    """Build an S-111 file, as described by a JSON build manifest, in a single process.
+
+    The S-111 file is opened once and every step is added through the same handle.
+    An example build manifest:
+
+        {
+          "output": "product.h5",
+          "metadata": "metadata.csv",
+          "memoryBudget": 256,
+          "cacheDir": "mesh_cache",
+          "parseCache": true,
+          "steps": [
+            {"type": "timeseries", "files": ["station1.txt", "station2.txt"]},
+            {"type": "irregular-grid", "file": "grid.nc", "overviews": [4, 16]}
+          ]
+        }
+
+    If 'metadata' is given the file is (re)created first, otherwise the steps are
+    added to the existing file. Relative paths are relative to the build manifest.
+    With "inMemory" the file is built in memory and written to disk once, unless its
+    estimated size exceeds "maxMemory" (in megabytes).
+
+    :param build_file_name: The JSON file describing the build.
+    """
+
+    from chs_s111 import ingest_manifest
+    from chs_s111 import memory_file
+    from chs_s111 import mesh_cache
+    from chs_s111 import series_cache
+
+    with open(build_file_name) as build_file:
+        build = json.load(build_file)
+
+    if 'output' not in build:
+        raise Exception('The build manifest does not specify the output file.')
+
+    steps = build.get('steps', [])
+    for step in steps:
+        if step.get('type') not in STEPS:
+            raise Exception('Unknown build step type ' + str(step.get('type')))
+
+    baseDir = os.path.dirname(os.path.abspath(build_file_name))
+    outputFileName = resolve_path(baseDir, build['output'])
+
+    #The inputs of every step, for the size estimate of an in memory build.
+    inputFileNames = []
+    for step in steps:
+        if 'files' in step or 'file' in step:
+            inputFileNames.extend(get_step_files(step, baseDir))
+        if 'sourceFile' in step:
+            inputFileNames.append(resolve_path(baseDir, step['sourceFile']))
+
+    inMemory = build.get('inMemory', False)
+    maxMemory = int(build.get('maxMemory', memory_file.DEFAULT_MAX_SIZE) * 1024 * 1024)
+
+    #A build with metadata creates the file, else the steps are added to the existing file.
+    mode = "r+"
+    if 'metadata' in build:
+        s111_create_file = importlib.import_module('s111_create_file')
+        outputFileName = s111_create_file.get_output_file_name(outputFileName)
+        mode = "w"
+
+    with memory_file.open_s111_file(outputFileName, mode, inMemory, maxMemory, inputFileNames) as hdf_file:
+
+        if mode == "w":
+            #Add the metadata to the file.
+            s111_create_file.add_metadata(hdf_file.attrs, resolve_path(baseDir, build['metadata']))
+
+            #The file is empty, so nothing recorded for a previous file applies anymore.
+            ingest_manifest.remove_manifest(outputFileName)
+
+            print("Created", outputFileName)
+
+        #Load the record of what has already been ingested into this file.
+        manifest = ingest_manifest.IngestManifest(outputFileName)
+        memory_file.defer_manifest(hdf_file, manifest)
+
+        cacheDir = build.get('cacheDir')
+        if cacheDir != None:
+            cacheDir = resolve_path(baseDir, cacheDir)
+
+        parseCacheDir = build.get('parseCacheDir')
+        if parseCacheDir != None:
+            parseCacheDir = resolve_path(baseDir, parseCacheDir)
+
+        options = {'baseDir': baseDir,
+                   'force': build.get('force', False),
+                   'memoryBudget': int(build.get('memoryBudget', 256.0) * 1024 * 1024),
+                   'cache': mesh_cache.open_mesh_cache(cacheDir, build.get('cacheSize', 1024.0)),
+                   'seriesCache': series_cache.open_series_cache(build.get('parseCache', False), parseCacheDir)}
+
+        for index, step in enumerate(steps):
+            print("Build step", index + 1, "of", len(steps), ":", step['type'])
+            STEPS[step['type']](hdf_file, manifest, step, options)
+
+        #Flush any edits out.
+        hdf_file.flush()
+
+
+#******************************************************************************
+def create_command_line():
+    """Create and initialize the command line parser.
+
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Create and populate S-111 files.',
+                                     epilog='Run "s111 <command> -h" for the options of a command.')
+
+    parser.add_argument('command', help='The command to run.', choices=sorted(COMMANDS) + ['batch'])
+    parser.add_argument('args', help='The arguments of the command. (For batch: the JSON build manifest)', nargs=argparse.REMAINDER)
+
+    return parser
+
+
+#******************************************************************************
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    if results.command == 'batch':
+
+        if len(results.args) != 1:
+            parser.error('batch requires exactly one build manifest.')
+
+        run_build(results.args[0])
+        return
+
+    #Only the command's own script (and its dependencies) are imported.
+    module = importlib.import_module(COMMANDS[results.command])
+    module.main(results.args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,23 @@
 #
 #******************************************************************************
 import argparse
+import concurrent.futures
+import json
+import os
+import shutil
 import h5py
 import numpy
 import iso8601
 import pytz
 import netCDF4
 import math
+from chs_s111 import grid_pyramid
+from chs_s111 import grid_tiling
+from chs_s111 import grid_writer
+from chs_s111 import group_statistics
+from chs_s111 import ingest_manifest
+from chs_s111 import mesh_cache
+from chs_s111 import pipeline
 
 ms2Knots = 1.943844
 
@@ -193,41 +204,492 @@ def update_metadata(hdf_file, numberOfTimes, numberOfValues, minTime, maxTime, i
     :param maxSpeed: The maximum surface speed of the source data.
     """
 
-    #Set the correct coding format.
-    hdf_file.attrs.create('dataCodingFormat', 3, dtype=numpy.int64)
+    grid_writer.update_grid_metadata(hdf_file, numberOfTimes, numberOfValues, minTime, maxTime, interval,
+                                     minX, minY, maxX, maxY, minSpeed, maxSpeed)
 
-    #Set the number of times.
-    hdf_file.attrs.create('numberOfTimes', numberOfTimes, dtype=numpy.int64)
 
-    #Set the number of nodes.
-    hdf_file.attrs.create('numberOfNodes', numberOfValues, dtype=numpy.int64)
-    
-    #Set the time interval (if we have one)
-    if interval != None:
-        intervalInSeconds = interval.total_seconds()
-        hdf_file.attrs.create('timeRecordInterval', intervalInSeconds, dtype=numpy.int64)
+#******************************************************************************
+def add_grid_file(hdf_file, manifest, grid_file_name, memory_budget, overview_factors=None, cache=None, force=False, pipelined=False):
+    """Add an irregular grid file to the S-111 file, skipping it if it has already been ingested.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param grid_file_name: The netcdf file containing the irregular grid data.
+    :param memory_budget: The memory (in bytes) available for converting the grid values.
+    :param overview_factors: The list of overview decimation factors, None for no overviews.
+    :param cache: The MeshCache to use, None to always compute the mesh-derived data.
+    :param force: True to ingest the grid even if it is unchanged.
+    :param pipelined: True to convert the next slab in a background thread while the current one is written.
+    :returns: True if the grid was ingested, false if it was skipped.
+    """
+
+    parameters = {'tool': 's111_add_irregular_grid'}
+    if overview_factors != None:
+        parameters['overviews'] = sorted(overview_factors)
+
+    #Skip the grid if it has already been ingested unchanged.
+    content_hash = manifest.hash_input(grid_file_name)
+    if not force and manifest.is_current(grid_file_name, content_hash, parameters):
+        print("Skipping", grid_file_name, "(already ingested, unchanged)")
+        return False
+
+    #If this grid was ingested before, then remove it so it can be replaced.
+    entry = manifest.get_entry(grid_file_name)
+    if entry != None:
+        print("Replacing previously ingested grid")
+        grid_writer.remove_grid_groups(hdf_file, entry['groups'])
+
+        #A grid ingested in shards leaves them behind, as the groups are now written to the S-111 file itself.
+        if 'shards' in entry['parameters'] and not entry['parameters'].get('consolidate', False):
+            remove_numbered_files(get_shard_file_name, hdf_file.filename, 0, entry['parameters']['shards'])
+
+    #Open the grid file.
+    with netCDF4.Dataset(grid_file_name, "r", format="NETCDF4") as grid_file:
+
+        #Grab the data that we need.
+        times = grid_file.variables['Times']
+        latc = grid_file.variables['latc']
+        lonc = grid_file.variables['lonc']
+        ua = grid_file.variables['ua']
+        va = grid_file.variables['va']
+
+        numberOfTimes, numberOfLat = grid_writer.verify_grid_variables(times, latc, lonc, ua, va)
+
+        print("Adding irregular grid dataset")
+        print("Number of timestamps in source file:", numberOfTimes)
+        print("Number of records for each timestamp:", numberOfLat)
+
+        #Stream the values in slabs of times and nodes that fit in the memory budget. (Two slabs are in memory when pipelined)
+        slabBudget = memory_budget // pipeline.DOUBLE_BUFFERED if pipelined else memory_budget
+        timeSlab, nodeSlab = grid_writer.plan_slabs(numberOfTimes, numberOfLat, slabBudget)
+        print("Converting", timeSlab, "timestamps by", nodeSlab, "records at a time")
+
+        #Add the 'Group XY' to store the position information.
+        minX, minY, maxX, maxY = grid_writer.create_xy_datasets(hdf_file, latc, lonc, nodeSlab)
+
+        #Add the (empty) overview levels, they are filled in with the groups.
+        overviews = None
+        if overview_factors != None:
+            latitudes = latc[:]
+            longitudes = lonc[:]
+            levels = grid_pyramid.compute_overview_levels(latitudes, longitudes, overview_factors, cache)
+            levelGroups = grid_pyramid.create_overview_groups(hdf_file, levels, latitudes, longitudes)
+            overviews = [(levelGroup, level['nodes']) for levelGroup, level in zip(levelGroups, levels)]
+
+        #Add all of the groups
+        minTime, maxTime, interval, minSpeed, maxSpeed = grid_writer.create_grid_groups(hdf_file, times, ua, va,
+                                                                                        timeSlab, nodeSlab, overviews, pipelined)
+
+        #Update the s-111 file's metadata
+        update_metadata(hdf_file, numberOfTimes, numberOfLat,
+                        minTime, maxTime, interval, minX, minY, maxX, maxY,
+                        minSpeed, maxSpeed)
+
+        print("Dataset successfully added")
+
+    #Flush the edits out before recording the input, so the manifest never gets ahead of the file.
+    hdf_file.flush()
+
+    groupNames = ['Group XY'] + ['Group ' + str(index + 1) for index in range(0, numberOfTimes)]
+    if overview_factors != None:
+        groupNames.append(grid_pyramid.OVERVIEWS_GROUP)
+    manifest.record(grid_file_name, content_hash, parameters, groupNames)
+    manifest.save()
+
+    return True
+
+
+#******************************************************************************        
+def remove_numbered_files(get_file_name, hdf_file_name, first_index, previous_count=0):
+    """Remove the numbered files (shards or tiles) a previous run wrote beyond the ones being written now.
+
+    :param get_file_name: The function retrieving the name of a numbered file, from the S-111 file name and the zero based index.
+    :param hdf_file_name: The name of the S-111 file the numbered files belong to.
+    :param first_index: The zero based index of the first file to remove.
+    :param previous_count: The number of files the previous run wrote, if known. (Files beyond it are removed until one is missing)
+    """
+
+    index = first_index
+    while True:
+        file_name = get_file_name(hdf_file_name, index)
+
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        elif index >= previous_count:
+            break
+
+        index += 1
+
+
+#******************************************************************************        
+def get_tile_file_name(template_file_name, tile_index):
+    """Retrieve the name of the S-111 file for a tile.
+
+    :param template_file_name: The name of the S-111 file used as the template for the tiles.
+    :param tile_index: The zero based index of the tile.
+    :returns: The name of the tile file.
+    """
+
+    filename, file_extension = os.path.splitext(template_file_name)
+    return filename + '_tile' + str(tile_index + 1) + '.h5'
+
+
+#******************************************************************************        
+def write_tile(template_file_name, grid_file_name, tile_file_name, tile, memory_budget):
+    """Write the nodes of one tile into their own S-111 file. (Runs in a worker process)
+
+    :param template_file_name: The S-111 file containing the metadata to be used for the tile.
+    :param grid_file_name: The netcdf file containing the irregular grid data.
+    :param tile_file_name: The name of the S-111 file to be created for the tile.
+    :param tile: The tile, a dictionary with the 'bounds' of the tile and the 'nodes' it contains.
+    :param memory_budget: The memory budget (in bytes) for converting the tile's values.
+    :returns: A dictionary describing the tile for the tile index.
+    """
+
+    nodes = tile['nodes']
+    numberOfNodes = nodes.shape[0]
+
+    #Start from a copy of the template, so the tile carries the same metadata.
+    shutil.copyfile(template_file_name, tile_file_name)
+
+    with h5py.File(tile_file_name, "r+") as hdf_file:
+
+        with netCDF4.Dataset(grid_file_name, "r", format="NETCDF4") as grid_file:
 
-    #Update the temporal extents in the metadata.
-    strVal = minTime.strftime("%Y%m%dT%H%M%SZ")
-    hdf_file.attrs.create('dateTimeOfFirstRecord', strVal.encode())
-    strVal = maxTime.strftime("%Y%m%dT%H%M%SZ")
-    hdf_file.attrs.create('dateTimeOfLastRecord', strVal.encode())
+            times = grid_file.variables['Times']
+            latitudes = numpy.asarray(grid_file.variables['latc'][:])[nodes]
+            longitudes = numpy.asarray(grid_file.variables['lonc'][:])[nodes]
+
+            numberOfTimes = times.shape[0]
+            timeSlab, nodeSlab = grid_writer.plan_slabs(numberOfTimes, numberOfNodes, memory_budget)
 
-    #Update the geo coverage in the metadata. (These are not set anymore... since 1.09)
-    #hdf_file.attrs.create('westBoundLongitude', minX, dtype=numpy.float64)
-    #hdf_file.attrs.create('eastBoundLongitude', maxX, dtype=numpy.float64)
-    #hdf_file.attrs.create('southBoundLatitude', minY, dtype=numpy.float64)
-    #hdf_file.attrs.create('northBoundLatitude', maxY, dtype=numpy.float64)
+            ua = grid_tiling.NodeSubset(grid_file.variables['ua'], nodes, nodeSlab)
+            va = grid_tiling.NodeSubset(grid_file.variables['va'], nodes, nodeSlab)
 
-    #Update the surface speed values.
-    if 'minSurfCurrentSpeed' in hdf_file.attrs:
-        minSpeed = min(minSpeed, hdf_file.attrs['minSurfCurrentSpeed'])
+            minX, minY, maxX, maxY = grid_writer.create_xy_datasets(hdf_file, latitudes, longitudes, nodeSlab)
+            minTime, maxTime, interval, minSpeed, maxSpeed = grid_writer.create_grid_groups(hdf_file, times, ua, va,
+                                                                                            timeSlab, nodeSlab)
+
+            update_metadata(hdf_file, numberOfTimes, numberOfNodes,
+                            minTime, maxTime, interval, minX, minY, maxX, maxY,
+                            minSpeed, maxSpeed)
 
-    if 'maxSurfCurrentSpeed' in hdf_file.attrs:
-        maxSpeed = max(maxSpeed, hdf_file.attrs['maxSurfCurrentSpeed'])
+    west, south, east, north = tile['bounds']
 
-    hdf_file.attrs.create('minSurfCurrentSpeed', minSpeed)
-    hdf_file.attrs.create('maxSurfCurrentSpeed', maxSpeed)
+    return {'fileName': os.path.basename(tile_file_name),
+            'numberOfNodes': int(numberOfNodes),
+            'tileWestLongitude': west,
+            'tileSouthLatitude': south,
+            'tileEastLongitude': east,
+            'tileNorthLatitude': north,
+            'westBoundLongitude': float(minX),
+            'southBoundLatitude': float(minY),
+            'eastBoundLongitude': float(maxX),
+            'northBoundLatitude': float(maxY),
+            'minSurfCurrentSpeed': float(minSpeed),
+            'maxSurfCurrentSpeed': float(maxSpeed)}
+
+
+#******************************************************************************        
+def add_tiled_grid(template_file_name, grid_file_name, tiles, workers, memory_budget):
+    """Write each tile of the grid into its own S-111 file, in parallel, and create the tile index.
+
+    :param template_file_name: The S-111 file containing the metadata to be used for the tiles.
+    :param grid_file_name: The netcdf file containing the irregular grid data.
+    :param tiles: The list of tiles, each a dictionary with the 'bounds' of the tile and the 'nodes' it contains.
+    :param workers: The number of worker processes.
+    :param memory_budget: The memory budget (in bytes) shared by all of the workers.
+    :returns: The list of tile file names created.
+    """
+
+    #The tiles are copies of the template, so it must not contain any data yet.
+    with h5py.File(template_file_name, "r") as hdf_file:
+        if len(hdf_file) > 0:
+            raise Exception('The specified S-111 file already contains data and cannot be used as a tile template.')
+
+    print("Writing", len(tiles), "tiles using", workers, "worker processes")
+
+    #Remove the tiles of a previous run which are not written again, so they are not mistaken for part of this grid.
+    filename, file_extension = os.path.splitext(template_file_name)
+    indexFileName = filename + '_tiles.json'
+
+    previousTiles = 0
+    if os.path.exists(indexFileName):
+        with open(indexFileName, 'r') as index_file:
+            previousTiles = len(json.load(index_file).get('tiles', []))
+
+    remove_numbered_files(get_tile_file_name, template_file_name, len(tiles), previousTiles)
+
+    workerBudget = memory_budget // workers
+    tileFileNames = [get_tile_file_name(template_file_name, index) for index in range(0, len(tiles))]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_tile, template_file_name, grid_file_name, tileFileName, tile, workerBudget)
+                   for tileFileName, tile in zip(tileFileNames, tiles)]
+
+        tileEntries = [future.result() for future in futures]
+
+    #Write the tile index, so clients can find the tiles covering their area.
+    with open(indexFileName, 'w') as index_file:
+        json.dump({'gridFile': os.path.basename(grid_file_name), 'tiles': tileEntries}, index_file, indent=2)
+
+    print("Created tile index", indexFileName)
+
+    return tileFileNames
+
+
+#******************************************************************************
+def update_grid_file(hdf_file, manifest, grid_file_name, memory_budget, force=False):
+    """Update the S-111 file from an irregular grid file, only writing the time groups whose values changed.
+
+    The time groups are matched by their times, so the grid file can be the next
+    forecast cycle of the one ingested before. If the file does not hold the same
+    nodes, then every group is replaced.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param grid_file_name: The netcdf file containing the irregular grid data.
+    :param memory_budget: The memory budget (in bytes) for converting the grid values.
+    :param force: True to update from the grid even if it is unchanged.
+    :returns: True if the grid was ingested, false if it was skipped.
+    """
+
+    parameters = {'tool': 's111_add_irregular_grid'}
+
+    #Skip the grid if it has already been ingested unchanged.
+    content_hash = manifest.hash_input(grid_file_name)
+    if not force and manifest.is_current(grid_file_name, content_hash, parameters):
+        print("Skipping", grid_file_name, "(already ingested, unchanged)")
+        return False
+
+    if grid_pyramid.OVERVIEWS_GROUP in hdf_file:
+        raise Exception('The overview levels cannot be updated, add the grid without --update.')
+
+    #Only an irregular grid (or an empty file) may be replaced, never the stations or regular grid of another file.
+    hasData = 'Group XY' in hdf_file or len(group_statistics.get_data_group_names(hdf_file)) > 0
+    if hasData and hdf_file.attrs.get('dataCodingFormat') != 3:
+        raise Exception('The specified S-111 file does not contain irregular grid data, it cannot be updated from a grid.')
+
+    with netCDF4.Dataset(grid_file_name, "r", format="NETCDF4") as grid_file:
+
+        times = grid_file.variables['Times']
+        latc = grid_file.variables['latc']
+        lonc = grid_file.variables['lonc']
+        ua = grid_file.variables['ua']
+        va = grid_file.variables['va']
+
+        numberOfTimes, numberOfLat = grid_writer.verify_grid_variables(times, latc, lonc, ua, va)
+        timeSlab, nodeSlab = grid_writer.plan_slabs(numberOfTimes, numberOfLat, memory_budget)
+
+        #With different nodes every value changes, so the grid is simply replaced.
+        sameNodes = grid_writer.has_same_nodes(hdf_file, latc, lonc, nodeSlab)
+
+    #The grid now comes from this input, whichever grid was ingested before.
+    for key in list(manifest.entries):
+        if key != manifest.get_key(grid_file_name) and 'Group XY' in manifest.entries[key]['groups']:
+            manifest.remove(key)
+
+    if not sameNodes:
+        print("The grid nodes changed, replacing every group")
+        grid_writer.remove_grid_groups(hdf_file, ['Group XY'] + group_statistics.get_data_group_names(hdf_file))
+        manifest.remove(grid_file_name)
+        return add_grid_file(hdf_file, manifest, grid_file_name, memory_budget, force=True)
+
+    with netCDF4.Dataset(grid_file_name, "r", format="NETCDF4") as grid_file:
+
+        times = grid_file.variables['Times']
+        ua = grid_file.variables['ua']
+        va = grid_file.variables['va']
+
+        print("Updating irregular grid dataset")
+        print("Number of timestamps in source file:", numberOfTimes)
+        print("Number of records for each timestamp:", numberOfLat)
+
+        minTime, maxTime, interval, minSpeed, maxSpeed, written = grid_writer.update_grid_groups(hdf_file, times, ua, va, timeSlab, nodeSlab)
+
+        #The extents are recomputed from the new values, not merged with the old ones.
+        for attribute_name in ['minSurfCurrentSpeed', 'maxSurfCurrentSpeed']:
+            if attribute_name in hdf_file.attrs:
+                del hdf_file.attrs[attribute_name]
+
+        xy_group = hdf_file['Group XY']
+        update_metadata(hdf_file, numberOfTimes, numberOfLat,
+                        minTime, maxTime, interval, xy_group['X'][0].min(), xy_group['Y'][0].min(), xy_group['X'][0].max(), xy_group['Y'][0].max(),
+                        minSpeed, maxSpeed)
+
+        print("Wrote", written, "of", numberOfTimes, "groups,", numberOfTimes - written, "unchanged")
+
+    #Flush the edits out before recording the input, so the manifest never gets ahead of the file.
+    hdf_file.flush()
+
+    groupNames = ['Group XY'] + ['Group ' + str(index + 1) for index in range(0, numberOfTimes)]
+    manifest.record(grid_file_name, content_hash, parameters, groupNames)
+    manifest.save()
+
+    return True
+
+
+#******************************************************************************        
+def get_shard_file_name(hdf_file_name, shard_index):
+    """Retrieve the name of the file holding a shard of the time groups.
+
+    :param hdf_file_name: The name of the master S-111 file.
+    :param shard_index: The zero based index of the shard.
+    :returns: The name of the shard file.
+    """
+
+    filename, file_extension = os.path.splitext(hdf_file_name)
+    return filename + '_shard' + str(shard_index + 1) + '.h5'
+
+
+#******************************************************************************        
+def write_shard(grid_file_name, shard_file_name, time_range, memory_budget):
+    """Write a range of the time groups into their own shard file. (Runs in a worker process)
+
+    :param grid_file_name: The netcdf file containing the irregular grid data.
+    :param shard_file_name: The name of the shard file to be created.
+    :param time_range: The (first, end) time indices of the groups in the shard.
+    :param memory_budget: The memory budget (in bytes) for converting the shard's values.
+    :returns: A tuple containing the minimum and maximum speed of the shard.
+    """
+
+    firstGroup, endGroup = time_range
+
+    with h5py.File(shard_file_name, "w") as hdf_file:
+
+        with netCDF4.Dataset(grid_file_name, "r", format="NETCDF4") as grid_file:
+
+            times = grid_file.variables['Times']
+            ua = grid_file.variables['ua']
+            va = grid_file.variables['va']
+
+            timeSlab, nodeSlab = grid_writer.plan_slabs(endGroup - firstGroup, ua.shape[1], memory_budget)
+
+            minTime, maxTime, interval, minSpeed, maxSpeed = grid_writer.create_grid_groups(hdf_file, times, ua, va,
+                                                                                            timeSlab, nodeSlab,
+                                                                                            time_range=time_range)
+
+    return (minSpeed, maxSpeed)
+
+
+#******************************************************************************        
+def consolidate_shards(hdf_file, shard_file_names):
+    """Copy the groups of the shard files into the master file, replacing the links, and remove the shards.
+
+    The groups are copied as stored, so their values are not decoded and encoded again.
+
+    :param hdf_file: The master S-111 HDF file.
+    :param shard_file_names: The list of shard file names.
+    """
+
+    for shard_file_name in shard_file_names:
+        with h5py.File(shard_file_name, "r") as shard_file:
+            for groupName in shard_file:
+                del hdf_file[groupName]
+                shard_file.copy(shard_file[groupName], hdf_file, groupName)
+
+        os.remove(shard_file_name)
+
+    print("Consolidated", len(shard_file_names), "shards")
+
+
+#******************************************************************************        
+def add_sharded_grid(hdf_file, manifest, grid_file_name, shards, workers, memory_budget, consolidate=False, force=False):
+    """Add an irregular grid file to the S-111 file, with worker processes writing the time groups into shard files.
+
+    The S-111 file gets the positions, the metadata, and an external link to each time
+    group in its shard. (Unless the shards are consolidated into it)
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param grid_file_name: The netcdf file containing the irregular grid data.
+    :param shards: The number of shard files.
+    :param workers: The number of worker processes.
+    :param memory_budget: The memory budget (in bytes) shared by all of the workers.
+    :param consolidate: True to copy the shards into the S-111 file once they are written.
+    :param force: True to ingest the grid even if it is unchanged.
+    :returns: True if the grid was ingested, false if it was skipped.
+    """
+
+    parameters = {'tool': 's111_add_irregular_grid', 'shards': shards, 'consolidate': consolidate}
+
+    #Skip the grid if it has already been ingested unchanged.
+    content_hash = manifest.hash_input(grid_file_name)
+    if not force and manifest.is_current(grid_file_name, content_hash, parameters):
+        print("Skipping", grid_file_name, "(already ingested, unchanged)")
+        return False
+
+    #If this grid was ingested before, then remove it so it can be replaced.
+    entry = manifest.get_entry(grid_file_name)
+    if entry != None:
+        print("Replacing previously ingested grid")
+        grid_writer.remove_grid_groups(hdf_file, entry['groups'])
+
+    with netCDF4.Dataset(grid_file_name, "r", format="NETCDF4") as grid_file:
+
+        times = grid_file.variables['Times']
+        latc = grid_file.variables['latc']
+        lonc = grid_file.variables['lonc']
+
+        numberOfTimes, numberOfNodes = grid_writer.verify_grid_variables(times, latc, lonc, grid_file.variables['ua'], grid_file.variables['va'])
+
+        print("Adding irregular grid dataset in", shards, "shards using", workers, "worker processes")
+        print("Number of timestamps in source file:", numberOfTimes)
+        print("Number of records for each timestamp:", numberOfNodes)
+
+        #The master file holds the positions.
+        timeSlab, nodeSlab = grid_writer.plan_slabs(1, numberOfNodes, memory_budget)
+        minX, minY, maxX, maxY = grid_writer.create_xy_datasets(hdf_file, latc, lonc, nodeSlab)
+
+        timeValues = [grid_writer.parse_grid_time(times[index]) for index in range(0, numberOfTimes)]
+
+    #Split the time groups into contiguous ranges, one per shard.
+    shards = max(1, min(shards, numberOfTimes))
+    boundaries = [numberOfTimes * index // shards for index in range(0, shards + 1)]
+    timeRanges = list(zip(boundaries[:-1], boundaries[1:]))
+    shardFileNames = [get_shard_file_name(hdf_file.filename, index) for index in range(0, shards)]
+
+    #Remove the shards of a previous ingest which are not written again. (Those that are, are overwritten)
+    previousShards = 0
+    if entry != None and not entry['parameters'].get('consolidate', False):
+        previousShards = entry['parameters'].get('shards', 0)
+    remove_numbered_files(get_shard_file_name, hdf_file.filename, shards, previousShards)
+
+    workerBudget = memory_budget // workers
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_shard, grid_file_name, shardFileName, timeRange, workerBudget)
+                   for shardFileName, timeRange in zip(shardFileNames, timeRanges)]
+
+        speeds = [future.result() for future in futures]
+
+    #Link each time group to its shard. (Relative to the master file, so they can be moved together)
+    for shardFileName, (firstGroup, endGroup) in zip(shardFileNames, timeRanges):
+        for index in range(firstGroup, endGroup):
+            groupName = 'Group ' + str(index + 1)
+            hdf_file[groupName] = h5py.ExternalLink(os.path.basename(shardFileName), '/' + groupName)
+
+    interval = None
+    if numberOfTimes > 1:
+        interval = timeValues[1] - timeValues[0]
+
+    update_metadata(hdf_file, numberOfTimes, numberOfNodes,
+                    min(timeValues), max(timeValues), interval, minX, minY, maxX, maxY,
+                    min(speed[0] for speed in speeds), max(speed[1] for speed in speeds))
+
+    if consolidate:
+        consolidate_shards(hdf_file, shardFileNames)
+
+    print("Dataset successfully added")
+
+    #Flush the edits out before recording the input, so the manifest never gets ahead of the file.
+    hdf_file.flush()
+
+    groupNames = ['Group XY'] + ['Group ' + str(index + 1) for index in range(0, numberOfTimes)]
+    manifest.record(grid_file_name, content_hash, parameters, groupNames)
+    manifest.save()
+
+    return True
 
 
 #******************************************************************************        
@@ -240,75 +702,99 @@ def create_command_line():
     parser = argparse.ArgumentParser(description='Add S-111 irregular grid Dataset')
 
     parser.add_argument('-g', '--grid-file', help='The netcdf file containing the irregular grid data.', required=True)
+    parser.add_argument('-f', '--force', help='Ingest the grid even if it has already been ingested unchanged.', action='store_true')
+    parser.add_argument('-m', '--memory-budget', help='The memory (in megabytes) available for converting the grid values. (default: 256)', type=float, default=256.0)
+    parser.add_argument('-p', '--pipeline', help='Convert the next slab of values in a background thread while the current one is written.', action='store_true')
+    parser.add_argument('-u', '--update', help='Match the time groups already in inOutFile by time (e.g. from the previous forecast cycle), only writing those whose values changed.', action='store_true')
+    parser.add_argument('--overviews', help='Also write an overview level thinned by this factor. (Repeat to add several levels, e.g. --overviews 4 --overviews 16)', type=int, action='append')
+    parser.add_argument('--shards', help='Write the time groups into this many shard files in parallel, linked from inOutFile.', type=int)
+    parser.add_argument('--consolidate', help='Copy the shards into inOutFile once they are written, and remove them.', action='store_true')
+    parser.add_argument('--tile-mode', help='Write the grid as one S-111 file per tile, using the given inOutFile as the metadata template.', choices=['grid', 'quadtree'])
+    parser.add_argument('--tile-rows', help='The number of tile rows in grid tile mode. (default: 2)', type=int, default=2)
+    parser.add_argument('--tile-columns', help='The number of tile columns in grid tile mode. (default: 2)', type=int, default=2)
+    parser.add_argument('--tile-max-nodes', help='The maximum number of nodes per tile in quadtree tile mode. (default: 100000)', type=int, default=100000)
+    parser.add_argument('--cache-dir', help='The directory caching mesh-derived data between runs. (default: $S111_MESH_CACHE, none if unset)')
+    parser.add_argument('--cache-size', help='The maximum size (in megabytes) of the mesh cache. (default: 1024)', type=float, default=1024.0)
+    parser.add_argument('-w', '--workers', help='The number of worker processes used in tile and shard mode. (default: number of CPUs)', type=int, default=os.cpu_count())
     parser.add_argument("inOutFile", nargs=1)
 
     return parser
 
 
 #******************************************************************************        
-def main():
+def main(args=None):
 
     #Create the command line parser.
     parser = create_command_line()
 
     #Parse the command line.
-    results = parser.parse_args()
+    results = parser.parse_args(args)
     
-    #open the HDF5 file.
-    with h5py.File(results.inOutFile[0], "r+") as hdf_file:
+    memoryBudget = int(results.memory_budget * 1024 * 1024)
 
-        #Open the grid file.
+    if results.shards != None and results.tile_mode != None:
+        parser.error('--shards cannot be used in tile mode.')
+
+    if results.update and (results.shards != None or results.tile_mode != None or results.overviews != None):
+        parser.error('--update cannot be used with --shards, --tile-mode or --overviews.')
+
+    #The tile settings change the output, so they are part of the ingest parameters.
+    tileParameters = None
+    if results.tile_mode == 'grid':
+        tileParameters = {'tileMode': 'grid', 'tileRows': results.tile_rows, 'tileColumns': results.tile_columns}
+    elif results.tile_mode == 'quadtree':
+        tileParameters = {'tileMode': 'quadtree', 'tileMaxNodes': results.tile_max_nodes}
+
+    #Load the record of what has already been ingested into this file.
+    manifest = ingest_manifest.IngestManifest(results.inOutFile[0])
+
+    if results.tile_mode != None:
+
+        parameters = {'tool': 's111_add_irregular_grid'}
+        parameters.update(tileParameters)
+
+        #Skip the grid if it has already been ingested unchanged.
+        content_hash = manifest.hash_input(results.grid_file)
+        if not results.force and manifest.is_current(results.grid_file, content_hash, parameters):
+            print("Skipping", results.grid_file, "(already ingested, unchanged)")
+            return
+
+        #Partition the nodes into tiles.
         with netCDF4.Dataset(results.grid_file, "r", format="NETCDF4") as grid_file:
 
-            #Grab the data that we need.
-            times = grid_file.variables['Times']
-            latc = grid_file.variables['latc']
-            lonc = grid_file.variables['lonc']
-            ua = grid_file.variables['ua']
-            va = grid_file.variables['va']
+            variables = grid_file.variables
+            grid_writer.verify_grid_variables(variables['Times'], variables['latc'], variables['lonc'], variables['ua'], variables['va'])
 
-            #Verify that these arrays are the same size.
-            numberOfTimes = times.shape[0]
-            numberOfVaSeries = va.shape[0]
-            numberOfUaSeries = ua.shape[0]
-            if numberOfTimes != numberOfVaSeries or numberOfTimes != numberOfUaSeries:
-                raise Exception('The number of time values does not match the number of speed and distance values.')
-
-            #Verify that these arrays are the same size.
-            numberOfLat = latc.shape[0]
-            numberOfLon = lonc.shape[0]
-            numberOfVaValues = va.shape[1]
-            numberOfUaValues = ua.shape[1]
-            if numberOfLat != numberOfLon:
-                raise Exception('The input latitude and longitude array are different sizes.')
-            elif numberOfLat != numberOfVaValues or numberOfLat != numberOfUaValues:
-                raise Exception('The number of positions does not match the number of speed and distance values.')
-
-            #Verify that the input data is in the correct units.
-            vaUnits = va.getncattr('units')
-            uaUnits = ua.getncattr('units')
-            if vaUnits != uaUnits and vaUnits != 'metres s-1':
-                raise Exception('The input velocity data is stored in an unsupported unit.')
-
-            print("Adding irregular grid dataset")
-            print("Number of timestamps in source file:", numberOfTimes)
-            print("Number of records for each timestamp:", numberOfLat)
-
-            #Add the 'Group XY' to store the position information.
-            minX, minY, maxX, maxY = create_xy_group(hdf_file, latc, lonc)
-    
-            #Add all of the groups
-            minTime, maxTime, interval, minSpeed, maxSpeed = create_data_groups(hdf_file, times, ua, va)
+            latitudes = numpy.asarray(variables['latc'][:], dtype=numpy.float64)
+            longitudes = numpy.asarray(variables['lonc'][:], dtype=numpy.float64)
 
-            #Update the s-111 file's metadata
-            update_metadata(hdf_file, numberOfTimes, numberOfVaValues,
-                            minTime, maxTime, interval, minX, minY, maxX, maxY,
-                            minSpeed, maxSpeed)
+        cache = mesh_cache.open_mesh_cache(results.cache_dir, results.cache_size)
+        tiles = grid_tiling.get_tiles(latitudes, longitudes, tileParameters, cache)
+
+        #The tile files take the place of the groups in the manifest.
+        groupNames = add_tiled_grid(results.inOutFile[0], results.grid_file, tiles, max(1, results.workers), memoryBudget)
+        manifest.record(results.grid_file, content_hash, parameters, groupNames)
+        manifest.save()
+
+        return
+
+    #open the HDF5 file.
+    with h5py.File(results.inOutFile[0], "r+") as hdf_file:
+
+        if results.shards != None:
+            if results.overviews != None:
+                raise Exception('Overviews cannot be written in shard mode.')
+
+            add_sharded_grid(hdf_file, manifest, results.grid_file, results.shards, max(1, results.workers), memoryBudget,
+                             results.consolidate, results.force)
+            return
 
-            print("Dataset successfully added")
+        if results.update:
+            update_grid_file(hdf_file, manifest, results.grid_file, memoryBudget, results.force)
+            return
 
-        #Flush any edits out.
-        hdf_file.flush()
+        cache = mesh_cache.open_mesh_cache(results.cache_dir, results.cache_size)
+        add_grid_file(hdf_file, manifest, results.grid_file, memoryBudget, results.overviews, cache, results.force, results.pipeline)
 
 
 if __name__ == "__main__":
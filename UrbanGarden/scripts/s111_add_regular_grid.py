@@ -0,0 +1,223 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import h5py
+import numpy
+import netCDF4
+from chs_s111 import grid_resampler
+from chs_s111 import grid_writer
+from chs_s111 import ingest_manifest
+from chs_s111 import mesh_cache
+
+#******************************************************************************
+def get_grid_definition(hdf_file, origin, spacing, size):
+    """Retrieve the regular grid definition, from the command line or the S-111 file's metadata.
+
+    :param hdf_file: The S-111 HDF file.
+    :param origin: The grid origin (longitude, latitude) from the command line, or None.
+    :param spacing: The grid spacing (longitudinal, latitudinal) from the command line, or None.
+    :param size: The number of grid points (longitudinal, latitudinal) from the command line, or None.
+    :returns: The RegularGrid.
+    """
+
+    values = dict()
+    for names, given in [(('gridOriginLongitude', 'gridOriginLatitude'), origin),
+                         (('gridSpacingLongitudinal', 'gridSpacingLatitudinal'), spacing),
+                         (('numPointsLongitudinal', 'numPointsLatitudinal'), size)]:
+
+        for index, name in enumerate(names):
+            if given != None:
+                values[name] = given[index]
+            elif name in hdf_file.attrs:
+                values[name] = hdf_file.attrs[name]
+            else:
+                raise Exception('The regular grid ' + name + ' was not specified on the command line or in the metadata.')
+
+    return grid_resampler.RegularGrid(values['gridOriginLongitude'], values['gridOriginLatitude'],
+                                      values['gridSpacingLongitudinal'], values['gridSpacingLatitudinal'],
+                                      values['numPointsLongitudinal'], values['numPointsLatitudinal'])
+
+
+#******************************************************************************
+def update_metadata(hdf_file, grid, numberOfTimes, minTime, maxTime, interval, minSpeed, maxSpeed):
+    """Update the S-111 file's metadata.
+
+    :param hdf_file: The S-111 HDF file.
+    :param grid: The RegularGrid the data was resampled onto.
+    :param numberOfTimes: The number of times in the source data.
+    :param minTime: The minimum temporal extents of the source data.
+    :param maxTime: The maximum temporal extents of the source data.
+    :param interval: The time interval between records of the source data.
+    :param minSpeed: The minimum surface speed of the resampled data.
+    :param maxSpeed: The maximum surface speed of the resampled data.
+    """
+
+    #Set the correct coding format.
+    hdf_file.attrs.create('dataCodingFormat', 2, dtype=numpy.int64)
+
+    #Set the number of times.
+    hdf_file.attrs.create('numberOfTimes', numberOfTimes, dtype=numpy.int64)
+
+    #Set the grid definition.
+    hdf_file.attrs.create('gridOriginLongitude', grid.origin_longitude, dtype=numpy.float64)
+    hdf_file.attrs.create('gridOriginLatitude', grid.origin_latitude, dtype=numpy.float64)
+    hdf_file.attrs.create('gridSpacingLongitudinal', grid.spacing_longitudinal, dtype=numpy.float64)
+    hdf_file.attrs.create('gridSpacingLatitudinal', grid.spacing_latitudinal, dtype=numpy.float64)
+    hdf_file.attrs.create('numPointsLongitudinal', grid.num_points_longitudinal, dtype=numpy.int64)
+    hdf_file.attrs.create('numPointsLatitudinal', grid.num_points_latitudinal, dtype=numpy.int64)
+
+    #Set the time interval (if we have one)
+    if interval != None:
+        intervalInSeconds = interval.total_seconds()
+        hdf_file.attrs.create('timeRecordInterval', intervalInSeconds, dtype=numpy.int64)
+
+    #Update the temporal extents in the metadata.
+    strVal = minTime.strftime("%Y%m%dT%H%M%SZ")
+    hdf_file.attrs.create('dateTimeOfFirstRecord', strVal.encode())
+    strVal = maxTime.strftime("%Y%m%dT%H%M%SZ")
+    hdf_file.attrs.create('dateTimeOfLastRecord', strVal.encode())
+
+    #Update the surface speed values. (There are none if the whole grid is land)
+    if minSpeed == None:
+        return
+
+    if 'minSurfCurrentSpeed' in hdf_file.attrs:
+        minSpeed = min(minSpeed, hdf_file.attrs['minSurfCurrentSpeed'])
+
+    if 'maxSurfCurrentSpeed' in hdf_file.attrs:
+        maxSpeed = max(maxSpeed, hdf_file.attrs['maxSurfCurrentSpeed'])
+
+    hdf_file.attrs.create('minSurfCurrentSpeed', minSpeed)
+    hdf_file.attrs.create('maxSurfCurrentSpeed', maxSpeed)
+
+
+#******************************************************************************
+def create_command_line():
+    """Create and initialize the command line parser.
+
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Add S-111 regular grid dataset, resampled from an irregular grid')
+
+    parser.add_argument('-g', '--grid-file', help='The netcdf file containing the irregular grid data.', required=True)
+    parser.add_argument('-f', '--force', help='Ingest the grid even if it has already been ingested unchanged.', action='store_true')
+    parser.add_argument('-m', '--memory-budget', help='The memory (in megabytes) available for resampling the grid values. (default: 256)', type=float, default=256.0)
+    parser.add_argument('--grid-origin', help='The longitude and latitude of the grid origin. (default: from the metadata)', type=float, nargs=2)
+    parser.add_argument('--grid-spacing', help='The longitudinal and latitudinal grid spacing. (default: from the metadata)', type=float, nargs=2)
+    parser.add_argument('--grid-size', help='The number of longitudinal and latitudinal grid points. (default: from the metadata)', type=int, nargs=2)
+    parser.add_argument('--max-edge-length', help='Treat source triangles with a longer edge (in degrees) as land.', type=float)
+    parser.add_argument('--cache-dir', help='The directory caching mesh-derived data between runs. (default: $S111_MESH_CACHE, none if unset)')
+    parser.add_argument('--cache-size', help='The maximum size (in megabytes) of the mesh cache. (default: 1024)', type=float, default=1024.0)
+    parser.add_argument("inOutFile", nargs=1)
+
+    return parser
+
+
+#******************************************************************************
+def add_regular_grid_file(hdf_file, manifest, grid_file_name, grid, memory_budget, max_edge_length=None, cache=None, force=False):
+    """Resample an irregular grid file onto a regular grid and add it to the S-111 file, skipping it if it has already been ingested.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param grid_file_name: The netcdf file containing the irregular grid data.
+    :param grid: The RegularGrid to resample onto.
+    :param memory_budget: The memory (in bytes) available for resampling the grid values.
+    :param max_edge_length: Treat source triangles with a longer edge (in degrees) as land, None to keep them all.
+    :param cache: The MeshCache to use, None to always compute the resampling weights.
+    :param force: True to ingest the grid even if it is unchanged.
+    :returns: True if the grid was ingested, false if it was skipped.
+    """
+
+    if 'gridLandMaskValue' in hdf_file.attrs:
+        landMaskValue = hdf_file.attrs['gridLandMaskValue']
+    else:
+        raise Exception('The gridLandMaskValue was not specified in the metadata.')
+
+    #The grid definition changes the output, so it is part of the ingest parameters.
+    parameters = {'tool': 's111_add_regular_grid',
+                  'grid': [grid.origin_longitude, grid.origin_latitude, grid.spacing_longitudinal, grid.spacing_latitudinal,
+                           grid.num_points_longitudinal, grid.num_points_latitudinal],
+                  'maxEdgeLength': max_edge_length}
+
+    #Skip the grid if it has already been ingested unchanged.
+    content_hash = manifest.hash_input(grid_file_name)
+    if not force and manifest.is_current(grid_file_name, content_hash, parameters):
+        print("Skipping", grid_file_name, "(already ingested, unchanged)")
+        return False
+
+    #If this grid was ingested before, then remove it so it can be replaced.
+    entry = manifest.get_entry(grid_file_name)
+    if entry != None:
+        print("Replacing previously ingested grid")
+        grid_writer.remove_grid_groups(hdf_file, entry['groups'])
+
+    #Open the grid file.
+    with netCDF4.Dataset(grid_file_name, "r", format="NETCDF4") as grid_file:
+
+        #Grab the data that we need.
+        times = grid_file.variables['Times']
+        latc = grid_file.variables['latc']
+        lonc = grid_file.variables['lonc']
+        ua = grid_file.variables['ua']
+        va = grid_file.variables['va']
+
+        numberOfTimes, numberOfNodes = grid_writer.verify_grid_variables(times, latc, lonc, ua, va)
+
+        print("Adding regular grid dataset")
+        print("Number of timestamps in source file:", numberOfTimes)
+        print("Number of source nodes:", numberOfNodes)
+        print("Regular grid size:", grid.num_points_longitudinal, "by", grid.num_points_latitudinal)
+
+        #Triangulate the source nodes once, every time step then reuses the weights. (As do later runs, through the cache)
+        weights, landMask = grid_resampler.get_resampling_weights(latc[:], lonc[:], grid, max_edge_length, cache)
+        resampler = grid_resampler.GridResampler(grid, weights, landMask)
+
+        numberOfPoints = landMask.shape[0]
+        timeSlab = grid_writer.plan_resample_slab(numberOfTimes, numberOfNodes, numberOfPoints, memory_budget)
+
+        #Add all of the groups
+        minTime, maxTime, interval, minSpeed, maxSpeed = grid_writer.create_regular_grid_groups(hdf_file, times, ua, va, resampler,
+                                                                                               landMaskValue, timeSlab)
+
+        #Update the s-111 file's metadata
+        update_metadata(hdf_file, grid, numberOfTimes, minTime, maxTime, interval, minSpeed, maxSpeed)
+
+        print("Dataset successfully added")
+
+    #Flush the edits out before recording the input, so the manifest never gets ahead of the file.
+    hdf_file.flush()
+
+    groupNames = ['Group ' + str(index + 1) for index in range(0, numberOfTimes)]
+    manifest.record(grid_file_name, content_hash, parameters, groupNames)
+    manifest.save()
+
+    return True
+
+
+#******************************************************************************
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    #open the HDF5 file.
+    with h5py.File(results.inOutFile[0], "r+") as hdf_file:
+
+        grid = get_grid_definition(hdf_file, results.grid_origin, results.grid_spacing, results.grid_size)
+
+        #Load the record of what has already been ingested into this file.
+        manifest = ingest_manifest.IngestManifest(results.inOutFile[0])
+
+        cache = mesh_cache.open_mesh_cache(results.cache_dir, results.cache_size)
+        memoryBudget = int(results.memory_budget * 1024 * 1024)
+
+        add_regular_grid_file(hdf_file, manifest, results.grid_file, grid, memoryBudget, results.max_edge_length, cache, results.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,19 @@
 #
 #******************************************************************************
 import argparse
-import sys
+import os
 import h5py
 import numpy
-import iso8601
-import pytz
 from chs_s111 import ascii_time_series
+from chs_s111 import group_hash
+from chs_s111 import ingest_manifest
+from chs_s111 import ingest_service
+from chs_s111 import memory_file
+from chs_s111 import metadata
+from chs_s111 import pipeline
+from chs_s111 import series_cache
+from chs_s111 import station_matrix
+from chs_s111 import station_writer
 
 ms2Knots = 1.943844
 
@@ -51,191 +58,383 @@ def update_area_coverage(hdf_file, latitude, longitude):
 
 
 #******************************************************************************
-def update_temporal_coverage(hdf_file, start_time, end_time):
-    """Update the temporal extents of the S-111 file.
+def add_series_group(hdf_file, time_file):
+    """Add a new timeseries group to the given S-111 HDF file.
     
     :param hdf_file: The S-111 HDF file.
-    :param start_time: The new start time.
-    :param time_file: The new end time.
+    :param time_file: The input ASCII file containing the timeseries data.
+    :returns: The newly created group.
     """
 
-    if 'dateTimeOfFirstRecord' in hdf_file.attrs:
-        dateTimeOfFirstRecord = iso8601.parse_date(hdf_file.attrs['dateTimeOfFirstRecord'].decode())
-        dateTimeOfFirstRecord = min(dateTimeOfFirstRecord, start_time)
-    else:
-        dateTimeOfFirstRecord = start_time
+    return station_writer.add_station_group(hdf_file, time_file.longitude, time_file.latitude,
+                                            time_file.start_time, time_file.end_time,
+                                            time_file.number_of_records, time_file.interval)
 
-    if 'dateTimeOfLastRecord' in hdf_file.attrs:
-        dateTimeOfLastRecord = iso8601.parse_date(hdf_file.attrs['dateTimeOfLastRecord'].decode())
-        dateTimeOfLastRecord = max(dateTimeOfLastRecord, end_time)
-    else:
-        dateTimeOfLastRecord = end_time
 
-    dateTimeOfFirstRecord = dateTimeOfFirstRecord.astimezone(pytz.utc)
-    strVal = dateTimeOfFirstRecord.strftime("%Y%m%dT%H%M%SZ")
-    hdf_file.attrs.create('dateTimeOfFirstRecord', strVal.encode())
+#******************************************************************************    
+def add_series_datasets(group, time_file):
+    """Add the timeseries data to the specified HDF group.
+    
+    :param group: The HDF group to add the speed and direction datasets to.
+    :param time_file: The input ASCII file containing the timeseries data.
+    :returns: A tuple containing the minimum and maximum speed values added.
+    """
+
+    min_speed = None
+    max_speed = None
 
-    dateTimeOfLastRecord = dateTimeOfLastRecord.astimezone(pytz.utc)
-    strVal = dateTimeOfLastRecord.strftime("%Y%m%dT%H%M%SZ")
-    hdf_file.attrs.create('dateTimeOfLastRecord', strVal.encode())
+    directions =  numpy.empty((1, time_file.number_of_records), dtype=numpy.float64)
+    speeds = numpy.empty((1, time_file.number_of_records), dtype=numpy.float64)
 
+    print("Adding direction and speed information...")
 
-#******************************************************************************
-def update_current_speed(hdf_file, min_speed, max_speed):
-    """Update the min/max current speed values of the S-111 file.
+    #For each row of data in the ascii file...
+    for row_counter in range(0, time_file.number_of_records):
+
+        #Read the data from the ascii file and store it in the HDF5 dataset.
+        data_values = time_file.read_next_row()
+        directions[0][row_counter] = data_values[1]
+        speeds[0][row_counter] = data_values[2] * ms2Knots
+
+        #Find the min/max speed values.
+        if min_speed == None:
+            min_speed = max_speed = speeds[0][row_counter]
+        else:
+            min_speed = min(min_speed, speeds[0][row_counter])
+            max_speed = max(max_speed, speeds[0][row_counter])
+
+
+    #Create a new dataset.
+    group.create_dataset('Direction', (1, time_file.number_of_records), dtype=numpy.float64, data=directions)
+    group.create_dataset('Speed', (1, time_file.number_of_records), dtype=numpy.float64, data=speeds)
+
+    return (min_speed, max_speed)
     
+
+#******************************************************************************
+def replace_series_group(hdf_file, group_name, time_file):
+    """Replace an existing timeseries group with the contents of a changed input file.
+
+    :param hdf_file: The S-111 HDF file.
+    :param group_name: The name of the group to be replaced.
+    :param time_file: The input ASCII file containing the timeseries data.
+    :returns: The replaced group.
+    """
+
+    #Make sure this file contains the correct number of times.
+    numTimesInFile = hdf_file.attrs['numberOfTimes']
+    if numTimesInFile != time_file.number_of_records:
+        raise Exception('Number of times in file does not match file header.')
+
+    #Make sure the given file has the correct record interval.
+    timeRecordInterval = hdf_file.attrs['timeRecordInterval']
+    intervalInSeconds = time_file.interval.total_seconds()
+    if intervalInSeconds != timeRecordInterval:
+        raise Exception('The specified S-111 file does not match the input time interval.')
+
+    #A station matrix has a single time axis, which the replaced station must start on.
+    if station_matrix.MATRIX_GROUP in hdf_file:
+        station_matrix.check_station_alignment(hdf_file, time_file.start_time)
+
+    #The station number is the index of the station's position in the XY group.
+    stationIndex = int(group_name.split(' ')[1]) - 1
+
+    xy_group = hdf_file['Group XY']
+    xy_group['X'][0, stationIndex] = time_file.longitude
+    xy_group['Y'][0, stationIndex] = time_file.latitude
+
+    #Remove the old datasets, they are recreated from the new input.
+    group = hdf_file[group_name]
+    del group['Direction']
+    del group['Speed']
+
+    #Store the start time.
+    strVal = time_file.start_time.strftime("%Y%m%dT%H%M%SZ")
+    group.attrs.create('DateTime', strVal.encode())
+
+    #The old series may have defined the temporal extents, so recompute them.
+    station_writer.recompute_temporal_coverage(hdf_file)
+
+    print("Replaced tide station group #", str(stationIndex + 1))
+
+    return group
+
+
+#******************************************************************************
+def find_station_group(hdf_file, longitude, latitude):
+    """Find the station group at a position.
+
     :param hdf_file: The S-111 HDF file.
-    :param min_speed: The minimum current speed value added.
-    :param max_speed: The maximum current speed value added.
+    :param longitude: The x coordinate of the station.
+    :param latitude: The y coordinate of the station.
+    :returns: The name of the station's group, None if there is no station at the position.
     """
 
-    if 'minSurfCurrentSpeed' in hdf_file.attrs:
-        min_speed = min(min_speed, hdf_file.attrs['minSurfCurrentSpeed'])
+    if 'Group XY' not in hdf_file:
+        return None
 
-    if 'maxSurfCurrentSpeed' in hdf_file.attrs:
-        max_speed = max(max_speed, hdf_file.attrs['maxSurfCurrentSpeed'])
+    xy_group = hdf_file['Group XY']
+    matches = numpy.nonzero((xy_group['X'][0] == longitude) & (xy_group['Y'][0] == latitude))[0]
+    if matches.shape[0] == 0:
+        return None
+
+    return 'Group ' + str(matches[0] + 1)
+
+
+#******************************************************************************
+def is_station_unchanged(hdf_file, group_name, time_file, directions, speeds):
+    """Determine if a station group already holds a timeseries, using its stored content hash.
+
+    :param hdf_file: The S-111 HDF file.
+    :param group_name: The name of the station's group.
+    :param time_file: The input ASCII file containing the timeseries data.
+    :param directions: Array of direction values (degrees true).
+    :param speeds: Array of speed values (knots).
+    :returns: True if the station's position, start time and values are unchanged, else false.
+    """
+
+    group = hdf_file[group_name]
+    stationIndex = int(group_name.split(' ')[1]) - 1
+
+    previousHash = group_hash.read_group_hash(group)
+    if previousHash == None or previousHash != group_hash.compute_group_hash(directions, speeds):
+        return False
+
+    strVal = time_file.start_time.strftime("%Y%m%dT%H%M%SZ")
+    if metadata.decode_string(group.attrs['DateTime']) != strVal:
+        return False
+
+    xy_group = hdf_file['Group XY']
+    return xy_group['X'][0, stationIndex] == time_file.longitude and xy_group['Y'][0, stationIndex] == time_file.latitude
+
+
+#******************************************************************************
+def recompute_current_speed(hdf_file):
+    """Recompute the min/max current speed values of the S-111 file from all station groups.
+
+    Replacing a station can lower the extents, so they cannot simply be merged.
+
+    :param hdf_file: The S-111 HDF file.
+    """
+
+    min_speed = None
+    max_speed = None
+
+    numStations = hdf_file.attrs['numberOfStations']
+    for stationIndex in range(0, numStations):
+        group = hdf_file['Group ' + str(stationIndex + 1)]
+
+        #Use the station's stored statistics, only reading the speeds of stations added without them.
+        if 'minSurfCurrentSpeed' in group.attrs:
+            station_min, station_max = group.attrs['minSurfCurrentSpeed'], group.attrs['maxSurfCurrentSpeed']
+        else:
+            speeds = group['Speed'][()]
+            station_min, station_max = speeds.min(), speeds.max()
+
+        if min_speed == None:
+            min_speed = station_min
+            max_speed = station_max
+        else:
+            min_speed = min(min_speed, station_min)
+            max_speed = max(max_speed, station_max)
 
     hdf_file.attrs.create('minSurfCurrentSpeed', min_speed)
     hdf_file.attrs.create('maxSurfCurrentSpeed', max_speed)
 
 
 #******************************************************************************
-def add_series_group(hdf_file, time_file):
-    """Add a new timeseries group to the given S-111 HDF file.
-    
+def read_time_series_file(manifest, file_name, force=False, cache=None, validate=True, dialect=None):
+    """Read (and check) a timeseries file, unless it has already been ingested.
+
+    This does not change the S-111 file, so it can run ahead of the writes in a pipeline.
+
+    :param manifest: The ingest manifest of the S-111 file.
+    :param file_name: The name of the input ASCII file containing the timeseries data.
+    :param force: True to read the file even if it is unchanged.
+    :param cache: The SeriesCache of parsed input files, None to always parse the file.
+    :param validate: True to check the records against the header.
+    :param dialect: The name of the file's dialect, None to detect it from the header.
+    :returns: A tuple containing the time file, its content hash, directions and speeds (knots), None if it is skipped.
+    """
+
+    parameters = {'tool': 's111_add_timeseries'}
+    content_hash = manifest.hash_input(file_name)
+
+    if not force and manifest.is_current(file_name, content_hash, parameters):
+        print("Skipping", file_name, "(already ingested, unchanged)")
+        return None
+
+    #Open the direction and speed files.
+    time_file = ascii_time_series.AsciiTimeSeries(file_name, cache, dialect)
+    print("Successfully opened time series file containing", str(time_file.number_of_records), "records.")
+
+    #Read all of the records before changing the file, so a bad input leaves it untouched.
+    if validate:
+        dateAndTimes, directions, speeds = time_file.read_validated_arrays()
+    else:
+        dateAndTimes, directions, speeds = time_file.read_arrays()
+
+    return (time_file, content_hash, directions, speeds * ms2Knots)
+
+
+#******************************************************************************
+def write_time_series_file(hdf_file, manifest, file_name, values, update=False):
+    """Add the values read from a timeseries file to the S-111 file.
+
     :param hdf_file: The S-111 HDF file.
-    :param time_file: The input ASCII file containing the timeseries data.
-    :returns: The newly created group.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param file_name: The name of the input ASCII file containing the timeseries data.
+    :param values: The tuple returned by read_time_series_file.
+    :param update: True to replace the station at the same position, and leave it untouched if its values are unchanged.
+    :returns: True if the S-111 file was changed, false if the station was unchanged.
     """
 
-    #Read the file metadata to find out how many time stations we currently have.
-    numCurrentStations = hdf_file.attrs['numberOfStations']
-    
-    #If this is the first station, then we need to initialize a few things.
-    if numCurrentStations == 0:
+    parameters = {'tool': 's111_add_timeseries'}
+    time_file, content_hash, directions, speeds = values
 
-        #Set the number of times.
-        hdf_file.attrs.create('numberOfTimes', time_file.number_of_records, dtype=numpy.int64)
+    #If this file was ingested before, then replace its station rather than adding a duplicate.
+    entry = manifest.get_entry(file_name)
+    group_name = entry['groups'][0] if entry != None else None
 
-        #Set the correct coding format.
-        hdf_file.attrs.create('dataCodingFormat', 1, dtype=numpy.int64)
+    #When updating, a new input (e.g. the next forecast cycle) replaces the station at its position.
+    if update:
+        if group_name == None:
+            group_name = find_station_group(hdf_file, time_file.longitude, time_file.latitude)
 
-        #Set the correct record interval.
-        intervalInSeconds = time_file.interval.total_seconds()
-        hdf_file.attrs.create('timeRecordInterval', intervalInSeconds, dtype=numpy.int64)
+        if group_name != None:
+            #The station now comes from this input.
+            for key in list(manifest.entries):
+                if key != manifest.get_key(file_name) and manifest.entries[key]['groups'] == [group_name]:
+                    manifest.remove(key)
 
-        x_dataset = numpy.empty((1, 1), dtype=numpy.float64)
-        x_dataset[0][0] = time_file.longitude
+            if is_station_unchanged(hdf_file, group_name, time_file, directions, speeds):
+                print("Tide station group #", group_name.split(' ')[1], "is unchanged")
+                manifest.record(file_name, content_hash, parameters, [group_name])
+                manifest.save()
+                return False
 
-        y_dataset = numpy.empty((1, 1), dtype=numpy.float64)
-        y_dataset[0][0] = time_file.latitude
+    if group_name != None:
 
-        #Add the 'Group XY' to store the position information.
-        xy_group = hdf_file.create_group('Group XY')
+        new_group = replace_series_group(hdf_file, group_name, time_file)
+        station_writer.write_station_identity(new_group, time_file.station_name, time_file.station_id)
+        station_writer.write_station_datasets(new_group, directions, speeds)
 
-        #Add the x and y datasets to the xy group.
-        xy_group.create_dataset('X', (1, 1), maxshape=(1, None), dtype=numpy.float64, data=x_dataset)
-        xy_group.create_dataset('Y', (1, 1), maxshape=(1, None), dtype=numpy.float64, data=y_dataset)       
-        
+        #The old values may have defined the extents, so recompute them.
+        recompute_current_speed(hdf_file)
 
-    #Else this is not a new file, so lets verify a few things.
     else:
 
-        #Make sure this file contains the correct number of times.
-        numTimesInFile = hdf_file.attrs['numberOfTimes']
-        if numTimesInFile != time_file.number_of_records:
-            raise Exception('Number of times in file does not match file header.')
+        #Add a new group for the series.
+        new_group = add_series_group(hdf_file, time_file)
+        station_writer.write_station_identity(new_group, time_file.station_name, time_file.station_id)
 
-        #Make sure the given file contains the correct type of data.
-        dataCodingFormat = hdf_file.attrs['dataCodingFormat']
-        if dataCodingFormat != 1:
-            raise Exception('The specified S-111 file does not contain time series data.')
+        #Add the direction and speed
+        min_speed, max_speed = station_writer.write_station_datasets(new_group, directions, speeds)
 
-        #Make sure the given file has the correct record interval.
-        timeRecordInterval = hdf_file.attrs['timeRecordInterval']
-        intervalInSeconds = time_file.interval.total_seconds()
-        if intervalInSeconds != timeRecordInterval:
-            raise Exception('The specified S-111 file does not match the input time interval.')
+        #Update the min/max speed in the metadata.
+        station_writer.update_current_speed(hdf_file, min_speed, max_speed)
 
-        #Update the XY group with the position information of this time series file.
-        xy_group = hdf_file['Group XY']
+    #Flush the edits out before recording the input, so the manifest never gets ahead of the file.
+    hdf_file.flush()
 
-        x_dataset = xy_group['X']
-        x_dataset.resize((1, numCurrentStations+1))
-        x_dataset[(0, numCurrentStations)] = time_file.longitude
+    manifest.record(file_name, content_hash, parameters, [new_group.name.lstrip('/')])
+    manifest.save()
 
-        y_dataset = xy_group['Y']
-        y_dataset.resize((1, numCurrentStations+1))
-        y_dataset[(0, numCurrentStations)] = time_file.latitude
+    return True
 
-    
-            
-    #Update the area coverage information. (These are not set anymore, since 1.09)
-    #update_area_coverage(hdf_file, time_file.latitude, time_file.longitude)
-
-    #Update the temporal information.
-    update_temporal_coverage(hdf_file, time_file.start_time, time_file.end_time)
-
-    #Increment the number of time stations and store it back in the file.
-    numCurrentStations += 1
-    hdf_file.attrs.create('numberOfStations', numCurrentStations, dtype=numpy.int64)
-        
-    #Create the new group
-    newGroupName = 'Group ' + str(numCurrentStations)
-    newGroup = hdf_file.create_group(newGroupName)
-    
-    #Store the title
-    newGroupTitle = 'Station No. ' + str(numCurrentStations)
-    newGroup.attrs.create('Title', newGroupTitle.encode())
 
-    #Store the start time.
-    strVal = time_file.start_time.strftime("%Y%m%dT%H%M%SZ")
-    newGroup.attrs.create('DateTime', strVal.encode())
+#******************************************************************************
+def add_time_series_file(hdf_file, manifest, file_name, force=False, cache=None, validate=True, update=False, dialect=None):
+    """Add a timeseries file to the S-111 file, skipping it if it has already been ingested.
 
-    print("Created tide station group #", str(numCurrentStations))
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param file_name: The name of the input ASCII file containing the timeseries data.
+    :param force: True to ingest the file even if it is unchanged.
+    :param cache: The SeriesCache of parsed input files, None to always parse the file.
+    :param validate: True to check the records against the header before adding them.
+    :param update: True to replace the station at the same position, and leave it untouched if its values are unchanged.
+    :param dialect: The name of the file's dialect, None to detect it from the header.
+    :returns: True if the file was ingested, false if it was skipped.
+    """
 
-    return newGroup
+    values = read_time_series_file(manifest, file_name, force, cache, validate, dialect)
+    if values == None:
+        return False
 
+    write_time_series_file(hdf_file, manifest, file_name, values, update)
 
-#******************************************************************************    
-def add_series_datasets(group, time_file):
-    """Add the timeseries data to the specified HDF group.
-    
-    :param group: The HDF group to add the speed and direction datasets to.
-    :param time_file: The input ASCII file containing the timeseries data.
-    :returns: A tuple containing the minimum and maximum speed values added.
+    return True
+
+
+#******************************************************************************
+def add_time_series_files(hdf_file, manifest, file_names, force=False, cache=None, validate=True, pipelined=False, matrix=False,
+                          update=False, dialect=None):
+    """Add several timeseries files to the S-111 file, skipping those that have already been ingested.
+
+    When pipelined, the next file is read in a background thread while the current one is written.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param file_names: The list of input ASCII files containing the timeseries data.
+    :param force: True to ingest the files even if they are unchanged.
+    :param cache: The SeriesCache of parsed input files, None to always parse the files.
+    :param validate: True to check the records against the header before adding them.
+    :param pipelined: True to overlap reading the files with writing them.
+    :param matrix: True to write the station matrix. (An existing matrix is always kept up to date)
+    :param update: True to replace the stations at the same positions, leaving those with unchanged values untouched.
+    :param dialect: The name of the files' dialect, None to detect it from each header.
     """
 
-    min_speed = None
-    max_speed = None
+    ingested = False
 
-    directions =  numpy.empty((1, time_file.number_of_records), dtype=numpy.float64)
-    speeds = numpy.empty((1, time_file.number_of_records), dtype=numpy.float64)
+    #Each file is read into its own arrays, the buffers only bound how far ahead the reads get.
+    buffers = [None] * pipeline.DOUBLE_BUFFERED
 
-    print("Adding direction and speed information...")
+    def read_file(file_name, buffer):
+        return read_time_series_file(manifest, file_name, force, cache, validate, dialect)
 
-    #For each row of data in the ascii file...
-    for row_counter in range(0, time_file.number_of_records):
+    for file_name, values in pipeline.run_pipeline(file_names, read_file, buffers, pipelined):
+        if values != None:
+            with pipeline.hdf5_lock:
+                #A requested matrix is only written at the end, so check the stations against its time axis as they are added.
+                if matrix:
+                    station_matrix.check_station_alignment(hdf_file, values[0].start_time)
 
-        #Read the data from the ascii file and store it in the HDF5 dataset.
-        data_values = time_file.read_next_row()
-        directions[0][row_counter] = data_values[1]
-        speeds[0][row_counter] = data_values[2] * ms2Knots
+                if write_time_series_file(hdf_file, manifest, file_name, values, update):
+                    ingested = True
 
-        #Find the min/max speed values.
-        if min_speed == None:
-            min_speed = max_speed = speeds[0][row_counter]
-        else:
-            min_speed = min(min_speed, speeds[0][row_counter])
-            max_speed = max(max_speed, speeds[0][row_counter])
+    #Write the station matrix if it is missing, or rewrite it if the stations changed.
+    station_matrix.update_station_matrix(hdf_file, matrix, ingested)
 
 
-    #Create a new dataset.
-    group.create_dataset('Direction', (1, time_file.number_of_records), dtype=numpy.float64, data=directions)
-    group.create_dataset('Speed', (1, time_file.number_of_records), dtype=numpy.float64, data=speeds)
+#******************************************************************************
+def send_time_series_files(address, hdf_file_name, file_names, force=False, validate=True, update=False, dialect=None):
+    """Send timeseries files to the ingest service writing the S-111 file, rather than opening it.
+
+    The files are sent as separate requests, without waiting for each to be written.
+
+    :param address: The path of the service's Unix socket.
+    :param hdf_file_name: The name of the S-111 file written by the service.
+    :param file_names: The list of input ASCII files containing the timeseries data.
+    :param force: True to ingest the files even if they are unchanged.
+    :param validate: True to check the records against the header before adding them.
+    :param update: True to replace the stations at the same positions, leaving those with unchanged values untouched.
+    :param dialect: The name of the files' dialect, None to detect it from each header.
+    """
+
+    with ingest_service.IngestClient(address) as client:
+
+        #The service resolves the files from its own directory.
+        requestIds = []
+        for file_name in file_names:
+            request = {'type': 'timeseries', 'file': os.path.abspath(hdf_file_name), 'files': [os.path.abspath(file_name)],
+                       'force': force, 'validate': validate, 'update': update, 'dialect': dialect}
+            requestIds.append(client.submit(request))
+
+        for file_name, requestId in zip(file_names, requestIds):
+            print(file_name, ":", client.wait(requestId)[0])
 
-    return (min_speed, max_speed)
-    
 
 #******************************************************************************        
 def create_command_line():
@@ -246,39 +445,52 @@ def create_command_line():
 
     parser = argparse.ArgumentParser(description='Add S-111 time series dataset')
 
-    parser.add_argument('-t', '--time-series-file', help='The ASCII file containing the time series.', required=True)
+    parser.add_argument('-t', '--time-series-file', help='The ASCII file containing the time series. (Repeat to add several files)', action='append', required=True)
+    parser.add_argument('-f', '--force', help='Ingest the files even if they have already been ingested unchanged.', action='store_true')
+    parser.add_argument('-p', '--pipeline', help='Read the next file in a background thread while the current one is written.', action='store_true')
+    parser.add_argument('-u', '--update', help='Replace the station at the same position as each file (e.g. from the previous forecast cycle), only writing the stations whose values changed.', action='store_true')
+    parser.add_argument('--matrix', help='Also write the station by time matrix, for reading every station at a time.', action='store_true')
+    parser.add_argument('--dialect', help='The layout of the time series files. (default: detected from each header, chs-station is only used when given)', choices=ascii_time_series.get_dialect_names())
+    parser.add_argument('--no-validate', help='Do not check the records against the time series header.', action='store_true')
+    parser.add_argument('--parse-cache', help='Cache the parsed time series next to each input file, so later runs skip parsing.', action='store_true')
+    parser.add_argument('--parse-cache-dir', help='Cache the parsed time series in this directory instead.')
+    parser.add_argument('-s', '--service', help='Send the files to the ingest service (s111 serve) listening on this socket, rather than opening the file.')
+    parser.add_argument('--in-memory', help='Build the file in memory and write it to disk once, when done.', action='store_true')
+    parser.add_argument('--max-memory', help='The maximum estimated size (in megabytes) of a file built in memory, larger files are built on disk. (default: 1024)', type=float, default=memory_file.DEFAULT_MAX_SIZE)
     parser.add_argument("inOutFile", nargs=1)
 
     return parser
 
 
 #******************************************************************************        
-def main():
+def main(args=None):
 
     #Create the command line parser.
     parser = create_command_line()
 
     #Parse the command line.
-    results = parser.parse_args()
-    
-    #open the HDF5 file.
-    with h5py.File(results.inOutFile[0], "r+") as hdf_file:
+    results = parser.parse_args(args)
 
-        #Open the direction and speed files.
-        time_file = ascii_time_series.AsciiTimeSeries(results.time_series_file)
-        print("Successfully opened time series file containing", str(time_file.number_of_records), "records.")
+    if results.service != None:
+        if results.in_memory or results.pipeline or results.matrix or results.parse_cache or results.parse_cache_dir != None:
+            parser.error('--service cannot be combined with --in-memory, --pipeline, --matrix or the parse cache (the service writes the file).')
 
-        #Add a new group for the series.
-        new_group = add_series_group(hdf_file, time_file)
+        send_time_series_files(results.service, results.inOutFile[0], results.time_series_file, results.force,
+                               not results.no_validate, results.update, results.dialect)
+        return
 
-        #Add the direction and speed
-        min_speed, max_speed = add_series_datasets(new_group, time_file)
+    #open the HDF5 file.
+    with memory_file.open_s111_file(results.inOutFile[0], "r+", results.in_memory, int(results.max_memory * 1024 * 1024),
+                                    results.time_series_file) as hdf_file:
 
-        #Update the min/max speed in the metadata.
-        update_current_speed(hdf_file, min_speed, max_speed)
+        #Load the record of what has already been ingested into this file.
+        manifest = ingest_manifest.IngestManifest(results.inOutFile[0])
+        memory_file.defer_manifest(hdf_file, manifest)
+
+        cache = series_cache.open_series_cache(results.parse_cache, results.parse_cache_dir)
 
-        #Flush any edits out.
-        hdf_file.flush()
+        add_time_series_files(hdf_file, manifest, results.time_series_file, results.force, cache,
+                              not results.no_validate, results.pipeline, results.matrix, results.update, results.dialect)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from chs_s111 import ingest_manifest
+from chs_s111 import memory_file
+import s111_add_timeseries
+import s111_create_file
+
+#******************************************************************************
+def build_station_product(output_file, metadata_file, time_series_files, in_memory):
+    """Build a station product from scratch, timing the build.
+
+    :param output_file: The name of the S-111 file to be built.
+    :param metadata_file: The ASCII CSV file to retrieve the metadata values from.
+    :param time_series_files: The list of ASCII files containing the time series.
+    :param in_memory: True to build the file in memory, false to build it on disk.
+    :returns: The time (in seconds) taken to build the file, including writing it to disk.
+    """
+
+    startTime = time.perf_counter()
+
+    ingest_manifest.remove_manifest(output_file)
+
+    with memory_file.open_s111_file(output_file, "w", in_memory, float('inf')) as hdf_file:
+
+        s111_create_file.add_metadata(hdf_file.attrs, metadata_file)
+
+        manifest = ingest_manifest.IngestManifest(output_file)
+        memory_file.defer_manifest(hdf_file, manifest)
+
+        s111_add_timeseries.add_time_series_files(hdf_file, manifest, time_series_files, True)
+
+    return time.perf_counter() - startTime
+
+
+#******************************************************************************        
+def create_command_line():
+    """Create and initialize the command line parser.
+    
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark building an S-111 station product in memory against building it on disk')
+
+    parser.add_argument('-m', '--metadata-file', help='The ASCII CSV file containing the metadata.', required=True)
+    parser.add_argument('-r', '--repeat', help='The number of builds in each mode. (default: 3)', type=int, default=3)
+    parser.add_argument('-o', '--output-dir', help='The directory the files are built in, e.g. on the network filesystem. (default: a temporary directory)')
+    parser.add_argument("timeSeriesFile", nargs='+')
+
+    return parser
+
+
+#******************************************************************************        
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    outputDir = results.output_dir
+    if outputDir == None:
+        outputDir = tempfile.mkdtemp(prefix='s111_benchmark_')
+
+    times = {False: [], True: []}
+
+    #Alternate the modes, so both see the same filesystem conditions.
+    for repeat in range(0, results.repeat):
+        for inMemory in (False, True):
+            outputFile = os.path.join(outputDir, 'benchmark_' + ('memory' if inMemory else 'disk') + '.h5')
+            times[inMemory].append(build_station_product(outputFile, results.metadata_file, results.timeSeriesFile, inMemory))
+
+    for inMemory in (False, True):
+        outputFile = os.path.join(outputDir, 'benchmark_' + ('memory' if inMemory else 'disk') + '.h5')
+        ingest_manifest.remove_manifest(outputFile)
+        os.remove(outputFile)
+
+    print()
+    print("Stations:", len(results.timeSeriesFile), "Builds per mode:", results.repeat)
+    print("On disk:   median %.3f s, best %.3f s" % (statistics.median(times[False]), min(times[False])))
+    print("In memory: median %.3f s, best %.3f s" % (statistics.median(times[True]), min(times[True])))
+    print("Speedup:   %.2fx" % (statistics.median(times[False]) / statistics.median(times[True])))
+
+
+if __name__ == "__main__":
+    main()
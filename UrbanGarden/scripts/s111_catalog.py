@@ -0,0 +1,92 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import os
+import time
+import iso8601
+import pytz
+from chs_s111 import catalog
+
+#******************************************************************************
+def parse_time_argument(value):
+    """Parse a command line time, in UTC unless a time zone is given.
+
+    :param value: The ISO 8601 time string.
+    :returns: The time in UTC.
+    """
+
+    return iso8601.parse_date(value, default_timezone=pytz.utc).astimezone(pytz.utc)
+
+
+#******************************************************************************
+def format_group_ranges(group_ranges):
+    """Format a list of group ranges for printing.
+
+    :param group_ranges: The list of (first, last) group index tuples.
+    :returns: The ranges as a string. (e.g. '1-24,30')
+    """
+
+    return ','.join(str(first) if first == last else str(first) + '-' + str(last) for first, last in group_ranges)
+
+
+#******************************************************************************        
+def create_command_line():
+    """Create and initialize the command line parser.
+    
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Index an archive of S-111 files in a SQLite catalog, and query it.')
+
+    parser.add_argument('-d', '--database', help='The SQLite catalog database. (default: s111_catalog.db)', default='s111_catalog.db')
+
+    subparsers = parser.add_subparsers(dest='action')
+    subparsers.required = True
+
+    indexParser = subparsers.add_parser('index', help='Index the new and changed S-111 files.')
+    indexParser.add_argument('-w', '--workers', help='The number of worker processes reading the files. (default: number of CPUs)', type=int, default=os.cpu_count())
+    indexParser.add_argument('--no-prune', help='Keep the records of catalogued files that no longer exist.', action='store_true')
+    indexParser.add_argument('paths', help='The S-111 files, and directories to search for .h5 files.', nargs='+')
+
+    queryParser = subparsers.add_parser('query', help='List the files, and their groups, matching a region, time window, speed and station.')
+    queryParser.add_argument('--bbox', help='The region to match.', type=float, nargs=4, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'))
+    queryParser.add_argument('--start', help='The earliest time to match. (ISO 8601, UTC unless a zone is given)', type=parse_time_argument)
+    queryParser.add_argument('--end', help='The latest time to match. (ISO 8601, UTC unless a zone is given)', type=parse_time_argument)
+    queryParser.add_argument('--format', help='The data coding format to match. (1: time series, 2: regular grid, 3: irregular grid)', type=int, choices=[1, 2, 3])
+    queryParser.add_argument('--min-speed', help='Only match groups whose maximum speed reaches this speed (knots).', type=float)
+    queryParser.add_argument('--station-name', help='Only match the stations with this name.')
+    queryParser.add_argument('--station-id', help='Only match the stations with this identifier.')
+
+    return parser
+
+
+#******************************************************************************        
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    with catalog.Catalog(results.database) as s111_catalog:
+
+        if results.action == 'index':
+            indexed, unchanged, removed = s111_catalog.update(results.paths, results.workers, not results.no_prune)
+            print("Indexed", indexed, "files,", unchanged, "unchanged,", removed, "removed")
+            return
+
+        startTime = time.perf_counter()
+        matches = s111_catalog.query(results.bbox, results.start, results.end, results.format, results.min_speed,
+                                     results.station_name, results.station_id)
+        elapsed = time.perf_counter() - startTime
+
+        for fileName, groupRanges in matches:
+            print(fileName, format_group_ranges(groupRanges))
+
+        print(len(matches), "matching files (%.1f ms)" % (elapsed * 1000.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,549 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import h5py
+import netCDF4
+import numpy
+from chs_s111 import array_writer
+from chs_s111 import ascii_time_series
+from chs_s111 import grid_writer
+from chs_s111 import group_hash
+from chs_s111 import group_statistics
+from chs_s111 import hdf_diff
+from chs_s111 import ingest_manifest
+from chs_s111 import series_cache
+from chs_s111 import station_writer
+import s111_add_irregular_grid
+import s111_add_timeseries
+import s111_create_file
+
+#The attributes only written by the fast paths, which the legacy files do not have. (Compared where both have them, e.g. the file's speed extents)
+FAST_PATH_ATTRIBUTES = list(group_statistics.STATISTICS_ATTRIBUTES.values()) + [group_statistics.MAX_TIME_ATTRIBUTE,
+                                                                                 group_hash.HASH_ATTRIBUTE]
+
+#The default tolerances of numeric values. (The vectorized math functions may round the last bit differently than the math module)
+DEFAULT_RTOL = 1.0e-12
+DEFAULT_ATOL = 1.0e-12
+
+#The memory budget (in bytes) splitting even a small grid into several slabs of times and nodes.
+SMALL_MEMORY_BUDGET = 64 * 1024
+
+#The velocity components (metres per second) at the first nodes of a generated grid, at the edges of the direction conversion.
+EDGE_COMPONENTS = [(0.0, 0.0), (-0.0, 0.0), (0.0, -0.0), (-0.0, -0.0), (0.0, 1.0), (-1.0e-7, 1.0),
+                   (1.0, 0.0), (-1.0, 0.0), (-1.0, -0.0), (0.0, -1.0), (1.0e-7, -1.0), (3.0, 4.0)]
+
+#******************************************************************************
+def build_legacy_stations(hdf_file, manifest, input_files, work_dir):
+    """Add the timeseries files record by record, as add_series_datasets always has.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file. (Not used)
+    :param input_files: The list of input ASCII files containing the timeseries data.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    for file_name in input_files:
+        time_file = ascii_time_series.AsciiTimeSeries(file_name)
+
+        new_group = s111_add_timeseries.add_series_group(hdf_file, time_file)
+        min_speed, max_speed = s111_add_timeseries.add_series_datasets(new_group, time_file)
+        station_writer.update_current_speed(hdf_file, min_speed, max_speed)
+
+
+#******************************************************************************
+def build_vectorized_stations(hdf_file, manifest, input_files, work_dir):
+    """Add the timeseries files with the vectorized reader and writer.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param input_files: The list of input ASCII files containing the timeseries data.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    s111_add_timeseries.add_time_series_files(hdf_file, manifest, input_files)
+
+
+#******************************************************************************
+def build_pipelined_stations(hdf_file, manifest, input_files, work_dir):
+    """Add the timeseries files, reading the next file while the current one is written.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param input_files: The list of input ASCII files containing the timeseries data.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    s111_add_timeseries.add_time_series_files(hdf_file, manifest, input_files, pipelined=True)
+
+
+#******************************************************************************
+def build_cached_stations(hdf_file, manifest, input_files, work_dir):
+    """Add the timeseries files through the parsed series cache. (Loaded from the cache after the first build)
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param input_files: The list of input ASCII files containing the timeseries data.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    cache = series_cache.SeriesCache(os.path.join(work_dir, 'parse_cache'))
+
+    s111_add_timeseries.add_time_series_files(hdf_file, manifest, input_files, cache=cache)
+
+
+#******************************************************************************
+def build_array_stations(hdf_file, manifest, input_files, work_dir):
+    """Add the timeseries files through the array API.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file. (Not used)
+    :param input_files: The list of input ASCII files containing the timeseries data.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    for file_name in input_files:
+        time_file = ascii_time_series.AsciiTimeSeries(file_name)
+        dateAndTimes, directions, speeds = time_file.read_arrays()
+
+        array_writer.add_stations(hdf_file, time_file.longitude, time_file.latitude, dateAndTimes, directions=directions,
+                                  speeds=speeds, units='m/s', station_names=[time_file.station_name],
+                                  station_ids=[time_file.station_id])
+
+
+#******************************************************************************
+def build_legacy_grid(hdf_file, manifest, input_files, work_dir):
+    """Add the irregular grid value by value, as create_data_groups always has.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file. (Not used)
+    :param input_files: The list containing the netcdf file of the irregular grid.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    with netCDF4.Dataset(input_files[0], "r", format="NETCDF4") as grid_file:
+
+        times = grid_file.variables['Times']
+        latc = grid_file.variables['latc']
+        lonc = grid_file.variables['lonc']
+        ua = grid_file.variables['ua']
+        va = grid_file.variables['va']
+
+        numberOfTimes, numberOfLat = grid_writer.verify_grid_variables(times, latc, lonc, ua, va)
+
+        minX, minY, maxX, maxY = s111_add_irregular_grid.create_xy_group(hdf_file, latc, lonc)
+
+        minTime, maxTime, interval, minSpeed, maxSpeed = s111_add_irregular_grid.create_data_groups(hdf_file, times, ua, va)
+
+        s111_add_irregular_grid.update_metadata(hdf_file, numberOfTimes, numberOfLat, minTime, maxTime, interval,
+                                                minX, minY, maxX, maxY, minSpeed, maxSpeed)
+
+
+#******************************************************************************
+def build_slab_grid(hdf_file, manifest, input_files, work_dir):
+    """Add the irregular grid with the slab writer.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param input_files: The list containing the netcdf file of the irregular grid.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    s111_add_irregular_grid.add_grid_file(hdf_file, manifest, input_files[0], array_writer.DEFAULT_MEMORY_BUDGET)
+
+
+#******************************************************************************
+def build_small_slab_grid(hdf_file, manifest, input_files, work_dir):
+    """Add the irregular grid with the slab writer, in many small slabs.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param input_files: The list containing the netcdf file of the irregular grid.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    s111_add_irregular_grid.add_grid_file(hdf_file, manifest, input_files[0], SMALL_MEMORY_BUDGET)
+
+
+#******************************************************************************
+def build_pipelined_grid(hdf_file, manifest, input_files, work_dir):
+    """Add the irregular grid with the slab writer, converting the next slab while the current one is written.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param input_files: The list containing the netcdf file of the irregular grid.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    s111_add_irregular_grid.add_grid_file(hdf_file, manifest, input_files[0], array_writer.DEFAULT_MEMORY_BUDGET, pipelined=True)
+
+
+#******************************************************************************
+def build_array_grid(hdf_file, manifest, input_files, work_dir):
+    """Add the irregular grid through the array API.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file. (Not used)
+    :param input_files: The list containing the netcdf file of the irregular grid.
+    :param work_dir: The directory for any intermediate files.
+    """
+
+    with netCDF4.Dataset(input_files[0], "r", format="NETCDF4") as grid_file:
+
+        times = [grid_writer.parse_grid_time(value) for value in grid_file.variables['Times'][:]]
+
+        array_writer.add_irregular_grid(hdf_file, grid_file.variables['lonc'][:], grid_file.variables['latc'][:], times,
+                                        u=grid_file.variables['ua'][:], v=grid_file.variables['va'][:])
+
+
+#The legacy (reference) builder and the fast builders compared with it, for each kind of input.
+STATION_BUILDERS = {'legacy': build_legacy_stations,
+                    'vectorized': build_vectorized_stations,
+                    'pipelined': build_pipelined_stations,
+                    'parse-cache': build_cached_stations,
+                    'arrays': build_array_stations}
+
+GRID_BUILDERS = {'legacy': build_legacy_grid,
+                 'slabs': build_slab_grid,
+                 'small-slabs': build_small_slab_grid,
+                 'pipelined': build_pipelined_grid,
+                 'arrays': build_array_grid}
+
+#******************************************************************************
+def format_header_row(fields, row, values):
+    """Format a header row of a generated time series file.
+
+    :param fields: Dictionary of the header fields of the dialect. (row, first column, last column)
+    :param row: The (one based) row to format.
+    :param values: Dictionary of the field values.
+    :returns: The header row.
+    """
+
+    columns = [' '] * 80
+    for fieldName, value in values.items():
+        fieldRow, firstColumn, lastColumn = fields[fieldName]
+        if fieldRow == row:
+            columns[firstColumn - 1:lastColumn] = value.rjust(lastColumn - firstColumn + 1)
+
+    return ''.join(columns).rstrip() + '\n'
+
+
+#******************************************************************************
+def write_time_series_file(file_name, latitude, longitude, start_time, utc_offset, interval, directions, speeds):
+    """Write a generated CHS time series file.
+
+    :param file_name: The name of the ASCII file.
+    :param latitude: The y coordinate of the station.
+    :param longitude: The x coordinate of the station.
+    :param start_time: The (local) time of the first record.
+    :param utc_offset: The number of hours to add to the record times to get UTC.
+    :param interval: The time interval between records.
+    :param directions: The array of directions (degrees true).
+    :param speeds: The array of speeds (m/s).
+    """
+
+    intervalSeconds = int(interval.total_seconds())
+
+    values = {'unit': 'm',
+              'year': '%04d' % start_time.year,
+              'month': '%02d' % start_time.month,
+              'day': '%02d' % start_time.day,
+              'latitude_degrees': '%2d' % int(abs(latitude)),
+              'latitude_minutes': '%7.4f' % ((abs(latitude) - int(abs(latitude))) * 60.0),
+              'latitude_hemisphere': 'N' if latitude >= 0.0 else 'S',
+              'longitude_degrees': '%3d' % int(abs(longitude)),
+              'longitude_minutes': '%7.4f' % ((abs(longitude) - int(abs(longitude))) * 60.0),
+              'longitude_hemisphere': 'E' if longitude >= 0.0 else 'W',
+              'utc_offset': ('%+05.1f' % utc_offset).ljust(5),
+              'hour': '%02d' % start_time.hour,
+              'minute': '%02d' % start_time.minute,
+              'second': '%02d' % start_time.second,
+              'number_of_records': '%d' % len(directions),
+              'interval_hours': '%02d' % (intervalSeconds // 3600),
+              'interval_minutes': '%02d' % (intervalSeconds // 60 % 60),
+              'interval_seconds': '%02d' % (intervalSeconds % 60)}
+
+    dialect = ascii_time_series.get_dialect('chs')
+
+    with open(file_name, 'w') as ascii_file:
+        for row in range(1, dialect.header_rows + 1):
+            ascii_file.write(format_header_row(ascii_time_series.CHS_FIELDS, row, values))
+
+        for index in range(0, len(directions)):
+            recordTime = start_time + index * interval
+            ascii_file.write('%s %s %5.1f %6.3f\n' % (recordTime.strftime('%Y/%m/%d'), recordTime.strftime('%H:%M'),
+                                                      directions[index], speeds[index]))
+
+
+#******************************************************************************
+def generate_time_series_files(work_dir, number_of_stations, number_of_records, seed):
+    """Generate timeseries files, with directions and speeds at the edges of the conversions.
+
+    The stations share their record interval and number of records, so they can be added to the same file.
+
+    :param work_dir: The directory the files are written in.
+    :param number_of_stations: The number of stations.
+    :param number_of_records: The number of records per station.
+    :param seed: The seed of the random values.
+    :returns: The list of generated file names.
+    """
+
+    generator = numpy.random.default_rng(seed)
+    fileNames = []
+
+    for stationIndex in range(0, number_of_stations):
+        directions = generator.uniform(0.0, 359.9, number_of_records)
+        speeds = generator.uniform(0.0, 3.0, number_of_records)
+
+        #Start with the extreme directions and speeds, and speeds which do not convert exactly to knots.
+        edgeValues = [(0.0, 0.0), (359.9, 0.001), (0.1, 2.575), (180.0, 1.005), (90.0, 9.999)]
+        for index, (direction, speed) in enumerate(edgeValues[0:number_of_records]):
+            directions[index] = direction
+            speeds[index] = speed
+
+        #Every other station is in a time zone with a fractional offset.
+        utcOffset = 3.5 if stationIndex % 2 == 1 else 0.0
+
+        fileName = os.path.join(work_dir, 'station_' + str(stationIndex + 1) + '.txt')
+        write_time_series_file(fileName, generator.uniform(44.0, 45.0), generator.uniform(-64.0, -63.0),
+                               datetime(2017, 1, 1, 0, 0) + timedelta(minutes=int(generator.integers(0, 60))),
+                               utcOffset, timedelta(minutes=10), directions, speeds)
+        fileNames.append(fileName)
+
+    return fileNames
+
+
+#******************************************************************************
+def generate_grid_file(work_dir, number_of_nodes, number_of_times, seed):
+    """Generate an irregular grid file, with components at the edges of the direction conversion.
+
+    :param work_dir: The directory the file is written in.
+    :param number_of_nodes: The number of nodes.
+    :param number_of_times: The number of times.
+    :param seed: The seed of the random values.
+    :returns: The name of the generated file.
+    """
+
+    generator = numpy.random.default_rng(seed)
+    fileName = os.path.join(work_dir, 'grid.nc')
+
+    with netCDF4.Dataset(fileName, "w", format="NETCDF4") as grid_file:
+        grid_file.createDimension('time', number_of_times)
+        grid_file.createDimension('nele', number_of_nodes)
+        grid_file.createDimension('DateStrLen', 26)
+
+        times = grid_file.createVariable('Times', 'S1', ('time', 'DateStrLen'))
+        for index in range(0, number_of_times):
+            timeString = (datetime(2017, 1, 1) + timedelta(hours=index)).strftime('%Y-%m-%dT%H:%M:%S.000000')
+            times[index] = netCDF4.stringtochar(numpy.array([timeString], 'S26'))
+
+        grid_file.createVariable('latc', 'f4', ('nele',))[:] = generator.uniform(44.0, 45.0, number_of_nodes)
+        grid_file.createVariable('lonc', 'f4', ('nele',))[:] = generator.uniform(-64.0, -63.0, number_of_nodes)
+
+        components = {}
+        for name in ('ua', 'va'):
+            components[name] = generator.normal(0.0, 0.5, (number_of_times, number_of_nodes)).astype(numpy.float32)
+
+        #Start every time with the components at the edges of the direction conversion.
+        for index, (u, v) in enumerate(EDGE_COMPONENTS[0:number_of_nodes]):
+            components['ua'][:, index] = u
+            components['va'][:, index] = v
+
+        for name in ('ua', 'va'):
+            variable = grid_file.createVariable(name, 'f4', ('time', 'nele'))
+            variable.units = 'metres s-1'
+            variable[:] = components[name]
+
+    return fileName
+
+
+#******************************************************************************
+def build_file(output_file, metadata_file, builder, input_files, work_dir):
+    """Build an S-111 file from scratch with one of the builders, timing the build.
+
+    :param output_file: The name of the S-111 file to be built.
+    :param metadata_file: The ASCII CSV file to retrieve the metadata values from.
+    :param builder: The function adding the input files.
+    :param input_files: The list of input files.
+    :param work_dir: The directory for any intermediate files.
+    :returns: The time (in seconds) taken to build the file.
+    """
+
+    ingest_manifest.remove_manifest(output_file)
+
+    startTime = time.perf_counter()
+
+    with h5py.File(output_file, "w") as hdf_file:
+
+        s111_create_file.add_metadata(hdf_file.attrs, metadata_file)
+
+        manifest = ingest_manifest.IngestManifest(output_file)
+        builder(hdf_file, manifest, input_files, work_dir)
+
+    return time.perf_counter() - startTime
+
+
+#******************************************************************************
+def check_builders(name, builders, metadata_file, input_files, work_dir, repeat, rtol, atol):
+    """Build the same inputs with the legacy builder and each fast builder, and compare the files.
+
+    :param name: The name of the check, for the report.
+    :param builders: Dictionary of the builders, including the 'legacy' builder.
+    :param metadata_file: The ASCII CSV file to retrieve the metadata values from.
+    :param input_files: The list of input files.
+    :param work_dir: The directory the files are built in.
+    :param repeat: The number of builds with each builder, the best time is kept.
+    :param rtol: The relative tolerance of numeric values.
+    :param atol: The absolute tolerance of numeric values.
+    :returns: A dictionary of the legacy build time, and the time, speedup, differences and number of inexact values of each fast builder.
+    """
+
+    times = {}
+    outputFiles = {}
+
+    #Alternate the builders, so all see the same filesystem conditions.
+    for index in range(0, repeat):
+        for builderName, builder in builders.items():
+            outputFiles[builderName] = os.path.join(work_dir, name + '_' + builderName + '.h5')
+            buildTime = build_file(outputFiles[builderName], metadata_file, builder, input_files, work_dir)
+            times[builderName] = min(times.get(builderName, buildTime), buildTime)
+
+    result = {'inputs': input_files, 'legacy': times['legacy'], 'builders': {}}
+
+    with h5py.File(outputFiles['legacy'], "r") as legacy_file:
+        for builderName in builders:
+            if builderName == 'legacy':
+                continue
+
+            with h5py.File(outputFiles[builderName], "r") as fast_file:
+                differences = hdf_diff.diff_hdf_files(legacy_file, fast_file, rtol, atol, FAST_PATH_ATTRIBUTES)
+
+                #Also note the values which are only equal within the tolerances.
+                inexact = hdf_diff.diff_hdf_files(legacy_file, fast_file, 0.0, 0.0, FAST_PATH_ATTRIBUTES)
+
+            result['builders'][builderName] = {'time': times[builderName],
+                                               'speedup': times['legacy'] / times[builderName],
+                                               'differences': differences,
+                                               'inexact': len(inexact)}
+
+    return result
+
+
+#******************************************************************************
+def print_result(name, result):
+    """Print the result of a check.
+
+    :param name: The name of the check.
+    :param result: The dictionary returned by check_builders.
+    """
+
+    print()
+    print(name + ":", len(result['inputs']), "input files")
+    print("  %-12s %8.3f s" % ('legacy', result['legacy']))
+
+    for builderName, builderResult in result['builders'].items():
+        if len(builderResult['differences']) > 0:
+            status = str(len(builderResult['differences'])) + ' differences'
+        elif builderResult['inexact'] > 0:
+            status = 'equivalent (' + str(builderResult['inexact']) + ' datasets or attributes within the tolerances)'
+        else:
+            status = 'identical'
+        print("  %-12s %8.3f s %8.2fx  %s" % (builderName, builderResult['time'], builderResult['speedup'], status))
+
+        for difference in builderResult['differences'][0:10]:
+            print("    " + difference)
+
+
+#******************************************************************************
+def create_command_line():
+    """Create and initialize the command line parser.
+
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Check that the fast (vectorized and batched) paths build the same S-111 files as the legacy path, and how much faster they are')
+
+    parser.add_argument('-m', '--metadata-file', help='The ASCII CSV file containing the metadata.', required=True)
+    parser.add_argument('-t', '--time-series-file', help='An ASCII timeseries file to check, separately from the generated ones. (Repeat to add several)', action='append', default=[])
+    parser.add_argument('-g', '--grid-file', help='A netcdf irregular grid file to check, in addition to the generated one. (Repeat to add several)', action='append', default=[])
+    parser.add_argument('--stations', help='The number of generated stations, 0 for none. (default: 4)', type=int, default=4)
+    parser.add_argument('--records', help='The number of records of each generated station. (default: 2000)', type=int, default=2000)
+    parser.add_argument('--nodes', help='The number of nodes of the generated grid, 0 for none. (default: 2000)', type=int, default=2000)
+    parser.add_argument('--times', help='The number of times of the generated grid. (default: 12)', type=int, default=12)
+    parser.add_argument('--seed', help='The seed of the generated values. (default: 0)', type=int, default=0)
+    parser.add_argument('--rtol', help='The relative tolerance of numeric values, 0 to require identical values. (default: 1e-12)', type=float, default=DEFAULT_RTOL)
+    parser.add_argument('--atol', help='The absolute tolerance of numeric values, 0 to require identical values. (default: 1e-12)', type=float, default=DEFAULT_ATOL)
+    parser.add_argument('-r', '--repeat', help='The number of builds with each builder, the best time is reported. (default: 3)', type=int, default=3)
+    parser.add_argument('-o', '--output-dir', help='The directory the files are built in, and kept. (default: a temporary directory, removed afterwards)')
+    parser.add_argument('--report', help='Write the times, speedups and differences to this JSON file.')
+
+    return parser
+
+
+#******************************************************************************
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    workDir = results.output_dir
+    if workDir == None:
+        workDir = tempfile.mkdtemp(prefix='s111_equivalence_')
+    else:
+        os.makedirs(workDir, exist_ok=True)
+
+    try:
+        checks = []
+
+        if results.stations > 0:
+            checks.append(('stations', STATION_BUILDERS, generate_time_series_files(workDir, results.stations, results.records, results.seed)))
+
+        #The given stations must share their record interval and number of records, the generated ones may not.
+        if len(results.time_series_file) > 0:
+            checks.append(('given_stations', STATION_BUILDERS, results.time_series_file))
+
+        gridFiles = results.grid_file
+        if results.nodes > 0:
+            gridFiles = [generate_grid_file(workDir, results.nodes, results.times, results.seed)] + gridFiles
+
+        for index, gridFile in enumerate(gridFiles):
+            checks.append(('grid_' + str(index + 1), GRID_BUILDERS, [gridFile]))
+
+        report = {}
+        for name, builders, inputFiles in checks:
+            report[name] = check_builders(name, builders, results.metadata_file, inputFiles, workDir, max(1, results.repeat),
+                                          results.rtol, results.atol)
+
+        for name, result in report.items():
+            print_result(name, result)
+
+        if results.report != None:
+            with open(results.report, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+
+    finally:
+        if results.output_dir == None:
+            shutil.rmtree(workDir)
+
+    #Fail if any fast path no longer matches the legacy path.
+    for result in report.values():
+        for builderResult in result['builders'].values():
+            if len(builderResult['differences']) > 0:
+                sys.exit(1)
+
+    print()
+    print("All fast paths match the legacy path")
+
+
+if __name__ == "__main__":
+    main()
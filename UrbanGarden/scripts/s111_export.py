@@ -0,0 +1,98 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import sys
+import h5py
+import iso8601
+import pytz
+from chs_s111 import exporters
+
+#******************************************************************************
+def parse_time_argument(value):
+    """Parse a date and time given on the command line.
+
+    :param value: The ISO 8601 date and time. (UTC if no time zone is given)
+    :returns: The date and time in UTC.
+    """
+
+    return iso8601.parse_date(value, default_timezone=pytz.utc).astimezone(pytz.utc)
+
+
+#******************************************************************************
+def export_file(input_file_name, output_file_name, export_format, start_time=None, end_time=None,
+                bbox=None, stations=None, chunk_size=exporters.DEFAULT_CHUNK_SIZE):
+    """Export the contents of an S-111 file.
+
+    :param input_file_name: The name of the S-111 file to be exported.
+    :param output_file_name: The name of the file to be written, '-' for standard output. (Not for npy)
+    :param export_format: The export format ('csv', 'geojson' or 'npy').
+    :param start_time: The earliest time to export, None for no limit.
+    :param end_time: The latest time to export, None for no limit.
+    :param bbox: The bounding box (west, south, east, north) to export, None for no limit.
+    :param stations: The list of (one based) station numbers to export, None for all stations.
+    :param chunk_size: The maximum number of records read at a time.
+    :returns: The number of records exported.
+    """
+
+    writer = exporters.WRITERS[export_format]
+
+    with h5py.File(input_file_name, "r") as hdf_file:
+        chunks = exporters.iter_chunks(hdf_file, start_time, end_time, bbox, stations, chunk_size)
+
+        if export_format == 'npy':
+            if output_file_name == '-':
+                raise Exception('The npy format cannot be written to standard output.')
+
+            with open(output_file_name, 'wb') as output_file:
+                count = writer(chunks, output_file)
+
+        elif output_file_name == '-':
+            count = writer(chunks, sys.stdout)
+
+        else:
+            with open(output_file_name, 'w', newline='') as output_file:
+                count = writer(chunks, output_file)
+
+    return count
+
+
+#******************************************************************************
+def create_command_line():
+    """Create and initialize the command line parser.
+
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Export the contents of an S-111 file to CSV, GeoJSON or NumPy.')
+
+    parser.add_argument('-f', '--format', help='The export format.', choices=exporters.FORMATS, required=True)
+    parser.add_argument('-o', '--output-file', help='The file to be written. (- for standard output)', required=True)
+    parser.add_argument('--start', help='The earliest time to export. (ISO 8601, UTC unless a zone is given)', type=parse_time_argument)
+    parser.add_argument('--end', help='The latest time to export. (ISO 8601, UTC unless a zone is given)', type=parse_time_argument)
+    parser.add_argument('--bbox', help='Only export positions in this bounding box.', type=float, nargs=4, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'))
+    parser.add_argument('-s', '--station', help='Only export this (one based) station number. (Repeat to export several stations)', type=int, action='append')
+    parser.add_argument('--chunk-size', help='The number of records read at a time. (default: 65536)', type=int, default=exporters.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("inputFile", nargs=1)
+
+    return parser
+
+
+#******************************************************************************
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    count = export_file(results.inputFile[0], results.output_file, results.format, results.start, results.end,
+                        results.bbox, results.station, max(1, results.chunk_size))
+
+    #Keep standard output clean for the exported records.
+    print("Exported", count, "records.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
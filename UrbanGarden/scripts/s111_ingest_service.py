@@ -0,0 +1,105 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import os
+from chs_s111 import array_writer
+from chs_s111 import ingest_service
+import s111_add_timeseries
+
+#******************************************************************************
+def check_request_file(hdf_file, request):
+    """Make sure a request is for the S-111 file owned by the service.
+
+    :param hdf_file: The S-111 HDF file.
+    :param request: The request, which may name the S-111 file it is for.
+    """
+
+    if 'file' in request and not os.path.samefile(request['file'], hdf_file.filename):
+        raise Exception('The service writes ' + hdf_file.filename + ', not ' + request['file'])
+
+
+#******************************************************************************
+def write_timeseries_request(hdf_file, manifest, request):
+    """Add the timeseries files of a request.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param request: The request, giving the 'files' (and optionally force, validate, update and dialect).
+    :returns: The list of the outcomes of the files ('ingested', 'unchanged' or 'skipped').
+    """
+
+    check_request_file(hdf_file, request)
+
+    outcomes = []
+    for file_name in request['files']:
+        values = s111_add_timeseries.read_time_series_file(manifest, file_name, request.get('force', False), None,
+                                                           request.get('validate', True), request.get('dialect'))
+        if values == None:
+            outcomes.append('skipped')
+        elif s111_add_timeseries.write_time_series_file(hdf_file, manifest, file_name, values, request.get('update', False)):
+            outcomes.append('ingested')
+        else:
+            outcomes.append('unchanged')
+
+    return outcomes
+
+
+#******************************************************************************
+def write_stations_request(hdf_file, manifest, request):
+    """Add the stations given as arrays by a request.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file. (Stations given as arrays are not recorded)
+    :param request: The request, giving the keyword arguments of array_writer.add_stations as its 'arrays'.
+    :returns: The list of the names of the newly created groups.
+    """
+
+    check_request_file(hdf_file, request)
+
+    groups = array_writer.add_stations(hdf_file, **request['arrays'])
+
+    return [group.name.lstrip('/') for group in groups]
+
+
+#The function writing each type of request.
+HANDLERS = {'timeseries': write_timeseries_request,
+            'stations': write_stations_request}
+
+#******************************************************************************
+def create_command_line():
+    """Create and initialize the command line parser.
+
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Serve the ingest requests of many producers, as the single writer of an S-111 file.')
+
+    parser.add_argument('-s', '--socket', help='The path of the Unix socket the producers connect to. (Its key is written next to it, in the .key file)', required=True)
+    parser.add_argument('--max-pending', help='The maximum number of requests waiting to be written, before producers are held back. (default: ' + str(ingest_service.DEFAULT_MAX_PENDING) + ')',
+                        type=int, default=ingest_service.DEFAULT_MAX_PENDING)
+    parser.add_argument('--batch-size', help='The maximum number of requests written and committed as one batch. (default: ' + str(ingest_service.DEFAULT_BATCH_SIZE) + ')',
+                        type=int, default=ingest_service.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--batch-delay', help='The time (in seconds) to wait for more requests to fill a batch. (default: ' + str(ingest_service.DEFAULT_BATCH_DELAY) + ')',
+                        type=float, default=ingest_service.DEFAULT_BATCH_DELAY)
+    parser.add_argument("inOutFile", nargs=1)
+
+    return parser
+
+
+#******************************************************************************
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    service = ingest_service.IngestService(results.inOutFile[0], results.socket, HANDLERS, results.max_pending,
+                                           results.batch_size, results.batch_delay)
+    service.serve()
+
+
+if __name__ == "__main__":
+    main()
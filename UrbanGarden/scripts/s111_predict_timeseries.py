@@ -0,0 +1,149 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+from datetime import timedelta
+import h5py
+import iso8601
+import pytz
+from chs_s111 import ingest_manifest
+from chs_s111 import station_matrix
+from chs_s111 import station_writer
+from chs_s111 import tidal_prediction
+
+#******************************************************************************
+def parse_time_argument(value):
+    """Parse a date and time given on the command line.
+
+    :param value: The ISO 8601 date and time. (UTC if no time zone is given)
+    :returns: The date and time in UTC.
+    """
+
+    return iso8601.parse_date(value, default_timezone=pytz.utc).astimezone(pytz.utc)
+
+
+#******************************************************************************
+def get_number_of_records(start_time, end_time, interval):
+    """Compute the number of records from the start time up to (and including) the end time.
+
+    :param start_time: The time of the first record.
+    :param end_time: The time of the last record.
+    :param interval: The time interval between records.
+    :returns: The number of records.
+    """
+
+    if end_time < start_time:
+        raise Exception('The end time is before the start time.')
+
+    return int((end_time - start_time) // interval) + 1
+
+
+#******************************************************************************
+def predict_time_series(hdf_file, manifest, constituent_file_name, start_time, interval, number_of_records, memory_budget, pipelined=False,
+                        force=False):
+    """Predict the stations of a constituent table and add them to the S-111 file, skipping them if they have already been predicted.
+
+    :param hdf_file: The S-111 HDF file.
+    :param manifest: The ingest manifest of the S-111 file.
+    :param constituent_file_name: The ASCII CSV file containing the constituents.
+    :param start_time: The time of the first record. (UTC)
+    :param interval: The time interval between records.
+    :param number_of_records: The number of records of each station.
+    :param memory_budget: The memory (in bytes) available for the predicted values.
+    :param pipelined: True to predict the next stations in a background thread while the current ones are written.
+    :param force: True to predict the stations even if they have already been predicted unchanged.
+    :returns: True if the stations were predicted, false if they were skipped.
+    """
+
+    parameters = {'tool': 's111_predict_timeseries', 'start': start_time.isoformat(),
+                  'interval': int(interval.total_seconds()), 'records': number_of_records}
+
+    #Skip the table if its stations have already been predicted, for the same times.
+    content_hash = manifest.hash_input(constituent_file_name)
+    if not force and manifest.is_current(constituent_file_name, content_hash, parameters):
+        print("Skipping", constituent_file_name, "(already predicted, unchanged)")
+        return False
+
+    table = tidal_prediction.read_constituent_table(constituent_file_name)
+    print("Successfully read the constituents of", str(len(table.station_names)), "stations.")
+
+    #If this table was predicted before, then remove its stations so they can be replaced.
+    entry = manifest.get_entry(constituent_file_name)
+    if entry != None:
+        print("Replacing previously predicted stations")
+        manifest.remove(constituent_file_name)
+        manifest.rename_groups(station_writer.remove_station_groups(hdf_file, entry['groups']))
+
+    groups = tidal_prediction.add_predicted_stations(hdf_file, table, start_time, interval, number_of_records, memory_budget, pipelined)
+
+    #Flush the edits out before recording the input, so the manifest never gets ahead of the file.
+    hdf_file.flush()
+
+    manifest.record(constituent_file_name, content_hash, parameters, [group.name.lstrip('/') for group in groups])
+    manifest.save()
+
+    return True
+
+
+#******************************************************************************
+def create_command_line():
+    """Create and initialize the command line parser.
+
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Add S-111 time series predicted from tidal current constituents')
+
+    parser.add_argument('-c', '--constituent-file', help='The ASCII CSV file containing the constituents (station, latitude, longitude, constituent, major, minor, inclination, phase).', required=True)
+    parser.add_argument('-s', '--start', help='The time of the first record. (ISO 8601, UTC if no time zone is given)', type=parse_time_argument, required=True)
+    parser.add_argument('-i', '--interval', help='The record interval in seconds.', type=int, required=True)
+
+    length = parser.add_mutually_exclusive_group(required=True)
+    length.add_argument('-n', '--number-of-records', help='The number of records of each station.', type=int)
+    length.add_argument('-e', '--end', help='The time of the last record. (ISO 8601, UTC if no time zone is given)', type=parse_time_argument)
+
+    parser.add_argument('-m', '--memory-budget', help='The memory (in megabytes) available for the predicted values. (default: 256)', type=float, default=256.0)
+    parser.add_argument('-p', '--pipeline', help='Predict the next stations in a background thread while the current ones are written.', action='store_true')
+    parser.add_argument('--matrix', help='Also write the station by time matrix, for reading every station at a time.', action='store_true')
+    parser.add_argument('-f', '--force', help='Predict the stations even if they have already been predicted unchanged.', action='store_true')
+    parser.add_argument("inOutFile", nargs=1)
+
+    return parser
+
+
+#******************************************************************************
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    if results.interval <= 0:
+        parser.error('The interval must be positive.')
+
+    interval = timedelta(seconds=results.interval)
+
+    numberOfRecords = results.number_of_records
+    if results.end != None:
+        numberOfRecords = get_number_of_records(results.start, results.end, interval)
+
+    #open the HDF5 file.
+    with h5py.File(results.inOutFile[0], "r+") as hdf_file:
+
+        #Load the record of what has already been ingested into this file.
+        manifest = ingest_manifest.IngestManifest(results.inOutFile[0])
+
+        predicted = predict_time_series(hdf_file, manifest, results.constituent_file, results.start, interval, numberOfRecords,
+                                        int(results.memory_budget * 1024 * 1024), results.pipeline, results.force)
+
+        #If the stations changed, then an existing matrix is rewritten too.
+        station_matrix.update_station_matrix(hdf_file, results.matrix, predicted)
+
+        #Flush any edits out.
+        hdf_file.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,13 +21,13 @@ def create_command_line():
 
 
 #******************************************************************************        
-def main():
+def main(args=None):
 
     #Create the command line parser.
     parser = create_command_line()
 
     #Parse the command line.
-    results = parser.parse_args()
+    results = parser.parse_args(args)
     
     f = h5py.File(results.inputFile[0], 'r')
     
@@ -0,0 +1,60 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+import h5py
+from chs_s111 import group_statistics
+
+#******************************************************************************
+def print_statistics(statistics):
+    """Print the statistics of a group.
+
+    :param statistics: The statistics dictionary of the group. (See group_statistics.read_statistics)
+    """
+
+    print("%-12s min %8.4f  max %8.4f  mean %8.4f  p%d %8.4f  max at %s" % (statistics['group'], statistics['min'], statistics['max'],
+                                                                            statistics['mean'], group_statistics.SPEED_PERCENTILE,
+                                                                            statistics['percentile'], statistics['timeOfMax'].isoformat()))
+
+
+#******************************************************************************        
+def create_command_line():
+    """Create and initialize the command line parser.
+    
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Query the speed statistics (knots) of the groups of an S-111 file, without reading the values.')
+
+    parser.add_argument('-e', '--exceeds', help='Only list the groups whose maximum speed exceeds this speed (knots).', type=float)
+    parser.add_argument('--peak', help='Only list the group with the highest maximum speed.', action='store_true')
+    parser.add_argument("inputFile", nargs=1)
+
+    return parser
+
+
+#******************************************************************************        
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    with h5py.File(results.inputFile[0], "r") as hdf_file:
+
+        if results.peak:
+            peak = group_statistics.find_peak_group(hdf_file)
+            groupStatistics = [] if peak == None else [peak]
+        elif results.exceeds != None:
+            groupStatistics = group_statistics.find_groups_exceeding(hdf_file, results.exceeds)
+        else:
+            groupStatistics = group_statistics.read_statistics(hdf_file)
+
+        for statistics in groupStatistics:
+            print_statistics(statistics)
+
+
+if __name__ == "__main__":
+    main()
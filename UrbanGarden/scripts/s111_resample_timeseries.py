@@ -0,0 +1,152 @@
+#******************************************************************************
+#
+#******************************************************************************
+import argparse
+from datetime import timedelta
+import h5py
+import numpy
+from chs_s111 import ascii_time_series
+from chs_s111 import current_vectors
+from chs_s111 import metadata
+from chs_s111 import series_cache
+from chs_s111 import series_resample
+from chs_s111 import station_matrix
+from chs_s111 import station_writer
+
+#******************************************************************************
+def resample_time_series_file(hdf_file, file_name, target_interval, method, cache=None, validate=True, dialect=None):
+    """Resample an ASCII timeseries file and add it as a station of the S-111 file.
+
+    :param hdf_file: The S-111 HDF file.
+    :param file_name: The name of the input ASCII file containing the timeseries data.
+    :param target_interval: The time interval between the resampled records.
+    :param method: The resampling method ('mean' or 'decimate').
+    :param cache: The SeriesCache of parsed input files, None to always parse the file.
+    :param validate: True to check the records against the header before resampling them.
+    :param dialect: The name of the file's dialect, None to detect it from the header.
+    """
+
+    time_file = ascii_time_series.AsciiTimeSeries(file_name, cache, dialect)
+    print("Successfully opened time series file containing", str(time_file.number_of_records), "records.")
+
+    factor = series_resample.get_resample_factor(time_file.interval, target_interval)
+
+    if validate:
+        dateAndTimes, directions, speeds = time_file.read_validated_arrays()
+    else:
+        dateAndTimes, directions, speeds = time_file.read_arrays()
+    directions, speeds = series_resample.resample_series(directions, speeds * current_vectors.ms2Knots, factor, method)
+
+    newGroup = station_writer.add_station(hdf_file, time_file.longitude, time_file.latitude, time_file.start_time,
+                                          target_interval, directions, speeds)
+    station_writer.write_station_identity(newGroup, time_file.station_name, time_file.station_id)
+
+
+#******************************************************************************
+def resample_s111_file(hdf_file, source_file, target_interval, method):
+    """Resample every station of an S-111 timeseries file and add them to the S-111 file.
+
+    :param hdf_file: The S-111 HDF file.
+    :param source_file: The S-111 HDF file containing the timeseries to be resampled.
+    :param target_interval: The time interval between the resampled records.
+    :param method: The resampling method ('mean' or 'decimate').
+    """
+
+    #Make sure the given file contains the correct type of data.
+    if source_file.attrs['dataCodingFormat'] != 1:
+        raise Exception('The source S-111 file does not contain time series data.')
+
+    numberOfStations = source_file.attrs['numberOfStations']
+    sourceInterval = timedelta(seconds=int(source_file.attrs['timeRecordInterval']))
+    factor = series_resample.get_resample_factor(sourceInterval, target_interval)
+
+    print("Resampling", numberOfStations, "stations by a factor of", factor)
+
+    groups = [source_file['Group ' + str(index + 1)] for index in range(0, numberOfStations)]
+
+    #The resampled stations share the S-111 file's number of times, so the source stations must share theirs.
+    lengths = [group['Speed'].shape[-1] for group in groups]
+    if len(set(lengths)) > 1:
+        mismatched = [group.name.lstrip('/') for group, length in zip(groups, lengths) if length != lengths[0]]
+        raise Exception('The stations of the source S-111 file do not all have ' + str(lengths[0]) + ' records, as Group 1 does: ' +
+                        ', '.join(mismatched) + '.')
+
+    #Every station has the same number of times, so resample them all at once.
+    directions = numpy.vstack([group['Direction'][()] for group in groups])
+    speeds = numpy.vstack([group['Speed'][()] for group in groups])
+
+    directions, speeds = series_resample.resample_series(directions, speeds, factor, method)
+
+    longitudes = source_file['Group XY']['X'][0]
+    latitudes = source_file['Group XY']['Y'][0]
+
+    for index, group in enumerate(groups):
+        startTime = metadata.parse_time(group.attrs['DateTime'])
+
+        newGroup = station_writer.add_station(hdf_file, longitudes[index], latitudes[index], startTime,
+                                              target_interval, directions[index], speeds[index])
+
+        #Carry over any other station attributes. (e.g. station names and identifiers)
+        for name, value in group.attrs.items():
+            if name not in ('Title', 'DateTime'):
+                newGroup.attrs[name] = value
+
+
+#******************************************************************************
+def create_command_line():
+    """Create and initialize the command line parser.
+
+    :returns: The command line parser.
+    """
+
+    parser = argparse.ArgumentParser(description='Add S-111 time series resampled to a coarser interval')
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('-t', '--time-series-file', help='The ASCII file containing the time series. (Repeat to add several files)', action='append')
+    source.add_argument('-s', '--source-file', help='The S-111 time series file to be resampled.')
+
+    parser.add_argument('-i', '--interval', help='The resampled record interval in seconds.', type=int, required=True)
+    parser.add_argument('--method', help='Vector average each interval (mean) or keep its first record (decimate). (default: mean)',
+                        choices=series_resample.METHODS, default='mean')
+    parser.add_argument('--matrix', help='Also write the station by time matrix, for reading every station at a time.', action='store_true')
+    parser.add_argument('--dialect', help='The layout of the time series files. (default: detected from each header, chs-station is only used when given)', choices=ascii_time_series.get_dialect_names())
+    parser.add_argument('--no-validate', help='Do not check the records against the time series header.', action='store_true')
+    parser.add_argument('--parse-cache', help='Cache the parsed time series next to each input file, so later runs skip parsing.', action='store_true')
+    parser.add_argument('--parse-cache-dir', help='Cache the parsed time series in this directory instead.')
+    parser.add_argument("inOutFile", nargs=1)
+
+    return parser
+
+
+#******************************************************************************
+def main(args=None):
+
+    #Create the command line parser.
+    parser = create_command_line()
+
+    #Parse the command line.
+    results = parser.parse_args(args)
+
+    targetInterval = timedelta(seconds=results.interval)
+
+    #open the HDF5 file.
+    with h5py.File(results.inOutFile[0], "r+") as hdf_file:
+
+        if results.source_file != None:
+            with h5py.File(results.source_file, "r") as source_file:
+                resample_s111_file(hdf_file, source_file, targetInterval, results.method)
+        else:
+            cache = series_cache.open_series_cache(results.parse_cache, results.parse_cache_dir)
+            for file_name in results.time_series_file:
+                resample_time_series_file(hdf_file, file_name, targetInterval, results.method, cache, not results.no_validate,
+                                          results.dialect)
+
+        #The stations changed, so an existing matrix is rewritten too.
+        station_matrix.update_station_matrix(hdf_file, results.matrix)
+
+        #Flush any edits out.
+        hdf_file.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#******************************************************************************
+#
+#******************************************************************************
+import os
+import sys
+
+#The harness is a script, so the scripts directory (and the package next to it) must be importable.
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'scripts'))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+import s111_check_equivalence
+
+#The small input files, checked in so the fast paths are also compared on files which are not generated.
+FIXTURES_DIR = os.path.join(TESTS_DIR, 'fixtures')
+METADATA_FILE = os.path.join(FIXTURES_DIR, 'metadata.csv')
+
+#******************************************************************************
+def check_equivalence(name, builders, input_files, work_dir):
+    """Run the builders on the inputs, and verify every fast builder matches the legacy builder.
+
+    :param name: The name of the check.
+    :param builders: Dictionary of the builders, including the 'legacy' builder.
+    :param input_files: The list of input files.
+    :param work_dir: The directory the files are built in.
+    """
+
+    result = s111_check_equivalence.check_builders(name, builders, METADATA_FILE, input_files, str(work_dir), 1,
+                                                   s111_check_equivalence.DEFAULT_RTOL, s111_check_equivalence.DEFAULT_ATOL)
+
+    assert set(result['builders']) == set(builders) - {'legacy'}
+    for builderName, builderResult in result['builders'].items():
+        assert builderResult['differences'] == [], builderName
+
+
+#******************************************************************************
+def test_generated_stations(tmp_path):
+    inputFiles = s111_check_equivalence.generate_time_series_files(str(tmp_path), 3, 50, 0)
+    check_equivalence('stations', s111_check_equivalence.STATION_BUILDERS, inputFiles, tmp_path)
+
+
+#******************************************************************************
+def test_generated_grid(tmp_path):
+    gridFile = s111_check_equivalence.generate_grid_file(str(tmp_path), 200, 3, 0)
+    check_equivalence('grid', s111_check_equivalence.GRID_BUILDERS, [gridFile], tmp_path)
+
+
+#******************************************************************************
+def test_fixture_stations(tmp_path):
+    inputFiles = [os.path.join(FIXTURES_DIR, 'station1.txt'), os.path.join(FIXTURES_DIR, 'station2.txt')]
+    check_equivalence('given_stations', s111_check_equivalence.STATION_BUILDERS, inputFiles, tmp_path)
+
+
+#******************************************************************************
+def test_fixture_grid(tmp_path):
+    check_equivalence('given_grid', s111_check_equivalence.GRID_BUILDERS, [os.path.join(FIXTURES_DIR, 'grid.nc')], tmp_path)
+
+
+#******************************************************************************
+def test_main(tmp_path):
+    s111_check_equivalence.main(['-m', METADATA_FILE, '--stations', '2', '--records', '30', '--nodes', '100', '--times', '2',
+                                 '-t', os.path.join(FIXTURES_DIR, 'station1.txt'), '-t', os.path.join(FIXTURES_DIR, 'station2.txt'),
+                                 '-g', os.path.join(FIXTURES_DIR, 'grid.nc'), '-o', str(tmp_path)])